@@ -0,0 +1,89 @@
+"""Compare per-trace and frame-window read speed of the chunk policies.
+
+A movie is written with the "row" policy and rechunked into each policy, so the
+rechunk throughput is reported as well.
+
+    python benchmarks/bench_chunking.py --n-traces 1000 --n-frames 5000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+from synthetic import make_movie
+
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import CHUNK_POLICIES, write_movie_to_hdf
+from smtirf.io import rechunk
+
+
+def bench_reads(savename, uid, n_reads, window, rng):
+    with h5py.File(savename, "r") as hf:
+        dataset = hf[f"movies/movie_{uid}/traces/channel_1"]
+        n_traces, n_frames = dataset.shape
+
+        rows = rng.integers(0, n_traces, size=n_reads)
+        tic = time.perf_counter()
+        for row in rows:
+            dataset[row]
+        trace_time = (time.perf_counter() - tic) / n_reads
+
+        starts = rng.integers(0, max(n_frames - window, 1), size=n_reads)
+        tic = time.perf_counter()
+        for start in starts:
+            dataset[:, start : start + window]
+        window_time = (time.perf_counter() - tic) / n_reads
+
+    return trace_time, window_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=1000)
+    parser.add_argument("--n-frames", type=int, default=5000)
+    parser.add_argument("--n-reads", type=int, default=200)
+    parser.add_argument("--window", type=int, default=200)
+    args = parser.parse_args()
+
+    channel_1, channel_2, peaks, metadata = make_movie(args.n_traces, args.n_frames)
+    raw_mb = 2 * channel_1.nbytes / 1024**2
+    print(f"{args.n_traces} traces x {args.n_frames} frames ({raw_mb:.1f} MB raw)")
+    print(
+        f"{'policy':<8}{'rechunk [MB/s]':>16}{'trace read [ms]':>17}"
+        f"{f'{args.window}-frame window [ms]':>25}{'size [MB]':>11}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = Path(tmpdir) / "source.smtrc"
+        write_movie_to_hdf(
+            source,
+            "fret",
+            0.0,
+            1.0,
+            RawTraceBlock(0, channel_1, channel_2),
+            peaks,
+            metadata,
+        )
+        for policy in CHUNK_POLICIES:
+            savename = Path(tmpdir) / f"{policy}.smtrc"
+            tic = time.perf_counter()
+            rechunk(source, savename, policy)
+            rechunk_time = time.perf_counter() - tic
+
+            trace_time, window_time = bench_reads(
+                savename,
+                metadata.uid,
+                args.n_reads,
+                args.window,
+                np.random.default_rng(0),
+            )
+            print(
+                f"{policy:<8}{raw_mb / rechunk_time:>16.1f}{trace_time * 1e3:>17.3f}"
+                f"{window_time * 1e3:>25.3f}{savename.stat().st_size / 1024**2:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare write speed, read speed and file size of the compression profiles.
+
+    python benchmarks/bench_compression.py --n-traces 1000 --n-frames 5000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+from synthetic import make_movie
+
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import COMPRESSION_PROFILES, write_movie_to_hdf
+
+
+def bench_profile(savename, profile, movie, n_reads, rng):
+    channel_1, channel_2, peaks, metadata = movie
+    tic = time.perf_counter()
+    write_movie_to_hdf(
+        savename,
+        "fret",
+        0.0,
+        1.0,
+        RawTraceBlock(0, channel_1, channel_2),
+        peaks,
+        metadata,
+        compression=profile,
+    )
+    write_time = time.perf_counter() - tic
+
+    with h5py.File(savename, "r") as hf:
+        dataset = hf[f"movies/movie_{metadata.uid}/traces/channel_1"]
+        rows = rng.integers(0, metadata.n_traces, size=n_reads)
+        tic = time.perf_counter()
+        for row in rows:
+            dataset[row]
+        trace_time = (time.perf_counter() - tic) / n_reads
+
+        tic = time.perf_counter()
+        dataset[:]
+        full_time = time.perf_counter() - tic
+
+    return write_time, trace_time, full_time, savename.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=1000)
+    parser.add_argument("--n-frames", type=int, default=5000)
+    parser.add_argument("--n-reads", type=int, default=500)
+    args = parser.parse_args()
+
+    movie = make_movie(args.n_traces, args.n_frames)
+    raw_mb = 2 * movie[0].nbytes / 1024**2
+    rng = np.random.default_rng(0)
+    print(f"{args.n_traces} traces x {args.n_frames} frames ({raw_mb:.1f} MB raw)")
+    print(
+        f"{'profile':<10}{'write [MB/s]':>14}{'trace read [ms]':>17}"
+        f"{'full read [MB/s]':>18}{'size [MB]':>11}{'ratio':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for profile in COMPRESSION_PROFILES:
+            savename = Path(tmpdir) / f"{profile}.smtrc"
+            write_time, trace_time, full_time, size = bench_profile(
+                savename, profile, movie, args.n_reads, rng
+            )
+            size_mb = size / 1024**2
+            print(
+                f"{profile:<10}{raw_mb / write_time:>14.1f}{trace_time * 1e3:>17.3f}"
+                f"{raw_mb / 2 / full_time:>18.1f}{size_mb:>11.1f}"
+                f"{raw_mb / size_mb:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare the log-domain emission pipeline with exponentiated emission matrices.
+
+The E-step and Viterbi labelling of a Normal emission model are timed over T,
+computing emissions as before (numpy exp, then fwdback on probabilities and
+Viterbi taking their log) and with the log-domain kernels.
+
+    python benchmarks/bench_emissions.py --n-frames 1000 10000 100000 --n-states 4
+"""
+
+import argparse
+import time
+
+import numpy as np
+from numba import jit
+
+from smtirf.hmm.algorithms import fwdback, viterbi
+from smtirf.hmm.distributions import Normal
+
+
+def p_X_exp(phi, x):
+    X = x[None, :] - phi.mu[:, None]
+    tau = phi.tau[:, None]
+    return np.exp(-0.5 * np.log(2 * np.pi / tau) - tau / 2 * X**2)
+
+
+@jit(nopython=True)
+def viterbi_exp(x, pi, A, B):
+    T, K = B.shape
+    pi = np.log(pi)
+    A = np.log(A)
+    B = np.log(B)
+    psi = np.zeros(B.shape, dtype=np.int32)
+    Q = np.zeros(T, dtype=np.int32)
+    delta = np.expand_dims(pi + B[0], 1)
+    for t in range(1, T):
+        R = delta + A
+        for k in range(K):
+            psi[t, k] = np.argmax(R[:, k])
+            delta[k] = np.max(R[:, k]) + B[t, k]
+    Q[-1] = np.argmax(delta)
+    for t in range(1, T):
+        Q[-(t + 1)] = psi[-t, Q[-t]]
+    return Q
+
+
+def best_of(repeats, function, *args):
+    times = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - tic)
+    return min(times)
+
+
+def estep_exp(phi, pi, A, x):
+    return fwdback(pi, A, p_X_exp(phi, x).T)
+
+
+def estep_log(phi, pi, A, x):
+    return fwdback(pi, A, phi.lnp_X(x), log=True)
+
+
+def label_exp(phi, pi, A, x):
+    return viterbi_exp(x, pi, A, p_X_exp(phi, x).T)
+
+
+def label_log(phi, pi, A, x):
+    return viterbi(np.log(pi), np.log(A), phi.lnp_X(x))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--n-frames", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--n-states", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    K = args.n_states
+    phi = Normal(np.linspace(0, 1, K + 2)[1:-1], np.full(K, 0.05**-2))
+    pi = np.ones(K) / K
+    A = np.eye(K) * 5 + rng.random((K, K))
+    A /= A.sum(axis=1, keepdims=True)
+
+    columns = ("E-step exp", "E-step log", "label exp", "label log")
+    print(f"{'T':>8}" + "".join(f"{column:>14}" for column in columns))
+    for T in args.n_frames:
+        x = rng.choice(phi.mu, T) + rng.normal(0, 0.05, T)
+        times = [
+            best_of(args.repeats, function, phi, pi, A, x)
+            for function in (estep_exp, estep_log, label_exp, label_log)
+        ]
+        print(f"{T:>8}" + "".join(f"{t * 1e3:>12.2f}ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
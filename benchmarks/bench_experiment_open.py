@@ -0,0 +1,91 @@
+"""Compare open time and memory of lazy and eager Experiment trace creation.
+
+Each open runs in a fresh process. RSS is reported as the increase in resident
+memory over the process after imports, and is only available on Linux.
+
+    python benchmarks/bench_experiment_open.py --n-traces 1000 10000 100000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic import make_movie
+
+from smtirf import Experiment
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import write_movie_to_hdf
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as F:
+            resident_pages = int(F.read().split()[1])
+    except FileNotFoundError:
+        return float("nan")
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def _run(savename, lazy, queue):
+    baseline = _rss_mb()
+    tic = time.perf_counter()
+    expt = Experiment(savename, lazy=lazy)
+    open_time = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    for k in range(10):
+        _ = expt[k].donor
+    access_time = (time.perf_counter() - tic) / 10
+    queue.put((open_time, access_time, _rss_mb() - baseline))
+
+
+def measure(savename, lazy):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run, args=(savename, lazy, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--n-traces", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--n-frames", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"{'traces':>8}{'mode':>8}{'open [s]':>12}{'trace access [ms]':>19}"
+        f"{'RSS [MB]':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_traces in args.n_traces:
+            savename = Path(tmpdir) / f"{n_traces}.smtrc"
+            channel_1, channel_2, peaks, metadata = make_movie(n_traces, args.n_frames)
+            write_movie_to_hdf(
+                savename,
+                "fret",
+                0.0,
+                1.0,
+                RawTraceBlock(0, channel_1, channel_2),
+                peaks,
+                metadata,
+            )
+            del channel_1, channel_2, peaks
+
+            for mode, lazy in (("lazy", True), ("eager", False)):
+                open_time, access_time, rss = measure(savename, lazy)
+                print(
+                    f"{n_traces:>8}{mode:>8}{open_time:>12.3f}"
+                    f"{access_time * 1e3:>19.3f}{rss:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare the fused forward-backward kernel with the previous kernel over T and K.
+
+The previous kernel allocated a [T-1 x K x K] array of transition probabilities
+and temporaries in its inner loops; the fused kernel sums the transition
+probabilities as its backward loop runs and keeps two frames of beta.
+
+    python benchmarks/bench_fwdback.py --n-frames 1000 10000 100000 --n-states 2 4 6
+"""
+
+import argparse
+import time
+
+import numpy as np
+from numba import jit
+
+from smtirf.hmm.algorithms import fwdback
+
+
+@jit(nopython=True)
+def fwdback_unfused(pi, A, B):
+    T, K = B.shape
+    alpha = np.zeros((T, K))
+    beta = np.zeros((T, K))
+    c = np.zeros(T)
+
+    alpha[0] = pi * B[0]
+    c[0] = np.sum(alpha[0])
+    alpha[0] = alpha[0] / c[0]
+    for t in range(1, T):
+        for k in range(K):
+            alpha[t, k] = np.sum(alpha[t - 1] * A[:, k]) * B[t, k]
+        c[t] = np.sum(alpha[t])
+        alpha[t] = alpha[t] / c[t]
+
+    beta[-1] = 1
+    for t in range(1, T):
+        for k in range(K):
+            beta[-(t + 1), k] = np.sum(A[k] * B[-t] * beta[-t]) / c[-t]
+
+    gamma = alpha * beta
+    xi = np.zeros((T - 1, K, K))
+    for t in range(T - 1):
+        for i in range(K):
+            for j in range(K):
+                xi[t, i, j] = (
+                    alpha[t, i] * A[i, j] * B[t + 1, j] * beta[t + 1, j] / c[t + 1]
+                )
+    xi = np.sum(xi, axis=0)
+    L = np.sum(np.log(c))
+    return gamma, xi, L
+
+
+def best_of(repeats, function, *args):
+    times = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - tic)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--n-frames", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--n-states", type=int, nargs="+", default=[2, 4, 6, 8])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'T':>8}{'K':>4}{'unfused':>12}{'fused':>12}{'speedup':>10}{'xi MB':>10}")
+    for K in args.n_states:
+        for T in args.n_frames:
+            pi = np.ones(K) / K
+            A = np.eye(K) * 5 + rng.random((K, K))
+            A /= A.sum(axis=1, keepdims=True)
+            B = rng.random((K, T)).T  # layout of p_X(x).T in train_baumwelch
+            fwdback_unfused(pi, A, B), fwdback(pi, A, B)  # compile
+
+            unfused = best_of(args.repeats, fwdback_unfused, pi, A, B)
+            fused = best_of(args.repeats, fwdback, pi, A, B)
+            xi_bytes = (T - 1) * K * K * 8 / 1e6
+            print(
+                f"{T:>8}{K:>4}{unfused * 1e3:>10.2f}ms{fused * 1e3:>10.2f}ms"
+                f"{unfused / fused:>9.1f}x{xi_bytes:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare iterating over traces with and without background prefetching.
+
+Each trace's FRET efficiency is smoothed as a stand-in for per-trace work. The
+signal cache is cleared before each run.
+
+    python benchmarks/bench_iter.py --n-traces 20000 --n-frames 1000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from synthetic import make_movie
+
+from smtirf import Experiment
+from smtirf.detail.data_dispatch import SIGNAL_CACHE
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import write_movie_to_hdf
+
+
+def consume(traces):
+    kernel = np.ones(9) / 9
+    for trace in traces:
+        np.convolve(np.nan_to_num(trace.fret), kernel, mode="same")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=20000)
+    parser.add_argument("--n-frames", type=int, default=1000)
+    parser.add_argument("--prefetch", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8}{'mode':>16}{'time [s]':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        channel_1, channel_2, peaks, metadata = make_movie(args.n_traces, args.n_frames)
+        for policy in ("row", "tile"):
+            savename = Path(tmpdir) / f"{policy}.smtrc"
+            write_movie_to_hdf(
+                savename,
+                "fret",
+                0.0,
+                1.0,
+                RawTraceBlock(0, channel_1, channel_2),
+                peaks,
+                metadata,
+                chunk_policy=policy,
+            )
+            runs = [
+                ("for trace in", lambda expt: iter(expt)),
+                ("iter_traces", lambda expt: expt.iter_traces(args.prefetch, 1)),
+                ("iter_traces x2", lambda expt: expt.iter_traces(args.prefetch, 2)),
+            ]
+            for mode, make_iterator in runs:
+                SIGNAL_CACHE.clear()
+                expt = Experiment(savename)
+                tic = time.perf_counter()
+                consume(make_iterator(expt))
+                print(f"{policy:>8}{mode:>16}{time.perf_counter() - tic:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
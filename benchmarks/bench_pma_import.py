@@ -0,0 +1,89 @@
+"""Compare peak RSS and wall time of the eager and streaming PMA import paths.
+
+Each import runs in a fresh process so that peak RSS is measured independently.
+
+    python benchmarks/bench_pma_import.py --n-traces 4000 --n-frames 20000
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic import write_pma_movie
+
+from smtirf.detail.metadata import MovieMetadata
+from smtirf.detail.writer import write_movie_to_hdf
+from smtirf.io import pma
+from smtirf.io.import_dispatch import load_from_pma
+
+
+def import_eager(filename, savename):
+    traces = pma._read_traces(filename)
+    peaks = pma._read_pks(filename.with_suffix(".pks"))
+    log = pma._read_log(filename.with_suffix(".log"))
+    snapshot = pma._read_tif(filename.with_name(f"{filename.stem}_ave.tif"))
+    metadata = MovieMetadata(
+        n_traces=len(traces),
+        n_frames=traces[0].n_frames,
+        src_filename=filename.name,
+        timestamp=log["filming_date_and_time"],
+        frame_length=log["exposure_time_ms"],
+        ccd_gain=log["gain"],
+        data_scaler=log["data_scaler"],
+        log=log,
+    )
+    write_movie_to_hdf(
+        savename, "fret", 0.0, 1.0, traces, peaks, metadata, snapshot=snapshot
+    )
+
+
+def import_streaming(filename, savename):
+    load_from_pma(filename, savename=savename)
+
+
+METHODS = {"eager": import_eager, "streaming": import_streaming}
+
+
+def _run(method, filename, savename, queue):
+    tic = time.perf_counter()
+    METHODS[method](filename, savename)
+    elapsed = time.perf_counter() - tic
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss /= 1024  # bytes on macOS, kilobytes on Linux
+    queue.put((elapsed, peak_rss / 1024))
+
+
+def measure(method, filename, savename):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run, args=(method, filename, savename, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=1000)
+    parser.add_argument("--n-frames", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base = Path(tmpdir)
+        filename = write_pma_movie(base, n_traces=args.n_traces, n_frames=args.n_frames)
+        size_mb = filename.stat().st_size / 1024**2
+        print(f"{args.n_traces} traces x {args.n_frames} frames ({size_mb:.1f} MB)")
+        print(f"{'method':<12}{'wall [s]':>12}{'peak RSS [MB]':>16}")
+        for method in METHODS:
+            elapsed, peak_rss = measure(method, filename, base / f"{method}.smtrc")
+            print(f"{method:<12}{elapsed:>12.2f}{peak_rss:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
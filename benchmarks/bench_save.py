@@ -0,0 +1,74 @@
+"""Time saving trace edits in place and to a new file as the file grows.
+
+save_as copies raw chunks; rechunk, which decompresses and recompresses all trace
+data, is timed as a reference.
+
+    python benchmarks/bench_save.py --n-traces 1000 10000 100000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from synthetic import make_movie
+
+from smtirf import Experiment, rechunk
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import write_movie_to_hdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--n-frames", type=int, default=100)
+    parser.add_argument("--n-edits", type=int, default=10)
+    args = parser.parse_args()
+
+    print(
+        f"{'traces':>8}{'save [ms]':>12}{'save_as [s]':>13}"
+        f"{'selected [s]':>14}{'rechunk [s]':>13}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_traces in args.n_traces:
+            savename = Path(tmpdir) / f"{n_traces}.smtrc"
+            channel_1, channel_2, peaks, metadata = make_movie(n_traces, args.n_frames)
+            write_movie_to_hdf(
+                savename,
+                "fret",
+                0.0,
+                1.0,
+                RawTraceBlock(0, channel_1, channel_2),
+                peaks,
+                metadata,
+            )
+            del channel_1, channel_2, peaks
+
+            expt = Experiment(savename)
+            rng = np.random.default_rng(0)
+            for k in rng.choice(n_traces, args.n_edits, replace=False):
+                expt[k].set_offsets([1, 1])
+                expt[k].set_selected(True)
+                expt[k].set_statepath(np.zeros(args.n_frames))
+            tic = time.perf_counter()
+            expt.save()
+            save_time = time.perf_counter() - tic
+
+            expt.filter(np.arange(n_traces) % 10 == 0).set_selected()
+            times = []
+            for selected_only in (False, True):
+                tic = time.perf_counter()
+                expt.save_as(Path(tmpdir) / "copy.smtrc", selected_only=selected_only)
+                times.append(time.perf_counter() - tic)
+            tic = time.perf_counter()
+            rechunk(savename, Path(tmpdir) / "copy.smtrc", "row")
+            times.append(time.perf_counter() - tic)
+            print(
+                f"{n_traces:>8}{save_time * 1e3:>12.2f}"
+                + "".join(f"{t:>13.3f}" for t in times)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compare scoring and labelling many traces one at a time and in one batch call.
+
+    python benchmarks/bench_segments.py --n-traces 50000 --n-frames 300
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from smtirf.hmm.algorithms import Segments, fwdback
+from smtirf.hmm.models import ClassicHiddenMarkovModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=50000)
+    parser.add_argument("--n-frames", type=int, default=300)
+    parser.add_argument("--n-states", type=int, default=3)
+    args = parser.parse_args()
+
+    K = args.n_states
+    np.random.seed(0)
+    theta = ClassicHiddenMarkovModel(
+        K,
+        np.ones(K) / K,
+        (np.eye(K) * 20 + 1) / (20 + K),
+        np.linspace(0, 1, K + 2)[1:-1],
+        np.full(K, 0.08**-2),
+        False,
+    )
+    X = [x for _, x in theta.simulate(M=args.n_traces, T=args.n_frames)]
+    print(f"{args.n_traces} traces x {args.n_frames} frames, K={K}")
+    theta.score_traces(X[:2]), theta.label_traces(X[:2]), theta.label(X[0])  # compile
+
+    def report(label, function):
+        tic = time.perf_counter()
+        function()
+        print(f"{label:<36}{time.perf_counter() - tic:>10.2f} s")
+
+    report(
+        "score, per-trace fwdback",
+        lambda: [fwdback(theta.pi, theta.A, theta.lnp_X(x), log=True) for x in X],
+    )
+    report("score, score_traces", lambda: theta.score_traces(X))
+    report("label, per-trace label", lambda: [theta.label(x) for x in X])
+    report("label, label_traces", lambda: theta.label_traces(X))
+    segments = Segments(X)
+    report("label, label_traces on Segments", lambda: theta.label_traces(segments))
+
+
+if __name__ == "__main__":
+    main()
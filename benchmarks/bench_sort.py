@@ -0,0 +1,68 @@
+"""Compare sorting traces by correlation with vectorized metrics vs per-trace scipy.
+
+The per-trace time is measured on a subset of traces and extrapolated.
+
+    python benchmarks/bench_sort.py --n-traces 50000 --n-frames 500
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import scipy.stats
+from synthetic import make_movie
+
+from smtirf import Experiment
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import write_movie_to_hdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=50000)
+    parser.add_argument("--n-frames", type=int, default=500)
+    parser.add_argument("--n-subset", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        savename = Path(tmpdir) / "sort.smtrc"
+        channel_1, channel_2, peaks, metadata = make_movie(args.n_traces, args.n_frames)
+        write_movie_to_hdf(
+            savename,
+            "fret",
+            0.0,
+            1.0,
+            RawTraceBlock(0, channel_1, channel_2),
+            peaks,
+            metadata,
+        )
+        del channel_1, channel_2, peaks
+        print(f"{args.n_traces} traces x {args.n_frames} frames")
+
+        expt = Experiment(savename)
+        n_subset = min(args.n_subset, len(expt))
+        tic = time.perf_counter()
+        for trace in expt[:n_subset]:
+            scipy.stats.pearsonr(trace.donor, trace.acceptor)
+        per_trace = (time.perf_counter() - tic) / n_subset * len(expt)
+        print(f"{'per-trace pearsonr (extrapolated)':<36}{per_trace:>10.3f} s")
+
+        expt = Experiment(savename)
+        tic = time.perf_counter()
+        expt.sort("corrcoef")
+        print(f"{'sort, metrics computed':<36}{time.perf_counter() - tic:>10.3f} s")
+
+        tic = time.perf_counter()
+        expt.sort("corrcoef")
+        print(f"{'sort, metrics cached':<36}{time.perf_counter() - tic:>10.3f} s")
+
+        for trace in expt[:100]:
+            trace.set_offsets([1, 1])
+        tic = time.perf_counter()
+        expt.sort("corrcoef")
+        print(f"{'sort, 100 traces changed':<36}{time.perf_counter() - tic:>10.3f} s")
+
+
+if __name__ == "__main__":
+    main()
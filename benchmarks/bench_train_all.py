@@ -0,0 +1,77 @@
+"""Time Experiment.train_all against training traces one at a time.
+
+The per-trace loop trains, labels and sets the statepath of each trace through
+the Trace API; it is measured on a subset of traces and extrapolated.
+
+    python benchmarks/bench_train_all.py --n-traces 5000 --n-frames 500
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from synthetic import make_movie
+
+from smtirf import Experiment
+from smtirf.detail.definitions import RawTraceBlock
+from smtirf.detail.writer import write_movie_to_hdf
+from smtirf.hmm import HiddenMarkovModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=5000)
+    parser.add_argument("--n-frames", type=int, default=500)
+    parser.add_argument("--n-states", type=int, default=2)
+    parser.add_argument("--chunksize", type=int, default=64)
+    parser.add_argument("--n-subset", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        savename = Path(tmpdir) / "movie.smtrc"
+        channel_1, channel_2, peaks, metadata = make_movie(args.n_traces, args.n_frames)
+        write_movie_to_hdf(
+            savename,
+            "fret",
+            0.0,
+            1.0,
+            RawTraceBlock(0, channel_1, channel_2),
+            peaks,
+            metadata,
+        )
+        print(f"{args.n_traces} traces x {args.n_frames} frames, K={args.n_states}")
+
+        expt = Experiment(savename)
+        n_subset = min(args.n_subset, len(expt))
+        tic = time.perf_counter()
+        for trace in expt[:n_subset]:
+            x = trace.fret
+            theta = HiddenMarkovModel.train_new(
+                "em", x, args.n_states, True, printWarnings=False
+            )
+            statepath = np.full(len(trace), -1)
+            statepath[trace.limits[0] : trace.limits[1]] = theta.label(x)
+            trace.set_statepath(statepath)
+        per_trace = (time.perf_counter() - tic) / n_subset * len(expt)
+        print(f"{'per-trace loop (extrapolated)':<36}{per_trace:>10.1f} s")
+
+        for n_jobs in sorted({1, os.cpu_count()}):
+            expt = Experiment(savename)
+            report = expt.train_all(
+                "em",
+                args.n_states,
+                n_jobs=n_jobs,
+                chunksize=args.chunksize,
+                printWarnings=False,
+            )
+            label = f"train_all, {n_jobs} processes"
+            print(
+                f"{label:<36}{report.wall_time:>10.1f} s  ({len(report.errors)} errors)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Time training one shared HMM over many traces against per-trace training.
+
+Per-trace training is measured on a subset of traces and extrapolated.
+
+    python benchmarks/bench_train_global.py --n-traces 10000 --n-frames 300
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from smtirf.hmm import HiddenMarkovModel
+from smtirf.hmm.models import ClassicHiddenMarkovModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-traces", type=int, default=10000)
+    parser.add_argument("--n-frames", type=int, default=300)
+    parser.add_argument("--n-states", type=int, default=3)
+    parser.add_argument("--model-type", default="em", choices=("em", "vb"))
+    parser.add_argument("--n-subset", type=int, default=100)
+    args = parser.parse_args()
+
+    K = args.n_states
+    np.random.seed(0)
+    theta = ClassicHiddenMarkovModel(
+        K,
+        np.ones(K) / K,
+        (np.eye(K) * 20 + 1) / (20 + K),
+        np.linspace(0, 1, K + 2)[1:-1],
+        np.full(K, 0.08**-2),
+        False,
+    )
+    X = [x for _, x in theta.simulate(M=args.n_traces, T=args.n_frames)]
+    options = dict(printWarnings=False)
+    if args.model_type == "vb":
+        options["repeats"] = 1
+    print(f"{args.n_traces} traces x {args.n_frames} frames, K={K}, {args.model_type}")
+
+    n_subset = min(args.n_subset, len(X))
+    tic = time.perf_counter()
+    for x in X[:n_subset]:
+        HiddenMarkovModel.train_new(args.model_type, x, K, False, **options)
+    per_trace = (time.perf_counter() - tic) / n_subset * len(X)
+    print(f"{'per-trace models (extrapolated)':<36}{per_trace:>10.1f} s")
+
+    for n_jobs in sorted({1, os.cpu_count()}):
+        tic = time.perf_counter()
+        theta = HiddenMarkovModel.train_global(
+            args.model_type, X, K, False, n_jobs=n_jobs, **options
+        )
+        elapsed = time.perf_counter() - tic
+        label = f"global model, {n_jobs} threads"
+        print(
+            f"{label:<36}{elapsed:>10.1f} s  ({theta.exitFlag.iterations} iterations)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Synthetic data generators shared by the benchmark scripts."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from skimage.io import imsave
+
+from smtirf.detail.definitions import Coordinates, Point
+from smtirf.detail.metadata import MovieMetadata
+
+TIMESTAMP = datetime(year=2025, month=8, day=24, hour=16, minute=36, second=42)
+
+
+def write_pma_movie(
+    base, stem="movie", n_traces=1000, n_frames=5000, offset_seconds=0, seed=0
+):
+    """Write a synthetic set of PMA files and return the .traces path.
+
+    Frames are written in blocks, so generating a large movie does not require
+    holding the whole movie in memory.
+    """
+    rng = np.random.default_rng(seed)
+    timestamp = TIMESTAMP + timedelta(seconds=offset_seconds)
+    filename = base / f"{stem}.traces"
+
+    with open(filename, "wb") as F:
+        np.array([n_frames], dtype=np.int32).tofile(F)
+        np.array([n_traces * 2], dtype=np.int16).tofile(F)
+        for start in range(0, n_frames, 1000):
+            n = min(1000, n_frames - start)
+            rng.poisson(300, size=(n, n_traces * 2)).astype(np.int16).tofile(F)
+
+    coords = rng.uniform(0, 256, size=(n_traces * 2, 2))
+    with open(filename.with_suffix(".pks"), "w") as F:
+        for j, (x, y) in enumerate(coords):
+            F.write(f"{j + 1:8d} {x:9.3f} {y:9.3f}  5.01e+000\n")
+
+    with open(filename.with_suffix(".log"), "w") as F:
+        F.write(
+            "Filming Date and Time\n"
+            f"{timestamp.strftime('%a %b %d %H:%M:%S %Y')}\n\n"
+            "Background\n408\n"
+            "Data Scaler\n800\n"
+            "Gain\n300\n"
+            "Exposure Time [ms]\n100.000\n"
+        )
+
+    imsave(
+        base / f"{stem}_ave.tif",
+        rng.integers(0, 255, size=(512, 512), dtype=np.uint8),
+        check_contrast=False,
+    )
+    return filename
+
+
+def make_movie(n_traces=1000, n_frames=5000, seed=0):
+    """Return in-memory (channel_1, channel_2, peaks, metadata) for a movie."""
+    rng = np.random.default_rng(seed)
+    channel_1 = rng.poisson(300, size=(n_traces, n_frames)).astype(np.int16)
+    channel_2 = rng.poisson(300, size=(n_traces, n_frames)).astype(np.int16)
+    peaks = [Coordinates(Point(j, j), Point(j + 256, j)) for j in range(n_traces)]
+    metadata = MovieMetadata(
+        n_traces=n_traces,
+        n_frames=n_frames,
+        src_filename="synthetic.traces",
+        timestamp=TIMESTAMP,
+        frame_length=0.1,
+        ccd_gain=300,
+        data_scaler=800,
+        log={},
+    )
+    return channel_1, channel_2, peaks, metadata
@@ -44,4 +44,6 @@ from . import hmm, results, util
 from .auxiliary import SMMovieList, SMSpotCoordinate, SMTraceID, where
 from .experiments import Experiment
 from .hmm.models import HiddenMarkovModel
-from .io.import_dispatch import load_from_pma
+from .io.import_dispatch import load_from_pma, load_from_pma_batch, load_from_pma_live
+from .io.merge import merge
+from .io.rechunk import rechunk
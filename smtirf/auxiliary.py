@@ -140,5 +140,4 @@ def where(condition):
         # If the end of condition is True, append the length of the array
         idx = np.r_[idx, condition.size]
     # Reshape the result into two columns
-    idx.shape = (-1, 2)
-    return idx
+    return idx.reshape((-1, 2))
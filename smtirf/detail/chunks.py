@@ -0,0 +1,128 @@
+import zlib
+
+import numpy as np
+from h5py import h5z
+
+# filters which can be decoded outside of HDF5, in the order they are applied
+DECODABLE_FILTERS = (h5z.FILTER_SHUFFLE, h5z.FILTER_DEFLATE, h5z.FILTER_FLETCHER32)
+
+
+def can_decode_rows(dataset):
+    """Whether read_row_chunks can read a dataset; see DECODABLE_FILTERS."""
+    if dataset.ndim != 2 or dataset.chunks is None or dataset.chunks[0] != 1:
+        return False
+    filters = _filters(dataset)
+    return all(code in DECODABLE_FILTERS for code in filters) and filters == sorted(
+        filters, key=DECODABLE_FILTERS.index
+    )
+
+
+def read_row_chunks(dataset, index):
+    """Read rows of a dataset chunked by row, decoding the chunks outside of HDF5.
+
+    h5py serializes calls into HDF5 and holds the GIL while HDF5 decompresses data.
+    Here only the raw chunks are read through HDF5. They are inflated by zlib, which
+    releases the GIL, and checksums and byte shuffling are undone in a few
+    vectorized operations over all chunks, so background threads reading rows
+    mostly leave the GIL to other Python code. Checksums are verified as HDF5
+    would.
+
+    Parameters
+    ----------
+    dataset: h5py.Dataset
+        [N x T] dataset for which can_decode_rows() is True
+    index: Iterable[int]
+        rows to read
+
+    Returns
+    -------
+    np.ndarray:
+        [len(index) x T] rows, in the order of index
+    """
+    filters = _filters(dataset)
+    n_frames, width = dataset.shape[1], dataset.chunks[1]
+    offsets = range(0, n_frames, width)
+    coords = [(int(i), offset) for i in index for offset in offsets]
+    chunks = [_read_chunk(dataset.id, coord) for coord in coords]
+
+    decoded = np.empty((len(coords), width), dtype=dataset.dtype)
+    filtered = []  # chunks which passed through all filters
+    for k, (coord, chunk) in enumerate(zip(coords, chunks, strict=True)):
+        if chunk is None:
+            decoded[k] = dataset.fillvalue
+        elif chunk[0] != 0:  # some filters were skipped; let HDF5 decode it
+            row, offset = coord
+            values = dataset[row, offset : offset + width]
+            decoded[k, : len(values)] = values
+        else:
+            filtered.append(k)
+
+    payloads = [chunks[k][1] for k in filtered]
+    if h5z.FILTER_FLETCHER32 in filters:
+        payloads = _check_fletcher32(payloads)
+    if h5z.FILTER_DEFLATE in filters:
+        payloads = [zlib.decompress(payload) for payload in payloads]
+    if payloads:
+        data = np.frombuffer(b"".join(payloads), dtype=np.uint8)
+        if h5z.FILTER_SHUFFLE in filters:
+            data = _unshuffle(data, len(payloads), dataset.dtype.itemsize, width)
+        decoded[filtered] = data.view(dataset.dtype).reshape((len(payloads), width))
+
+    rows = decoded.reshape((len(coords) // max(len(offsets), 1), -1))
+    return rows[:, :n_frames]
+
+
+def _filters(dataset):
+    dcpl = dataset.id.get_create_plist()
+    return [dcpl.get_filter(k)[0] for k in range(dcpl.get_nfilters())]
+
+
+def _read_chunk(dataset_id, offset):
+    try:
+        return dataset_id.read_direct_chunk(offset)
+    except RuntimeError:  # chunk is not allocated
+        return None
+
+
+def _unshuffle(data, n_chunks, itemsize, width):
+    """Interleave the byte planes written by the HDF5 shuffle filter."""
+    planes = data.reshape((n_chunks, itemsize, width))
+    unshuffled = np.empty((n_chunks, width, itemsize), dtype=np.uint8)
+    for k in range(itemsize):
+        unshuffled[:, :, k] = planes[:, k, :]
+    return unshuffled
+
+
+def _check_fletcher32(payloads):
+    """Verify and strip the checksums appended by the HDF5 fletcher32 filter.
+
+    The checksums of all payloads are computed in one pass over their concatenated
+    16 bit big-endian words.
+    """
+    data = [payload[:-4] for payload in payloads]
+    stored = np.array(
+        [int.from_bytes(payload[-4:], "little") for payload in payloads],
+        dtype=np.uint64,
+    )
+    padded = [d + b"\0" if len(d) % 2 else d for d in data]
+    lengths = np.array([len(d) // 2 for d in padded], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    words = np.frombuffer(b"".join(padded), dtype=">u2").astype(np.uint64)
+
+    # sum1 = sum(w_i), sum2 = sum((n - i) w_i) over the words of each payload
+    local = np.arange(len(words)) - np.repeat(starts, lengths)
+    weights = (np.repeat(lengths, lengths) - local).astype(np.uint64)
+    sum1 = np.add.reduceat(words, starts) % 0xFFFF
+    sum2 = np.add.reduceat(words * weights, starts) % 0xFFFF
+
+    # HDF5 reduces the sums to 1..0xffff, so compare them modulo 0xffff; early
+    # HDF5 versions stored the checksum byte-swapped
+    swapped = stored.astype("<u4").byteswap().astype(np.uint64)
+    valid = np.zeros(len(payloads), dtype=bool)
+    for checksum in (stored, swapped):
+        valid |= ((checksum & 0xFFFF) % 0xFFFF == sum1) & (
+            (checksum >> 16) % 0xFFFF == sum2
+        )
+    if not valid.all():
+        raise OSError("data error detected by fletcher32 checksum")
+    return data
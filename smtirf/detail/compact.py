@@ -0,0 +1,122 @@
+import itertools
+
+import h5py
+import numpy as np
+
+from .writer import PER_FRAME_DATASETS
+
+BAND_BYTES = 2**26
+ROW_DATASETS = ("trace_ids", "traces/metadata") + PER_FRAME_DATASETS
+
+
+def copy_movie_rows(group, parent, name, index):
+    """Copy a movie group, keeping only some of its traces.
+
+    Datasets stored in chunks of single rows, the default for raw traces and
+    statepaths, are copied chunk by chunk as raw compressed bytes, so no data is
+    decompressed or recompressed; unallocated chunks stay unallocated. Other
+    datasets with one row per trace are read and written in bands of at most
+    BAND_BYTES. Compression filters and fill values are kept, and everything else is
+    copied unchanged.
+
+    Parameters
+    ----------
+    group: h5py.Group
+        movie group to copy
+    parent: h5py.Group
+        group to create the copy in
+    name: str
+        name of the copy
+    index: np.ndarray
+        sorted indices of the traces to keep
+
+    Returns
+    -------
+    h5py.Group:
+        the copied movie group
+    """
+    index = np.asarray(index, dtype=np.intp)
+    target = _copy_group(group, parent, name, index)
+    target.attrs["n_traces"] = len(index)
+    return target
+
+
+def _copy_group(group, parent, name, index, prefix=""):
+    target = parent.create_group(name)
+    target.attrs.update(group.attrs)
+    for key, node in group.items():
+        path = f"{prefix}{key}"
+        if isinstance(node, h5py.Group):
+            _copy_group(node, target, key, index, prefix=f"{path}/")
+        elif path in ROW_DATASETS:
+            _copy_rows(node, target, key, index)
+        else:
+            group.copy(node, target, key)
+    return target
+
+
+def _copy_rows(dataset, group, name, index):
+    """Copy the rows index of dataset into a new dataset in group."""
+    if dataset.chunks is None:
+        target = group.create_dataset(name, data=dataset[index], dtype=dataset.dtype)
+        target.attrs.update(dataset.attrs)
+        return
+
+    n_rows = len(index)
+    chunks = (min(dataset.chunks[0], max(n_rows, 1)),) + dataset.chunks[1:]
+    maxshape = (None if dataset.maxshape[0] is None else n_rows,) + dataset.maxshape[1:]
+    target = group.create_dataset(
+        name,
+        shape=(n_rows,) + dataset.shape[1:],
+        maxshape=maxshape,
+        dtype=dataset.dtype,
+        chunks=chunks,
+        dcpl=dataset.id.get_create_plist(),  # keeps filters and fill value
+    )
+    target.attrs.update(dataset.attrs)
+
+    if dataset.chunks[0] == 1:
+        _copy_row_chunks(dataset, target, index)
+        return
+
+    row_bytes = max(dataset.dtype.itemsize * int(np.prod(dataset.shape[1:])), 1)
+    rows = max(BAND_BYTES // (chunks[0] * row_bytes), 1) * chunks[0]
+    for start in range(0, n_rows, rows):
+        data = dataset[index[start : start + rows]]
+        if dataset.dtype.fields is None and np.all(data == dataset.fillvalue):
+            continue
+        target[start : start + len(data)] = data
+
+
+def _copy_row_chunks(dataset, target, index):
+    """Copy allocated chunks of single rows without filtering them."""
+    source, destination = dataset.id, target.id
+    offsets = list(
+        itertools.product(
+            *(
+                range(0, n, size)
+                for n, size in zip(dataset.shape[1:], dataset.chunks[1:], strict=True)
+            )
+        )
+    )
+    allocated = _allocated_chunks(source)
+    for row, trace_index in enumerate(index):
+        for offset in offsets:
+            coord = (int(trace_index),) + offset
+            if coord not in allocated:
+                continue
+            filter_mask, chunk = source.read_direct_chunk(coord)
+            destination.write_direct_chunk((row,) + offset, chunk, filter_mask)
+
+
+def _allocated_chunks(dataset_id):
+    """Return the offsets of all allocated chunks, from one pass over the index."""
+    offsets = set()
+    if dataset_id.get_num_chunks() == 0:
+        return offsets
+    if hasattr(dataset_id, "chunk_iter"):  # h5py >= 3.8
+        dataset_id.chunk_iter(lambda info: offsets.add(info.chunk_offset))
+    else:
+        for k in range(dataset_id.get_num_chunks()):
+            offsets.add(dataset_id.get_chunk_info(k).chunk_offset)
+    return offsets
@@ -1,14 +1,119 @@
-from dataclasses import dataclass
-from typing import Callable
+import itertools
+import threading
+from collections import OrderedDict
 
-from .metadata import TraceMetadata
+import numpy as np
+
+STAGES = ("raw", "baselined", "corrected", "final")
+STATEPATH_KINDS = ("photophysics", "conformation")
+DEFAULT_SIGNAL_CACHE_BYTES = 2**28
+# HDF5 chunk cache of each open dataset; holds a band of tile or block chunks
+CHUNK_CACHE_BYTES = 2**24
+CHUNK_CACHE_SLOTS = 10007  # prime, as recommended for the chunk hash table
+
+_LOADER_TOKENS = itertools.count()
+
+
+class SignalCache:
+    """Least-recently-used cache of trace signal arrays with a total byte budget.
+
+    Cached arrays are made read-only, since they are shared between calls.
+
+    Parameters
+    ----------
+    max_bytes: int
+        maximum total size of cached arrays
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SIGNAL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """Return the cached array for key, or None."""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Cache value under key and return it; arrays over budget are not cached."""
+        value.flags.writeable = False
+        if value.nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            if (previous := self._items.pop(key, None)) is not None:
+                self.n_bytes -= previous.nbytes
+            self._items[key] = value
+            self.n_bytes += value.nbytes
+            self._evict()
+        return value
+
+    def resize(self, max_bytes):
+        """Set the byte budget, evicting least recently used arrays as needed."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.n_bytes = 0
+
+    def _evict(self):
+        while self.n_bytes > self.max_bytes:
+            _, value = self._items.popitem(last=False)
+            self.n_bytes -= value.nbytes
+
+
+# shared by all traces; use SIGNAL_CACHE.resize() to change the memory budget
+SIGNAL_CACHE = SignalCache()
+
+
+def signal_key(loader, index, stage, kind, revision=0):
+    """Return the SIGNAL_CACHE key of a trace signal.
+
+    Raw signals do not depend on trace metadata and use revision 0.
+    """
+    return (loader.cache_token, int(index), stage, kind, revision)
 
 
-@dataclass(repr=False)
 class SignalDispatcher:
-    _time: Callable
-    _channel_1: Callable
-    _channel_2: Callable
+    """Signals of a trace at one stage of the correction pipeline.
+
+    Parameters
+    ----------
+    trace: Trace
+        trace providing the signals
+    stage: {"raw", "baselined", "corrected", "final"}
+        stage of the correction pipeline
+    """
+
+    __slots__ = ("_trace", "_stage")
+
+    def __init__(self, trace, stage):
+        if stage not in STAGES:
+            raise ValueError(f"stage must be in {STAGES}; got '{stage}'")
+        self._trace = trace
+        self._stage = stage
+
+    def _time(self):
+        return self._trace._get_signal(self._stage, "time")
+
+    def _channel_1(self):
+        return self._trace._get_signal(self._stage, "channel_1")
+
+    def _channel_2(self):
+        return self._trace._get_signal(self._stage, "channel_2")
 
     @property
     def time(self):
@@ -16,11 +121,12 @@ class SignalDispatcher:
 
     @property
     def total(self):
-        return self._channel_1() + self._channel_2()
+        return self._trace._get_signal(self._stage, "total")
 
 
-@dataclass(repr=False)
 class FretDispatcher(SignalDispatcher):
+    __slots__ = ()
+
     @property
     def donor(self):
         return self._channel_1()
@@ -31,11 +137,12 @@ class FretDispatcher(SignalDispatcher):
 
     @property
     def fret(self):
-        return self.acceptor / self.total
+        return self._trace._get_signal(self._stage, "fret")
 
 
-@dataclass(repr=False)
 class TwoColorDispatcher(SignalDispatcher):
+    __slots__ = ()
+
     @property
     def channel_1(self):
         return self._channel_1()
@@ -45,50 +152,107 @@ class TwoColorDispatcher(SignalDispatcher):
         return self._channel_2()
 
 
-class TraceLoader:
-    def __init__(self, file_handle, uid):
+class MovieLoader:
+    """Read access to the datasets of a single movie, shared by all of its traces.
+
+    Dataset handles are opened on first use and cached; movie and experiment
+    attributes are read once. Statepaths set through set_statepath() are kept in
+    pending_statepaths, keyed by kind and trace index, until they are saved.
+    cache_token identifies the loaded data in SIGNAL_CACHE keys and changes
+    whenever the data is refreshed.
+
+    Parameters
+    ----------
+    file_handle: h5py.File
+        open .smtrc file
+    movie_uid: str
+        UID of the movie
+    """
+
+    def __init__(self, file_handle, movie_uid):
         self.file_handle = file_handle
-        self.movie_uid, index = uid.split("_")
-        self.index = int(index)
-        self.movie_path = f"movies/movie_{self.movie_uid}"
-
-    def get_metadata(self):
-        # todo: validate trace uid matches expected
-        record = self.file_handle[self.movie_path]["traces/metadata"][self.index]
-        record = dict(zip(record.dtype.names, record, strict=False))
-        record["n_frames"] = self.n_frames
-        record["movie_uid"] = self.movie_uid
-        record["index"] = self.index
-        return TraceMetadata.from_record_dict(record)
-
-    def get_data(self, kind):
-        if kind not in ("channel_1, channel_2"):
+        self.movie_uid = movie_uid
+        self.movie_path = f"movies/movie_{movie_uid}"
+        self._datasets = {}
+        self.cache_token = next(_LOADER_TOKENS)
+        self.pending_statepaths = {kind: {} for kind in STATEPATH_KINDS}
+        self.experiment_type = file_handle.attrs["experiment_type"]
+        self._read_movie_attrs()
+
+    def _read_movie_attrs(self):
+        attrs = self.file_handle[self.movie_path].attrs
+        self.frame_length = attrs["frame_length"]
+        # SWMR readers do not see attribute updates; the dataset extent is current
+        self.n_frames = int(self.dataset("traces/channel_1").shape[1])
+
+    def dataset(self, name):
+        try:
+            return self._datasets[name]
+        except KeyError:
+            dataset = self.file_handle[self.movie_path][name]
+            self._datasets[name] = dataset
+            return dataset
+
+    def get_data(self, kind, index):
+        if kind not in ("channel_1", "channel_2"):
             raise ValueError(f"kind must be 'channel_1' or 'channel_2; got '{kind}'")
-        return self.file_handle[self.movie_path][f"traces/{kind}"][self.index]
+        return self.dataset(f"traces/{kind}")[index]
+
+    def get_statepath(self, kind, index):
+        _validate_statepath_kind(kind)
+        try:
+            return self.pending_statepaths[kind][index].copy()
+        except KeyError:
+            return self.dataset(f"statepaths/{kind}")[index]
+
+    def set_statepath(self, kind, index, statepath):
+        """Stage a statepath of a trace to be written on the next save.
 
-    def get_statepath(self, kind):
-        if kind not in ("conformation, photophysics"):
+        Returns
+        -------
+        np.ndarray:
+            statepath cast to the dtype of the statepath dataset
+        """
+        _validate_statepath_kind(kind)
+        dataset = self.dataset(f"statepaths/{kind}")
+        statepath = np.array(statepath, dtype=dataset.dtype)
+        if statepath.shape != (self.n_frames,):
             raise ValueError(
-                f"kind must be 'conformation' or 'photophysics; got '{kind}'"
+                f"statepath must have shape ({self.n_frames},); got {statepath.shape}"
             )
-        return self.file_handle[self.movie_path]["statepaths/conformation"][self.index]
+        self.pending_statepaths[kind][index] = statepath
+        return statepath.copy()
 
     @property
-    def experiment_type(self):
-        return self.file_handle.attrs["experiment_type"]
+    def has_pending_statepaths(self):
+        return any(self.pending_statepaths.values())
 
-    @property
-    def frame_length(self):
-        return self.file_handle[self.movie_path].attrs["frame_length"]
+    def release(self):
+        """Close cached dataset handles; they are reopened on next use."""
+        self._datasets = {}
 
-    @property
-    def n_frames(self):
-        return self.file_handle[self.movie_path].attrs["n_frames"]
+    def rebind(self, file_handle):
+        """Use a reopened handle of the same file.
 
-    @property
-    def bleedthrough(self):
-        return self.file_handle.attrs["bleedthrough"]
+        The cache token is kept, since the trace data in the file is unchanged.
+        """
+        self.file_handle = file_handle
+        self.release()
 
-    @property
-    def gamma(self):
-        return self.file_handle.attrs["gamma"]
+    def refresh(self):
+        """Refresh datasets and attributes written by a SWMR writer."""
+        for name in (
+            "traces/channel_1",
+            "traces/channel_2",
+            "traces/metadata",
+            "statepaths/photophysics",
+            "statepaths/conformation",
+        ):
+            self.dataset(name).refresh()
+        self._read_movie_attrs()
+        self.cache_token = next(_LOADER_TOKENS)
+
+
+def _validate_statepath_kind(kind):
+    if kind not in STATEPATH_KINDS:
+        raise ValueError(f"kind must be 'conformation' or 'photophysics; got '{kind}'")
@@ -16,6 +16,33 @@ class RawTrace:
         return len(self.channel_1)
 
 
+@dataclass(frozen=True)
+class RawTraceBlock:
+    """Contiguous block of raw trace data, traces as rows.
+
+    Attributes
+    ----------
+    start : int
+        Index of the first trace in the block within the movie.
+    channel_1 : np.ndarray
+        [N x T] channel 1 data.
+    channel_2 : np.ndarray
+        [N x T] channel 2 data.
+    """
+
+    start: int
+    channel_1: np.ndarray
+    channel_2: np.ndarray
+
+    @property
+    def n_traces(self):
+        return self.channel_1.shape[0]
+
+    @property
+    def stop(self):
+        return self.start + self.n_traces
+
+
 @dataclass(frozen=True)
 class Point:
     x: float
@@ -0,0 +1,135 @@
+import hashlib
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+HASH_BLOCK_SIZE = 2**20
+
+MANIFEST_DTYPE = np.dtype(
+    [
+        ("src_path", h5py.string_dtype("utf-8")),
+        ("movie_uid", h5py.string_dtype("utf-8", length=32)),
+        ("size", np.uint64),
+        ("mtime", np.float64),
+        ("content_hash", h5py.string_dtype("ascii", length=32)),
+    ]
+)
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """Record of the source files a movie was imported from.
+
+    Attributes
+    ----------
+    src_path : str
+        Absolute path of the movie's .traces file; used as the manifest key.
+    size : int
+        Total size in bytes of all source files.
+    mtime : float
+        Latest modification time of all source files.
+    content_hash : str
+        Hex digest of the contents of all source files; empty if not computed.
+    movie_uid : str or None
+        UID of the movie group the files were imported into.
+    """
+
+    src_path: str
+    size: int
+    mtime: float
+    content_hash: str = ""
+    movie_uid: str | None = None
+
+    @classmethod
+    def from_files(cls, required_files, compute_hash=True):
+        """Create an entry from the dictionary of a movie's required files.
+
+        Parameters
+        ----------
+        required_files: dict[str, Path]
+            source files for a single movie, must include the "traces" key
+        compute_hash: bool
+            hash the file contents; otherwise only size and mtime are recorded
+        """
+        paths = sorted_paths(required_files)
+        stats = [path.stat() for path in paths]
+        return cls(
+            src_path=str(Path(required_files["traces"]).resolve()),
+            size=sum(stat.st_size for stat in stats),
+            mtime=max(stat.st_mtime for stat in stats),
+            content_hash=hash_files(paths) if compute_hash else "",
+        )
+
+    def with_hash(self, required_files):
+        return replace(self, content_hash=hash_files(sorted_paths(required_files)))
+
+    def with_movie_uid(self, movie_uid):
+        return replace(self, movie_uid=movie_uid)
+
+    def has_same_stat(self, other):
+        return self.size == other.size and self.mtime == other.mtime
+
+    def as_record(self):
+        return (
+            self.src_path,
+            self.movie_uid or "",
+            self.size,
+            self.mtime,
+            self.content_hash,
+        )
+
+
+def sorted_paths(required_files):
+    """Return the paths of a movie's required files in a stable order."""
+    return [Path(required_files[key]) for key in sorted(required_files)]
+
+
+def hash_files(paths):
+    """Return a BLAKE2b digest of the concatenated contents of paths."""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, "rb") as F:
+            while block := F.read(HASH_BLOCK_SIZE):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(file_handle):
+    """Return the import manifest of a file as a dict keyed by source path."""
+    if "manifest" not in file_handle:
+        return {}
+
+    entries = {}
+    for record in file_handle["manifest"][:]:
+        src_path = record["src_path"].decode("utf-8")
+        entries[src_path] = ManifestEntry(
+            src_path=src_path,
+            size=int(record["size"]),
+            mtime=float(record["mtime"]),
+            content_hash=record["content_hash"].decode("ascii"),
+            movie_uid=record["movie_uid"].decode("utf-8") or None,
+        )
+    return entries
+
+
+def write_manifest_entry(file_handle, entry):
+    """Add an entry to the import manifest, replacing any entry for the same source."""
+    if "manifest" not in file_handle:
+        file_handle.create_dataset(
+            "manifest",
+            shape=(0,),
+            maxshape=(None,),
+            dtype=MANIFEST_DTYPE,
+            chunks=(64,),
+        )
+    dataset = file_handle["manifest"]
+
+    src_paths = [path.decode("utf-8") for path in dataset.fields("src_path")[:]]
+    try:
+        index = src_paths.index(entry.src_path)
+    except ValueError:
+        index = len(src_paths)
+        dataset.resize((index + 1,))
+    dataset[index] = entry.as_record()
@@ -1,3 +1,4 @@
+import itertools
 import json
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -62,6 +63,41 @@ TRACE_DTYPE = np.dtype(
         ("is_selected", bool),
     ]
 )
+# stop of traces in a movie that is still being acquired; read as its last frame
+STOP_AT_END = np.iinfo(np.uint32).max
+
+
+def make_trace_uids(movie_uid, n_traces):
+    """Return an array of Trace UIDs for all traces in a movie."""
+    indices = np.char.zfill(np.arange(n_traces).astype(str), 4)
+    return np.char.add(f"{movie_uid}_", indices)
+
+
+def make_trace_records(movie_metadata, peaks):
+    """Return default metadata records for all traces in a movie.
+
+    Parameters
+    ----------
+    movie_metadata: MovieMetadata
+        movie metadata
+    peaks: np.ndarray or List[Coordinates]
+        [N x 4] array of peak coordinates [ch1_x, ch1_y, ch2_x, ch2_y] per trace
+
+    Returns
+    -------
+    np.ndarray
+        structured array with dtype TRACE_DTYPE
+    """
+    if not isinstance(peaks, np.ndarray):
+        peaks = np.array([peak.as_list() for peak in peaks], dtype=np.float32)
+    peaks = peaks.reshape((-1, 4))
+
+    records = np.zeros(movie_metadata.n_traces, dtype=TRACE_DTYPE)
+    records["trace_id"] = make_trace_uids(movie_metadata.uid, movie_metadata.n_traces)
+    for k, name in enumerate(("ch1_x", "ch1_y", "ch2_x", "ch2_y")):
+        records[name] = peaks[:, k]
+    records["stop"] = movie_metadata.n_frames
+    return records
 
 
 @dataclass(slots=True)
@@ -127,3 +163,228 @@ class TraceMetadata:
                 self.is_selected,
             ]
         )
+
+
+PEAK_FIELDS = ("ch1_x", "ch1_y", "ch2_x", "ch2_y")
+
+# revisions are unique over all stores, so revision numbers are never reused
+_REVISIONS = itertools.count()
+
+
+class TraceMetadataStore:
+    """Columnar table of the trace metadata of all movies in a file.
+
+    Each movie's metadata table is read in a single call and kept as one array per
+    field over all traces in the file, so per-trace access is an array lookup and
+    experiment-wide queries are vectorized. Rows of a movie are contiguous and in
+    trace index order.
+
+    Gamma and bleedthrough corrections are initialized from the file attributes and
+    can be changed per trace; they are not saved. Each row has a revision number,
+    which changes whenever a field that affects the trace signals is modified, for
+    use as a cache invalidation key, and a dirty flag, which is set whenever a field
+    stored in the file is modified and cleared when the row is saved.
+
+    Parameters
+    ----------
+    file_handle: h5py.File
+        open .smtrc file
+    """
+
+    def __init__(self, file_handle):
+        self._file_handle = file_handle
+        self.reload()
+
+    def reload(self):
+        """Re-read all metadata tables from file, discarding unsaved changes."""
+        groups = list(self._file_handle["movies"].values())
+        tables = [group["traces/metadata"][()] for group in groups]
+        counts = [len(table) for table in tables]
+        records = (
+            np.concatenate(tables) if len(tables) else np.zeros(0, dtype=TRACE_DTYPE)
+        )
+
+        self.movie_uids = [group.name.rsplit("movie_", 1)[-1] for group in groups]
+        self.movie_slices = {}
+        for movie_uid, start, n_traces in zip(
+            self.movie_uids, np.cumsum([0] + counts), counts, strict=False
+        ):
+            self.movie_slices[movie_uid] = slice(int(start), int(start + n_traces))
+
+        self.movie_index = np.repeat(np.arange(len(groups)), counts)
+        self.index = np.concatenate(
+            [np.arange(n_traces) for n_traces in counts] or [np.zeros(0, dtype=int)]
+        )
+        # taken from the dataset extent, which SWMR readers see grow, unlike attrs
+        self.n_frames = np.repeat(
+            [int(group["traces/channel_1"].shape[1]) for group in groups], counts
+        ).astype(np.int64)
+        self.trace_uids = records["trace_id"].copy()  # utf-8 encoded
+        self.peaks = np.column_stack([records[name] for name in PEAK_FIELDS])
+        self.start = np.ascontiguousarray(records["start"])
+        self.stop = np.minimum(records["stop"], self.n_frames).astype(np.uint32)
+        self.ch1_offset = np.ascontiguousarray(records["ch1_offset"])
+        self.ch2_offset = np.ascontiguousarray(records["ch2_offset"])
+        self.is_selected = np.ascontiguousarray(records["is_selected"])
+        self.gamma = np.full(len(records), self._file_handle.attrs["gamma"], float)
+        self.bleedthrough = np.full(
+            len(records), self._file_handle.attrs["bleedthrough"], float
+        )
+        self.revision = np.full(len(records), next(_REVISIONS), dtype=np.uint64)
+        self.dirty = np.zeros(len(records), dtype=bool)
+        self._rows = None  # Trace UID -> row, built on first lookup
+
+    def rebind(self, file_handle):
+        """Use a reopened handle of the same file, keeping all loaded metadata."""
+        self._file_handle = file_handle
+
+    def __len__(self):
+        return len(self.trace_uids)
+
+    def __getitem__(self, trace_uid):
+        return TraceMetadataView(self, self.row(trace_uid))
+
+    def row(self, trace_uid):
+        """Return the row of a trace by its Trace UID."""
+        if self._rows is None:
+            self._rows = dict(
+                zip(
+                    np.char.decode(self.trace_uids, "utf-8").tolist(),
+                    range(len(self)),
+                    strict=True,
+                )
+            )
+        try:
+            return self._rows[trace_uid]
+        except KeyError:
+            raise KeyError(f"no trace with uid {trace_uid}") from None
+
+    def view(self, row):
+        return TraceMetadataView(self, row)
+
+    @property
+    def n_selected(self):
+        return int(np.count_nonzero(self.is_selected))
+
+    def records(self, rows):
+        """Return the metadata of rows as records with dtype TRACE_DTYPE."""
+        records = np.zeros(len(rows), dtype=TRACE_DTYPE)
+        records["trace_id"] = self.trace_uids[rows]
+        for k, name in enumerate(PEAK_FIELDS):
+            records[name] = self.peaks[rows, k]
+        for name in ("start", "stop", "ch1_offset", "ch2_offset", "is_selected"):
+            records[name] = getattr(self, name)[rows]
+        return records
+
+
+class TraceMetadataView:
+    """Metadata of a single trace, backed by a row of a TraceMetadataStore.
+
+    Provides the attributes of TraceMetadata. Assigning None to start or stop resets
+    them to the first or last frame of the trace.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    @property
+    def movie_uid(self):
+        return self._store.movie_uids[self._store.movie_index[self._row]]
+
+    @property
+    def n_frames(self):
+        return int(self._store.n_frames[self._row])
+
+    @property
+    def index(self):
+        return int(self._store.index[self._row])
+
+    @property
+    def peak(self):
+        return Coordinates.from_array(self._store.peaks[self._row].tolist())
+
+    @property
+    def start(self):
+        return int(self._store.start[self._row])
+
+    @start.setter
+    def start(self, value):
+        self._store.start[self._row] = 0 if value is None else value
+        self.touch()
+        self._store.dirty[self._row] = True
+
+    @property
+    def stop(self):
+        return int(self._store.stop[self._row])
+
+    @stop.setter
+    def stop(self, value):
+        self._store.stop[self._row] = self.n_frames if value is None else value
+        self.touch()
+        self._store.dirty[self._row] = True
+
+    @property
+    def ch1_offset(self):
+        return float(self._store.ch1_offset[self._row])
+
+    @ch1_offset.setter
+    def ch1_offset(self, value):
+        self._store.ch1_offset[self._row] = value
+        self.touch()
+        self._store.dirty[self._row] = True
+
+    @property
+    def ch2_offset(self):
+        return float(self._store.ch2_offset[self._row])
+
+    @ch2_offset.setter
+    def ch2_offset(self, value):
+        self._store.ch2_offset[self._row] = value
+        self.touch()
+        self._store.dirty[self._row] = True
+
+    @property
+    def gamma(self):
+        return float(self._store.gamma[self._row])
+
+    @gamma.setter
+    def gamma(self, value):
+        self._store.gamma[self._row] = value
+        self.touch()
+
+    @property
+    def bleedthrough(self):
+        return float(self._store.bleedthrough[self._row])
+
+    @bleedthrough.setter
+    def bleedthrough(self, value):
+        self._store.bleedthrough[self._row] = value
+        self.touch()
+
+    @property
+    def is_selected(self):
+        return bool(self._store.is_selected[self._row])
+
+    @is_selected.setter
+    def is_selected(self, value):
+        self._store.is_selected[self._row] = value
+        self._store.dirty[self._row] = True
+
+    @property
+    def trace_uid(self):
+        return self._store.trace_uids[self._row].decode("utf-8")
+
+    @property
+    def selected_slice(self):
+        return slice(self.start, self.stop)
+
+    @property
+    def revision(self):
+        return int(self._store.revision[self._row])
+
+    def touch(self):
+        """Mark the trace signals as changed."""
+        self._store.revision[self._row] = next(_REVISIONS)
@@ -0,0 +1,111 @@
+import numpy as np
+
+from .signals import read_channels
+
+METRICS = ("corrcoef", "snr", "mean_total", "length")
+# bytes of one [N x T] float matrix of a batch; a batch holds about five of them
+METRIC_BATCH_BYTES = 2**25
+_STALE = np.iinfo(np.uint64).max
+
+
+def compute_metrics(channel_1, channel_2, mask):
+    """Return quality metrics of many traces in one vectorized pass.
+
+    Parameters
+    ----------
+    channel_1: np.ndarray
+        [N x T] corrected channel 1 (donor) signals
+    channel_2: np.ndarray
+        [N x T] corrected channel 2 (acceptor) signals
+    mask: np.ndarray
+        [N x T] bool, frames within the selected range of each trace
+
+    Returns
+    -------
+    dict[str, np.ndarray]:
+        "corrcoef": Pearson correlation of channel 1 and channel 2
+        "snr": mean over standard deviation of the total intensity
+        "mean_total": mean total intensity
+        "length": number of frames in the selected range
+
+        Metrics which are undefined for a trace, eg for fewer than 2 frames, are NaN.
+    """
+    length = np.count_nonzero(mask, axis=1)
+    # the deviations are computed in place and reduced by row-wise dot products,
+    # so only the two masked copies of the channels are allocated
+    x = np.where(mask, channel_1, 0.0)
+    y = np.where(mask, channel_2, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = x.sum(axis=1) / length
+        mean_y = y.sum(axis=1) / length
+        outside = ~mask
+        for values, mean in ((x, mean_x), (y, mean_y)):
+            values -= mean[:, None]
+            values[outside] = 0.0
+        sxx = np.einsum("ij,ij->i", x, x)
+        syy = np.einsum("ij,ij->i", y, y)
+        sxy = np.einsum("ij,ij->i", x, y)
+        corrcoef = sxy / np.sqrt(sxx * syy)
+
+        mean_total = mean_x + mean_y
+        std_total = np.sqrt(np.maximum(sxx + syy + 2 * sxy, 0.0) / length)
+        snr = mean_total / std_total
+
+    return {
+        "corrcoef": np.clip(corrcoef, -1, 1),
+        "snr": snr,
+        "mean_total": mean_total,
+        "length": length,
+    }
+
+
+class TraceMetrics:
+    """Quality metrics of all traces in a TraceMetadataStore.
+
+    Metrics are computed from bulk reads of the final signals and cached per trace
+    until the trace's metadata revision changes, eg when its offsets or limits are
+    set; only those traces are recomputed.
+
+    Parameters
+    ----------
+    loaders: dict[str, MovieLoader]
+        loaders keyed by movie UID
+    store: TraceMetadataStore
+        trace metadata
+    """
+
+    def __init__(self, loaders, store):
+        self._loaders = loaders
+        self._store = store
+        self._values = {}
+        self._revision = np.zeros(0, dtype=np.uint64)
+
+    def __getitem__(self, name):
+        """Return a metric for all traces in store row order."""
+        if name not in METRICS:
+            raise KeyError(f"metric must be in {METRICS}; got '{name}'")
+        self.update()
+        return self._values[name]
+
+    def update(self):
+        """Compute metrics of traces changed since they were last computed."""
+        n_traces = len(self._store)
+        if len(self._revision) != n_traces:
+            self._values = {name: np.full(n_traces, np.nan) for name in METRICS}
+            self._revision = np.full(n_traces, _STALE, dtype=np.uint64)
+
+        (stale,) = np.nonzero(self._revision != self._store.revision)
+        n_frames = self._store.n_frames[stale].max(initial=1)
+        batch_size = max(METRIC_BATCH_BYTES // (8 * int(n_frames)), 1)
+        for start in range(0, len(stale), batch_size):
+            rows = stale[start : start + batch_size]
+            revision = self._store.revision[rows]
+            channels, mask = read_channels(
+                self._loaders, self._store, rows, ("channel_1", "channel_2")
+            )
+            metrics = compute_metrics(
+                channels["channel_1"], channels["channel_2"], mask
+            )
+            for name, values in metrics.items():
+                self._values[name][rows] = values
+            self._revision[rows] = revision
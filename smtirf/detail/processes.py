@@ -0,0 +1,12 @@
+import multiprocessing
+
+
+def process_context():
+    """Return a multiprocessing context starting workers from a fork server.
+
+    Forking the parent directly is unsafe once it runs threads, eg numba's after
+    HMM training. The fork server imports smtirf once, so workers start quickly.
+    """
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["smtirf"])
+    return context
@@ -0,0 +1,241 @@
+import ast
+import io
+import operator
+import tokenize
+from functools import reduce
+
+import numpy as np
+
+from .metrics import METRICS
+
+METADATA_COLUMNS = (
+    "start",
+    "stop",
+    "ch1_offset",
+    "ch2_offset",
+    "gamma",
+    "bleedthrough",
+    "n_frames",
+    "index",
+)
+PEAK_COLUMNS = ("ch1_x", "ch1_y", "ch2_x", "ch2_y")
+COLUMNS = (
+    METADATA_COLUMNS
+    + PEAK_COLUMNS
+    + METRICS
+    + ("is_selected", "selected", "movie", "trace_uid")
+)
+
+QUERY_FUNCTIONS = {"abs": np.abs, "isnan": np.isnan}
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+_COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: np.isin,
+    ast.NotIn: lambda a, b: ~np.isin(a, b),
+}
+
+
+class TraceColumns:
+    """Read-only mapping of per-trace metadata and metric columns.
+
+    Columns are arrays in experiment order. Metric columns are computed on first
+    access; see TraceMetrics.
+
+    Parameters
+    ----------
+    store: TraceMetadataStore
+        trace metadata
+    metrics: TraceMetrics
+        trace quality metrics
+    order: np.ndarray
+        store rows in experiment order
+    """
+
+    def __init__(self, store, metrics, order):
+        self._store = store
+        self._metrics = metrics
+        self._order = order
+
+    def __contains__(self, name):
+        return name in COLUMNS
+
+    def __iter__(self):
+        return iter(COLUMNS)
+
+    def __len__(self):
+        return len(COLUMNS)
+
+    @property
+    def n_traces(self):
+        return len(self._order)
+
+    def __getitem__(self, name):
+        store = self._store
+        if name in METRICS:
+            column = self._metrics[name]
+        elif name in METADATA_COLUMNS:
+            column = getattr(store, name)
+        elif name in PEAK_COLUMNS:
+            column = store.peaks[:, PEAK_COLUMNS.index(name)]
+        elif name in ("is_selected", "selected"):
+            column = store.is_selected
+        elif name == "movie":
+            column = np.array(store.movie_uids)[store.movie_index]
+        elif name == "trace_uid":
+            column = np.char.decode(store.trace_uids, "utf-8")
+        else:
+            raise KeyError(f"unknown column '{name}'; must be in {COLUMNS}")
+        return column[self._order]
+
+
+class TraceSelection:
+    """Lightweight view of a subset of the traces of an experiment.
+
+    Parameters
+    ----------
+    experiment: Experiment
+        parent experiment
+    indices: np.ndarray
+        positions of the traces in experiment order
+    """
+
+    __slots__ = ("_experiment", "indices")
+
+    def __init__(self, experiment, indices):
+        self._experiment = experiment
+        self.indices = np.asarray(indices, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._experiment[k] for k in self.indices[index]]
+        return self._experiment[self.indices[index]]
+
+    def __iter__(self):
+        for k in self.indices:
+            yield self._experiment[k]
+
+    def __str__(self):
+        return f"{self.__class__.__name__}\t{len(self)}/{len(self._experiment)} traces"
+
+    @property
+    def rows(self):
+        """Rows of the traces in the experiment's TraceMetadataStore."""
+        return self._experiment._order[self.indices]
+
+    def set_selected(self, value=True):
+        """Set is_selected of all traces in the view."""
+        if not isinstance(value, bool):
+            raise ValueError("value must be of type bool.")
+        self._experiment._set_selected(self.rows, value)
+
+
+def evaluate_query(expression, columns, variables=None):
+    """Evaluate a query expression to a boolean mask over all traces.
+
+    Expressions combine column names, numeric and string constants and variables
+    with arithmetic, comparisons (including chained comparisons and ``in``), the
+    functions in QUERY_FUNCTIONS, and the elementwise logical operators ``&``,
+    ``|`` and ``~``. As in pandas, ``&`` and ``|`` bind like ``and`` and ``or``, so
+    ``corrcoef < -0.5 & length > 200`` needs no parentheses. Nothing else is
+    evaluated.
+
+    Parameters
+    ----------
+    expression: str
+        query expression
+    columns: TraceColumns
+        columns available by name
+    variables: dict or None
+        additional names available in the expression; these take precedence over
+        columns
+
+    Returns
+    -------
+    np.ndarray:
+        [N] bool mask
+    """
+    variables = {} if variables is None else variables
+    try:
+        tree = ast.parse(_rewrite_logical_operators(expression), mode="eval")
+    except (SyntaxError, tokenize.TokenError) as err:
+        raise ValueError(f"invalid query '{expression}': {err}") from None
+
+    def resolve(name):
+        if name in variables:
+            return variables[name]
+        if name in columns:
+            return columns[name]
+        raise ValueError(f"unknown name '{name}' in query")
+
+    mask = np.broadcast_to(np.asarray(_evaluate(tree.body, resolve)), columns.n_traces)
+    if mask.dtype != bool:
+        raise ValueError(f"query '{expression}' does not evaluate to a boolean mask")
+    return mask.copy()
+
+
+def _rewrite_logical_operators(expression):
+    """Replace &, | and ~ with and, or and not so they bind like boolean operators."""
+    replacements = {"&": "and", "|": "or", "~": "not"}
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(expression).readline):
+        if token.type == tokenize.OP and token.string in replacements:
+            tokens.append((tokenize.NAME, replacements[token.string]))
+        else:
+            tokens.append((token.type, token.string))
+    return tokenize.untokenize(tokens)
+
+
+def _evaluate(node, resolve):
+    match node:
+        case ast.Constant(value=value) if isinstance(value, (int, float, str)):
+            return value
+        case ast.Name(id=name):
+            return resolve(name)
+        case ast.List(elts=elements) | ast.Tuple(elts=elements):
+            return [_evaluate(element, resolve) for element in elements]
+        case ast.UnaryOp(op=ast.Not(), operand=operand):
+            return np.logical_not(_evaluate(operand, resolve))
+        case ast.UnaryOp(op=ast.USub(), operand=operand):
+            return -_evaluate(operand, resolve)
+        case ast.UnaryOp(op=ast.UAdd(), operand=operand):
+            return _evaluate(operand, resolve)
+        case ast.BoolOp(op=op, values=values):
+            function = np.logical_and if isinstance(op, ast.And) else np.logical_or
+            return reduce(function, (_evaluate(value, resolve) for value in values))
+        case ast.BinOp(left=left, op=op, right=right) if type(op) in _BINARY_OPERATORS:
+            return _BINARY_OPERATORS[type(op)](
+                _evaluate(left, resolve), _evaluate(right, resolve)
+            )
+        case ast.Compare(left=left, ops=ops, comparators=comparators) if all(
+            type(op) in _COMPARE_OPERATORS for op in ops
+        ):
+            operands = [_evaluate(left, resolve)] + [
+                _evaluate(comparator, resolve) for comparator in comparators
+            ]
+            return reduce(
+                np.logical_and,
+                (
+                    _COMPARE_OPERATORS[type(op)](a, b)
+                    for op, a, b in zip(ops, operands[:-1], operands[1:], strict=True)
+                ),
+            )
+        case ast.Call(func=ast.Name(id=name), args=args, keywords=[]) if (
+            name in QUERY_FUNCTIONS
+        ):
+            return QUERY_FUNCTIONS[name](*(_evaluate(arg, resolve) for arg in args))
+        case _:
+            raise ValueError(f"unsupported expression in query: '{ast.unparse(node)}'")
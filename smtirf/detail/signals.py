@@ -0,0 +1,312 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .chunks import can_decode_rows, read_row_chunks
+from .data_dispatch import SIGNAL_CACHE, STAGES, signal_key
+
+# bytes of one [N x T] channel matrix of a batch read by read_ragged_signals
+RAGGED_BATCH_BYTES = 2**26
+
+# experiment type -> signal kind -> channels required to compute it
+SIGNAL_KINDS = {
+    "fret": {
+        "donor": ("channel_1",),
+        "acceptor": ("channel_2",),
+        "total": ("channel_1", "channel_2"),
+        "fret": ("channel_1", "channel_2"),
+    },
+    "twocolor": {
+        "channel_1": ("channel_1",),
+        "channel_2": ("channel_2",),
+        "total": ("channel_1", "channel_2"),
+    },
+}
+
+
+@dataclass(frozen=True)
+class PaddedSignals:
+    """Signals of many traces as rows of a padded matrix.
+
+    Attributes
+    ----------
+    data : np.ndarray
+        [N x T] float signals, T being the length of the longest trace. Frames
+        outside of mask are NaN.
+    mask : np.ndarray
+        [N x T] bool, True for the valid frames of each trace.
+    rows : np.ndarray
+        Rows of the traces in the TraceMetadataStore.
+    """
+
+    data: np.ndarray
+    mask: np.ndarray
+    rows: np.ndarray
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_ragged(self):
+        lengths = np.count_nonzero(self.mask, axis=1)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        return RaggedSignals(self.data[self.mask], offsets, self.rows)
+
+
+@dataclass(frozen=True)
+class RaggedSignals:
+    """Signals of many traces concatenated into a flat array.
+
+    Attributes
+    ----------
+    data : np.ndarray
+        Valid frames of all traces, concatenated in trace order.
+    offsets : np.ndarray
+        [N + 1] trace k is data[offsets[k]:offsets[k + 1]].
+    rows : np.ndarray
+        Rows of the traces in the TraceMetadataStore.
+    """
+
+    data: np.ndarray
+    offsets: np.ndarray
+    rows: np.ndarray
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index] : self.offsets[index + 1]]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+
+def read_signals(loaders, store, rows, experiment_type, kind, stage="final"):
+    """Read a signal of many traces with one read per movie and channel.
+
+    Offsets and gamma/bleedthrough corrections are applied vectorized over all
+    traces of a movie.
+
+    Parameters
+    ----------
+    loaders: dict[str, MovieLoader]
+        loaders keyed by movie UID
+    store: TraceMetadataStore
+        trace metadata
+    rows: np.ndarray
+        store rows of the traces to read, in output order
+    experiment_type: {"fret", "twocolor"}
+        experiment type, sets the available signal kinds
+    kind: str
+        signal kind; see SIGNAL_KINDS
+    stage: {"raw", "baselined", "corrected", "final"}
+        stage of the correction pipeline; "final" masks frames outside of the
+        start/stop limits of each trace
+
+    Returns
+    -------
+    PaddedSignals
+    """
+    kinds = SIGNAL_KINDS[experiment_type]
+    if kind not in kinds:
+        raise ValueError(f"kind must be in {tuple(kinds)}; got '{kind}'")
+
+    channels, mask = read_channels(loaders, store, rows, kinds[kind], stage)
+    return PaddedSignals(_combine(channels, kind), mask, np.asarray(rows, np.intp))
+
+
+def read_ragged_signals(
+    loaders, store, rows, experiment_type, kind, stage="final", out=None
+):
+    """Read a signal of many traces directly into a ragged layout; see read_signals.
+
+    Traces are read movie by movie, in batches of at most RAGGED_BATCH_BYTES per
+    channel matrix, and the valid frames of each batch are copied into out, so no
+    padded matrix of all traces is allocated.
+
+    Parameters
+    ----------
+    out: np.ndarray or None
+        [N] float64 array to read into, eg a view of shared memory, N being the
+        total number of valid frames (see ragged_offsets); allocated if None
+
+    Returns
+    -------
+    RaggedSignals
+    """
+    kinds = SIGNAL_KINDS[experiment_type]
+    if kind not in kinds:
+        raise ValueError(f"kind must be in {tuple(kinds)}; got '{kind}'")
+
+    rows = np.asarray(rows, dtype=np.intp)
+    offsets = ragged_offsets(store, rows, stage)
+    data = np.empty(offsets[-1]) if out is None else out
+    if data.shape != (offsets[-1],):
+        raise ValueError(f"out must have shape ({offsets[-1]},); got {data.shape}")
+
+    movie_index = store.movie_index[rows]
+    for k in range(len(store.movie_uids)):
+        (positions,) = np.nonzero(movie_index == k)
+        n_frames = store.n_frames[rows[positions]].max(initial=1)
+        batch_size = max(RAGGED_BATCH_BYTES // (8 * int(n_frames)), 1)
+        for begin in range(0, len(positions), batch_size):
+            batch = positions[begin : begin + batch_size]
+            channels, mask = read_channels(
+                loaders, store, rows[batch], kinds[kind], stage
+            )
+            values = _combine(channels, kind)[mask]
+            lengths = offsets[batch + 1] - offsets[batch]
+            for position, end, length in zip(
+                batch, np.cumsum(lengths), lengths, strict=True
+            ):
+                data[offsets[position] : offsets[position + 1]] = values[
+                    end - length : end
+                ]
+    return RaggedSignals(data, offsets, rows)
+
+
+def ragged_offsets(store, rows, stage="final"):
+    """Return the [N + 1] offsets of traces in a ragged layout; see RaggedSignals."""
+    rows = np.asarray(rows, dtype=np.intp)
+    if stage == "final":
+        stop, start = store.stop[rows].astype(np.int64), store.start[rows]
+        lengths = np.maximum(stop - start, 0)
+    else:
+        lengths = store.n_frames[rows]
+    return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+
+def read_channels(loaders, store, rows, names, stage="final"):
+    """Read channels of many traces as padded matrices; see read_signals.
+
+    Returns
+    -------
+    dict[str, np.ndarray]:
+        [N x T] float signals of each requested channel, NaN outside of mask
+    np.ndarray:
+        [N x T] bool validity mask
+    """
+    if stage not in STAGES:
+        raise ValueError(f"stage must be in {STAGES}; got '{stage}'")
+
+    rows = np.asarray(rows, dtype=np.intp)
+    n_frames = store.n_frames[rows]
+    shape = (len(rows), n_frames.max(initial=0))
+
+    # correction of channel 2 depends on channel 1
+    read_names = tuple(names)
+    if stage in ("corrected", "final") and "channel_2" in names:
+        read_names = ("channel_1", "channel_2")
+    channels = {name: np.full(shape, np.nan) for name in read_names}
+
+    movie_index = store.movie_index[rows]
+    for k, movie_uid in enumerate(store.movie_uids):
+        (positions,) = np.nonzero(movie_index == k)
+        if len(positions) == 0:
+            continue
+        movie_rows = rows[positions]
+        loader = loaders[movie_uid]
+        data = {
+            name: _read_rows(loader.dataset(f"traces/{name}"), store.index[movie_rows])
+            for name in read_names
+        }
+        data = _apply_corrections(data, store, movie_rows, stage)
+        for name, values in data.items():
+            channels[name][positions, : values.shape[1]] = values
+
+    frames = np.arange(shape[1])
+    if stage == "final":
+        mask = (frames >= store.start[rows, None]) & (frames < store.stop[rows, None])
+    else:
+        mask = frames < n_frames[:, None]
+    for values in channels.values():
+        values[~mask] = np.nan
+    return {name: channels[name] for name in names}, mask
+
+
+def prefetch_raw_signals(loaders, store, rows, names=("channel_1", "channel_2")):
+    """Read raw channels of many traces into SIGNAL_CACHE.
+
+    Traces whose channels are already cached are skipped. Row-chunked channels are
+    decoded outside of HDF5 (see read_row_chunks), so this can run in background
+    threads without blocking other Python code for the decompression; other
+    layouts are read with one call per movie and channel.
+
+    Parameters
+    ----------
+    loaders: dict[str, MovieLoader]
+        loaders keyed by movie UID
+    store: TraceMetadataStore
+        trace metadata
+    rows: np.ndarray
+        store rows of the traces to read
+    names: Tuple[str]
+        channels to read
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    movie_index = store.movie_index[rows]
+    for k, movie_uid in enumerate(store.movie_uids):
+        loader = loaders[movie_uid]
+        index = [
+            i
+            for i in store.index[rows[movie_index == k]]
+            if not all(
+                signal_key(loader, i, "raw", name) in SIGNAL_CACHE for name in names
+            )
+        ]
+        if not index:
+            continue
+        for name in names:
+            dataset = loader.dataset(f"traces/{name}")
+            if can_decode_rows(dataset):
+                block = read_row_chunks(dataset, index)
+            else:
+                block = _read_rows(dataset, index, dtype=None)
+            for i, values in zip(index, block, strict=True):
+                SIGNAL_CACHE.put(signal_key(loader, i, "raw", name), values.copy())
+
+
+def _read_rows(dataset, index, dtype=np.float64):
+    """Read rows of a dataset in a single call, in the order of index.
+
+    Rows are cast to dtype, or keep the dataset dtype if it is None.
+    """
+    unique, inverse = np.unique(index, return_inverse=True)
+    start, stop = unique[0], unique[-1] + 1
+    if 4 * len(unique) >= stop - start:
+        block = dataset[start:stop][unique - start]
+    else:
+        block = dataset[unique]
+    block = block[inverse]
+    return block if dtype is None else block.astype(dtype)
+
+
+def _apply_corrections(channels, store, rows, stage):
+    if stage == "raw":
+        return channels
+
+    offsets = {"channel_1": store.ch1_offset, "channel_2": store.ch2_offset}
+    for name, data in channels.items():
+        data -= offsets[name][rows, None]
+    if stage == "baselined":
+        return channels
+
+    if "channel_2" in channels:
+        channels["channel_2"] -= channels["channel_1"] * store.bleedthrough[rows, None]
+    if "channel_1" in channels:
+        channels["channel_1"] *= store.gamma[rows, None]
+    return channels
+
+
+def _combine(channels, kind):
+    match kind:
+        case "donor" | "channel_1":
+            return channels["channel_1"]
+        case "acceptor" | "channel_2":
+            return channels["channel_2"]
+        case "total":
+            return channels["channel_1"] + channels["channel_2"]
+        case "fret":
+            return channels["channel_2"] / (
+                channels["channel_1"] + channels["channel_2"]
+            )
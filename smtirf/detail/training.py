@@ -0,0 +1,229 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from ..hmm.models import HiddenMarkovModel
+from .processes import process_context
+
+# shared arrays attached by each worker process; see _attach_shared_signals
+_WORKER_SIGNALS = {}
+
+
+@dataclass
+class TrainingReport:
+    """Summary of Experiment.train_all.
+
+    Attributes
+    ----------
+    models: dict[str, BaseHiddenMarkovModel]
+        trained models keyed by Trace UID
+    errors: dict[str, str]
+        error messages keyed by Trace UID, for traces which could not be trained
+    n_jobs: int
+        number of worker processes
+    wall_time: float
+        seconds from reading the signals to staging the last statepaths
+    """
+
+    models: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    n_jobs: int = 1
+    wall_time: float = 0.0
+
+    def __str__(self):
+        n_traces = len(self.models) + len(self.errors)
+        lines = [
+            f"trained {len(self.models)}/{n_traces} traces with {self.n_jobs} "
+            f"processes in {self.wall_time:.2f} s"
+        ]
+        lines += [f"  {uid}: {message}" for uid, message in self.errors.items()]
+        return "\n".join(lines)
+
+
+def trace_seeds(seed, trace_uids):
+    """Return a random seed for each trace, derived from a seed and its Trace UID.
+
+    Seeds do not depend on the order in which traces are trained or on how they
+    are split among processes, so results are reproducible for any n_jobs and
+    chunksize.
+
+    Parameters
+    ----------
+    seed: int
+        non-negative base seed
+    trace_uids: np.ndarray
+        [N] Trace UIDs as stored in the file (S32)
+
+    Returns
+    -------
+    np.ndarray:
+        [N] uint32 seeds
+    """
+    words = np.frombuffer(
+        np.asarray(trace_uids, dtype="S32").tobytes(), dtype="<u4"
+    ).reshape((-1, 8))
+    return np.array(
+        [
+            np.random.SeedSequence([seed, *map(int, uid)]).generate_state(1)[0]
+            for uid in words
+        ],
+        dtype=np.uint32,
+    )
+
+
+def train_ragged(read, n_frames, seeds, options, n_jobs=1, chunksize=64):
+    """Train a model on each trace of ragged signals and label it by Viterbi.
+
+    Traces are trained in chunks of chunksize. With n_jobs > 1 the chunks are
+    trained by a process pool; the signals are read directly into shared memory,
+    which the workers attach to, and the workers write statepaths into a second
+    shared block, so only trace positions, seeds and trained models are pickled.
+
+    Parameters
+    ----------
+    read: Callable
+        read(out) reads the observations of each trace into the [n_frames] float64
+        array out and returns them as RaggedSignals; see read_ragged_signals
+    n_frames: int
+        total number of frames of all traces
+    seeds: np.ndarray
+        [N] seed of the global numpy random state before training each trace
+    options: dict
+        arguments of HiddenMarkovModel.train_new after the observations
+    n_jobs: int
+        number of worker processes; 1 trains in this process
+    chunksize: int
+        number of traces per task
+
+    Yields
+    ------
+    positions: np.ndarray
+        positions of the traces of a chunk in signals, in order
+    models: dict[int, BaseHiddenMarkovModel]
+        trained models keyed by position
+    labels: dict[int, np.ndarray]
+        int8 Viterbi statepaths keyed by position
+    errors: dict[int, str]
+        error messages keyed by position
+    """
+    chunks = [
+        np.arange(k, min(k + chunksize, len(seeds)))
+        for k in range(0, len(seeds), chunksize)
+    ]
+    if n_jobs == 1:
+        signals = read(np.empty(n_frames))
+        offsets = np.asarray(signals.offsets, dtype=np.int64)
+        labels = np.zeros(n_frames, dtype=np.int8)
+        for positions in chunks:
+            models, errors = _train_chunk(
+                signals.data, labels, offsets, positions, seeds[positions], options
+            )
+            yield _chunk_results(positions, models, labels, offsets, errors)
+        return
+
+    blocks = []
+    data = labels = None
+    try:
+        data = _shared_array(n_frames, np.float64, blocks)
+        labels = _shared_array(n_frames, np.int8, blocks)
+        offsets = np.asarray(read(data).offsets, dtype=np.int64)
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=process_context(),
+            initializer=_attach_shared_signals,
+            initargs=(blocks[0].name, blocks[1].name, offsets),
+        ) as executor:
+
+            def submit(positions):
+                future = executor.submit(
+                    _train_shared_chunk, positions, seeds[positions], options
+                )
+                return positions, future
+
+            remaining = iter(chunks)
+            pending = deque(submit(chunk) for chunk in islice(remaining, 2 * n_jobs))
+            while pending:
+                positions, future = pending.popleft()
+                models, errors = future.result()
+                if (chunk := next(remaining, None)) is not None:
+                    pending.append(submit(chunk))
+                yield _chunk_results(positions, models, labels, offsets, errors)
+    finally:
+        data = labels = None  # views must be released before closing the blocks
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _shared_array(size, dtype, blocks):
+    """Return a zeroed [size] array in a new shared memory block, appended to blocks.
+
+    The array is a view of the block which must be released before closing it.
+    """
+    block = SharedMemory(create=True, size=max(size * np.dtype(dtype).itemsize, 1))
+    blocks.append(block)
+    shared = np.ndarray(size, dtype=dtype, buffer=block.buf)
+    shared[:] = 0
+    return shared
+
+
+def _attach_shared_signals(data_name, labels_name, offsets):
+    """Worker initializer; attach the shared signals and statepaths."""
+    blocks = (SharedMemory(name=data_name), SharedMemory(name=labels_name))
+    n_frames = int(offsets[-1])
+    _WORKER_SIGNALS.update(
+        blocks=blocks,  # keep the blocks open for the life of the worker
+        data=np.ndarray(n_frames, dtype=np.float64, buffer=blocks[0].buf),
+        labels=np.ndarray(n_frames, dtype=np.int8, buffer=blocks[1].buf),
+        offsets=offsets,
+    )
+
+
+def _train_shared_chunk(positions, seeds, options):
+    shared = _WORKER_SIGNALS
+    return _train_chunk(
+        shared["data"], shared["labels"], shared["offsets"], positions, seeds, options
+    )
+
+
+def _train_chunk(data, labels, offsets, positions, seeds, options):
+    """Train and label the traces at positions, writing statepaths into labels.
+
+    The models draw from the global numpy random state, which is seeded for each
+    trace and restored afterwards, since chunks may run in the caller's process.
+    """
+    models, errors = {}, {}
+    state = np.random.get_state()
+    try:
+        for position, seed in zip(positions, seeds, strict=True):
+            frames = slice(offsets[position], offsets[position + 1])
+            x = data[frames]
+            np.random.seed(seed)
+            try:
+                theta = HiddenMarkovModel.train_new(
+                    options["modelType"],
+                    x,
+                    options["K"],
+                    options["sharedVariance"],
+                    **options["kwargs"],
+                )
+                labels[frames] = theta.label(x)
+            except Exception as err:  # one bad trace must not abort the others
+                errors[int(position)] = f"{type(err).__name__}: {err}"
+            else:
+                models[int(position)] = theta
+    finally:
+        np.random.set_state(state)
+    return models, errors
+
+
+def _chunk_results(positions, models, labels, offsets, errors):
+    statepaths = {
+        position: labels[offsets[position] : offsets[position + 1]].copy()
+        for position in models
+    }
+    return positions, models, statepaths, errors
@@ -1,5 +1,7 @@
 import json
+from dataclasses import replace
 from datetime import datetime
+from pathlib import Path
 
 import h5py
 import numpy as np
@@ -9,19 +11,104 @@ from smtirf import __version__ as current_version
 from ..detail.definitions import (
     UNASSIGNED_CONFORMATIONAL_STATE,
     PhotophysicsEnum,
+    RawTrace,
+    RawTraceBlock,
     json_default,
 )
-from ..detail.metadata import TRACE_DTYPE, TraceMetadata
+from ..detail.metadata import (
+    STOP_AT_END,
+    TRACE_DTYPE,
+    make_trace_records,
+    make_trace_uids,
+)
 
 SCHEMA_VERSION = "2.0.0"
 
-DATASET_OPTS = dict(
-    compression="gzip",
-    compression_opts=5,
-    shuffle=True,
-    fletcher32=True,
+FRAME_CHUNK_SIZE = 1024
+
+# statepath name -> (default value, dtype); stored as the dataset fill value
+STATEPATH_DEFAULTS = {
+    "photophysics": (PhotophysicsEnum.SIGNAL.value, np.uint8),
+    "conformation": (UNASSIGNED_CONFORMATIONAL_STATE, np.int8),
+}
+
+# [N x T] datasets of a movie group, with one row per trace
+PER_FRAME_DATASETS = (
+    "traces/channel_1",
+    "traces/channel_2",
+    "statepaths/photophysics",
+    "statepaths/conformation",
 )
 
+COMPRESSION_PROFILES = {
+    "fast": dict(compression="lzf", shuffle=True),
+    "balanced": dict(
+        compression="gzip", compression_opts=5, shuffle=True, fletcher32=True
+    ),
+    "archive": dict(
+        compression="gzip", compression_opts=9, shuffle=True, fletcher32=True
+    ),
+}
+DEFAULT_COMPRESSION = "balanced"
+
+DATASET_OPTS = COMPRESSION_PROFILES[DEFAULT_COMPRESSION]
+
+
+def _dataset_opts(node):
+    """Return dataset creation options for the compression profile of node's file.
+
+    Files written before compression profiles were introduced use "balanced".
+    """
+    profile = node.file.attrs.get("compression_profile", DEFAULT_COMPRESSION)
+    return COMPRESSION_PROFILES[profile]
+
+
+CHUNK_POLICIES = ("row", "tile", "block")
+DEFAULT_CHUNK_POLICY = "row"
+TARGET_CHUNK_BYTES = 2**18
+TILE_SHAPE = (64, 1024)
+
+
+def _chunk_shape(policy, n_traces, n_frames, itemsize):
+    """Return the chunk shape of a [N x T] per-frame dataset for a chunk policy.
+
+    "row" stores each trace in one chunk, optimal for reading single traces.
+    "block" stores several full traces per chunk (~TARGET_CHUNK_BYTES), for reading
+    many traces at once. "tile" stores TILE_SHAPE tiles, for reading all traces over
+    a window of frames.
+    """
+    n_traces = max(n_traces, 1)
+    n_frames = max(n_frames, 1)
+    match policy:
+        case "row":
+            return (1, n_frames)
+        case "block":
+            rows = max(TARGET_CHUNK_BYTES // (n_frames * itemsize), 1)
+            return (min(rows, n_traces), n_frames)
+        case "tile":
+            return (min(TILE_SHAPE[0], n_traces), min(TILE_SHAPE[1], n_frames))
+        case _:
+            _validate_chunk_policy(policy)
+
+
+def _chunk_policy(node):
+    """Return the chunk policy of node's file; "row" for files without one."""
+    return node.file.attrs.get("chunk_policy", DEFAULT_CHUNK_POLICY)
+
+
+def _validate_chunk_policy(chunk_policy):
+    if chunk_policy not in CHUNK_POLICIES:
+        raise ValueError(
+            f"chunk policy must be in {CHUNK_POLICIES}; got {chunk_policy}"
+        )
+
+
+def _validate_compression(compression):
+    if compression not in COMPRESSION_PROFILES:
+        raise ValueError(
+            f"compression must be in {tuple(COMPRESSION_PROFILES)}; got {compression}"
+        )
+
 
 def write_movie_to_hdf(
     savename,
@@ -32,6 +119,10 @@ def write_movie_to_hdf(
     peaks,
     metadata,
     snapshot=None,
+    *,
+    append=False,
+    compression=None,
+    chunk_policy=None,
 ):
     """Write a movie to HDF5 from raw data import.
 
@@ -47,28 +138,174 @@ def write_movie_to_hdf(
         fractional bleedthrough of channel 1 emission to channel 2
     gamma: float
         gamma correction
-    traces: List[RawTrace]
-        list of raw trace data
-    peaks: List[Coordinates]
-        peak localization coordinates
+    traces: List[RawTrace], RawTraceBlock or Iterable[RawTraceBlock]
+        raw trace data, either as a list of traces, a single [N x T] block of all
+        traces, or an iterable of blocks
+    peaks: np.ndarray or List[Coordinates]
+        [N x 4] peak localization coordinates
     metadata: MovieMetadata
         movie metadata
     snapshot: np.ndarray
         [H x W] movie snapshot image
+    append: bool
+        if True and savename exists, add the movie to the existing file instead of
+        overwriting it
+    compression: {"fast", "balanced", "archive"} or None
+        dataset compression profile; defaults to "balanced" for new files and to the
+        profile of the existing file when appending
+    chunk_policy: {"row", "tile", "block"} or None
+        chunk layout of per-frame datasets; defaults to "row" for new files and to
+        the policy of the existing file when appending
     """
 
-    with h5py.File(savename, "w") as hf:
+    with _open_file(
+        savename,
+        experiment_type,
+        bleedthrough,
+        gamma,
+        append,
+        compression=compression,
+        chunk_policy=chunk_policy,
+    ) as hf:
+        _write_movie(hf, traces, peaks, metadata, snapshot)
+
+
+def _open_file(
+    savename,
+    experiment_type,
+    bleedthrough,
+    gamma,
+    append=False,
+    libver=None,
+    compression=None,
+    chunk_policy=None,
+):
+    """Open a HDF5 file for writing movies.
+
+    A new file is created and the experiment-level attributes written unless append
+    is True and the file already exists. In that case the existing attributes must
+    match the requested experiment settings.
+
+    Parameters
+    ----------
+    savename: Path
+        file path to write HDF5
+    experiment_type: {"fret"}
+        experiment type, controls trace class
+    bleedthrough: float
+        fractional bleedthrough of channel 1 emission to channel 2
+    gamma: float
+        gamma correction
+    append: bool
+        open an existing file in append mode
+    libver: str or None
+        HDF5 library version bounds, passed to h5py.File
+    compression: {"fast", "balanced", "archive"} or None
+        dataset compression profile, stored in the file attributes
+    chunk_policy: {"row", "tile", "block"} or None
+        chunk layout of per-frame datasets, stored in the file attributes
+
+    Returns
+    -------
+    h5py.File:
+        open file handle, to be closed by the caller
+    """
+    if compression is not None:
+        _validate_compression(compression)
+    if chunk_policy is not None:
+        _validate_chunk_policy(chunk_policy)
+
+    if append and Path(savename).exists():
+        hf = h5py.File(savename, "a", libver=libver)
+        try:
+            _validate_file_attrs(
+                hf, experiment_type, bleedthrough, gamma, compression, chunk_policy
+            )
+        except ValueError:
+            hf.close()
+            raise
+    else:
+        hf = h5py.File(savename, "w", libver=libver)
         hf.attrs["smtirf_version"] = current_version
         hf.attrs["smtrc_version"] = SCHEMA_VERSION
-        hf.attrs["date_modified"] = datetime.now().strftime(r"%Y-%m-%d %H:%M:%S")
         hf.attrs["experiment_type"] = experiment_type
         hf.attrs["bleedthrough"] = bleedthrough
         hf.attrs["gamma"] = gamma
+        hf.attrs["compression_profile"] = compression or DEFAULT_COMPRESSION
+        hf.attrs["chunk_policy"] = chunk_policy or DEFAULT_CHUNK_POLICY
+    set_date_modified(hf)
+    return hf
+
+
+def set_date_modified(file_handle):
+    file_handle.attrs["date_modified"] = datetime.now().strftime(r"%Y-%m-%d %H:%M:%S")
+
+
+def _validate_file_attrs(
+    file_handle,
+    experiment_type,
+    bleedthrough,
+    gamma,
+    compression=None,
+    chunk_policy=None,
+    action="append to",
+):
+    """Raise ValueError if existing file attributes do not match the settings."""
+    attrs = file_handle.attrs
+    if (version := attrs["smtrc_version"]) != SCHEMA_VERSION:
+        raise ValueError(
+            f"cannot {action} file with schema version {version}; "
+            f"expected {SCHEMA_VERSION}"
+        )
+
+    mismatched = []
+    if attrs["experiment_type"] != experiment_type:
+        mismatched.append(
+            f"experiment_type ({attrs['experiment_type']} != {experiment_type})"
+        )
+    for name, value in (("bleedthrough", bleedthrough), ("gamma", gamma)):
+        if not np.isclose(attrs[name], value):
+            mismatched.append(f"{name} ({attrs[name]} != {value})")
+    profile = attrs.get("compression_profile", DEFAULT_COMPRESSION)
+    if compression is not None and profile != compression:
+        mismatched.append(f"compression ({profile} != {compression})")
+    policy = attrs.get("chunk_policy", DEFAULT_CHUNK_POLICY)
+    if chunk_policy is not None and policy != chunk_policy:
+        mismatched.append(f"chunk_policy ({policy} != {chunk_policy})")
+    if mismatched:
+        raise ValueError(
+            f"cannot {action} file with different settings: {', '.join(mismatched)}"
+        )
+
+
+def _write_movie(file_handle, traces, peaks, metadata, snapshot=None):
+    """Write all datasets for a single movie into an open file.
+
+    Parameters
+    ----------
+    file_handle: h5py.File
+        file handle to write data into
+    traces: List[RawTrace], RawTraceBlock or Iterable[RawTraceBlock]
+        raw trace data
+    peaks: np.ndarray or List[Coordinates]
+        [N x 4] peak localization coordinates
+    metadata: MovieMetadata
+        movie metadata
+    snapshot: np.ndarray
+        [H x W] movie snapshot image
+    """
+    if f"movies/movie_{metadata.uid}" in file_handle:
+        raise ValueError(f"movie {metadata.uid} already exists in file.")
+
+    mov_group = _initialize_movie(file_handle, metadata, snapshot)
+    _write_trace_data(mov_group, metadata, traces)
+    _write_default_statepaths(mov_group, metadata)
+    _write_trace_metadata(mov_group, metadata, peaks)
 
-        mov_group = _initialize_movie(hf, metadata, snapshot)
-        _write_trace_data(mov_group, metadata, traces)
-        _write_default_statepaths(mov_group, metadata)
-        _write_trace_metadata(mov_group, metadata, peaks)
+
+def _delete_movie(file_handle, movie_uid):
+    """Remove a movie group, eg before re-importing a changed movie."""
+    del file_handle[f"movies/movie_{movie_uid}"]
 
 
 def _initialize_movie(file_handle, metadata, snapshot):
@@ -113,11 +350,7 @@ def _initialize_movie(file_handle, metadata, snapshot):
     if metadata.data_scaler is not None:
         group.attrs["data_scaler"] = metadata.data_scaler
 
-    trace_metadata = TraceMetadata.from_movie_metadata(metadata)
-    trace_ids = np.array(
-        [trace_metadata.make_trace_uid(i) for i in range(metadata.n_traces)],
-        dtype="S32",
-    )
+    trace_ids = make_trace_uids(metadata.uid, metadata.n_traces).astype("S32")
     group.create_dataset(
         "trace_ids",
         data=trace_ids,
@@ -130,7 +363,7 @@ def _initialize_movie(file_handle, metadata, snapshot):
             data=snapshot,
             dtype="uint8",
             chunks=snapshot.shape,
-            **DATASET_OPTS,
+            **_dataset_opts(file_handle),
         )
 
     return group
@@ -139,31 +372,121 @@ def _initialize_movie(file_handle, metadata, snapshot):
 def _write_trace_data(group, movie_metadata, traces):
     """Write raw trace datasets.
 
+    Datasets are allocated up front and filled one block of traces at a time, so
+    peak memory is set by the block size rather than the movie size. Blocks are
+    written directly from the source arrays; no stacked copy of the channels is made.
+
     Parameters
     ----------
     group: h5py.Group
         movie group
     movie_metadata: MovieMetadata
         movie metadata
-    traces: List[RawTrace]
-        list of raw trace data
+    traces: List[RawTrace], RawTraceBlock or Iterable[RawTraceBlock]
+        raw trace data
     """
-    ch1_data = np.vstack([trace.channel_1 for trace in traces])
-    ch2_data = np.vstack([trace.channel_2 for trace in traces])
-    for name, data in zip(
-        ("channel_1", "channel_2"), (ch1_data, ch2_data), strict=False
-    ):
+    chunks = _chunk_shape(
+        _chunk_policy(group), movie_metadata.n_traces, movie_metadata.n_frames, 2
+    )
+    datasets = [
         group.create_dataset(
             f"traces/{name}",
-            data=data,
+            shape=(movie_metadata.n_traces, movie_metadata.n_frames),
             dtype="int16",
-            chunks=(1, movie_metadata.n_frames),  # row-wise chunking
-            **DATASET_OPTS,
+            chunks=chunks,
+            **_dataset_opts(group),
         )
+        for name in ("channel_1", "channel_2")
+    ]
+
+    for block in _as_trace_blocks(traces, rows=chunks[0]):
+        for dataset, data in zip(
+            datasets, (block.channel_1, block.channel_2), strict=True
+        ):
+            _write_rows(dataset, block.start, data)
+
+
+def _as_trace_blocks(traces, rows=1):
+    """Yield RawTraceBlock items from the supported trace data inputs.
+
+    A list of RawTrace is yielded as blocks of rows traces, matching the chunk rows
+    of the target datasets; single-row blocks view the original arrays.
+    """
+    if isinstance(traces, RawTraceBlock):
+        yield traces
+    elif isinstance(traces, (list, tuple)) and all(
+        isinstance(trace, RawTrace) for trace in traces
+    ):
+        for k in range(0, len(traces), rows):
+            group = traces[k : k + rows]
+            if len(group) == 1:
+                (trace,) = group
+                yield RawTraceBlock(
+                    k, trace.channel_1[np.newaxis, :], trace.channel_2[np.newaxis, :]
+                )
+            else:
+                yield RawTraceBlock(
+                    k,
+                    np.vstack([trace.channel_1 for trace in group]),
+                    np.vstack([trace.channel_2 for trace in group]),
+                )
+    else:
+        yield from traces
+
+
+def _write_rows(dataset, start, data):
+    """Write a [N x T] array into dataset rows starting at start."""
+    selection = np.s_[start : start + data.shape[0]]
+    if data.dtype == dataset.dtype and data.flags["C_CONTIGUOUS"]:
+        dataset.write_direct(data, dest_sel=selection)
+    else:
+        dataset[selection] = data
+
+
+def write_selected_rows(dataset, index, data):
+    """Write selected rows of a dataset in few calls.
+
+    Dense selections are written as one read-modify-write of the spanned rows,
+    sparse selections as one point selection. Datasets with a fill value, such as
+    statepaths, only have their selected rows written, one slice per run of
+    consecutive rows, so chunks of untouched rows stay unallocated.
+
+    Parameters
+    ----------
+    dataset: h5py.Dataset
+        dataset with traces along the first axis
+    index: np.ndarray
+        sorted, unique rows to write
+    data: np.ndarray
+        new values of the rows, in the order of index
+    """
+    index = np.asarray(index, dtype=np.intp)
+    if _has_fill_value(dataset):
+        runs = np.flatnonzero(np.diff(index) != 1) + 1
+        for begin, end in zip(np.r_[0, runs], np.r_[runs, len(index)], strict=True):
+            _write_rows(dataset, int(index[begin]), data[begin:end])
+        return
+
+    start, stop = int(index[0]), int(index[-1]) + 1
+    if 4 * len(index) >= stop - start:
+        block = dataset[start:stop]
+        block[index - start] = data
+        _write_rows(dataset, start, block)
+    else:
+        dataset[index] = data
+
+
+def _has_fill_value(dataset):
+    fill_value = dataset.id.get_create_plist().fill_value_defined()
+    return fill_value == h5py.h5d.FILL_VALUE_USER_DEFINED
 
 
 def _write_default_statepaths(group, movie_metadata):
-    """Write trace statepath datasets with default values.
+    """Create trace statepath datasets with default values.
+
+    The default values are stored as the dataset fill value and no data is written,
+    so chunks are only allocated once a statepath is assigned. Reads of unallocated
+    chunks return the fill value.
 
     Parameters
     ----------
@@ -172,25 +495,23 @@ def _write_default_statepaths(group, movie_metadata):
     movie_metadata: MovieMetadata
         movie metadata
     """
-    for name, value, dtype in zip(
-        ("photophysics", "conformation"),
-        (PhotophysicsEnum.SIGNAL.value, UNASSIGNED_CONFORMATIONAL_STATE),
-        (np.uint8, np.int8),
-        strict=False,
-    ):
-        data = np.full(
-            (movie_metadata.n_traces, movie_metadata.n_frames), value, dtype=dtype
-        )
+    for name, (value, dtype) in STATEPATH_DEFAULTS.items():
         group.create_dataset(
             f"statepaths/{name}",
-            data=data,
+            shape=(movie_metadata.n_traces, movie_metadata.n_frames),
             dtype=np.dtype(dtype).name,
-            chunks=(1, movie_metadata.n_frames),  # row-wise chunking
-            **DATASET_OPTS,
+            fillvalue=value,
+            chunks=_chunk_shape(
+                _chunk_policy(group),
+                movie_metadata.n_traces,
+                movie_metadata.n_frames,
+                np.dtype(dtype).itemsize,
+            ),
+            **_dataset_opts(group),
         )
 
 
-def _write_trace_metadata(group, movie_metadata, peaks):
+def _write_trace_metadata(group, movie_metadata, peaks, stop=None):
     """Write raw trace datasets.
 
     Stored as row records.
@@ -201,16 +522,179 @@ def _write_trace_metadata(group, movie_metadata, peaks):
         movie group
     movie_metadata: MovieMetadata
         movie metadata
-    peaks: List[Coordinates]
-        peak localization coordinates
+    peaks: np.ndarray or List[Coordinates]
+        [N x 4] peak localization coordinates
+    stop: int or None
+        stop limit of all traces; the number of frames if None
     """
+    records = make_trace_records(movie_metadata, peaks)
+    if stop is not None:
+        records["stop"] = stop
+    group.create_dataset(
+        "traces/metadata", data=records, dtype=TRACE_DTYPE, **_dataset_opts(group)
+    )
 
-    trace_metadata = TraceMetadata.from_movie_metadata(movie_metadata)
-    records = np.zeros(movie_metadata.n_traces, dtype=TRACE_DTYPE)
 
-    for k, peak in enumerate(peaks):
-        records[k] = trace_metadata.make_record(index=k, peak=peak)
+class LiveMovieWriter:
+    """Write a movie into a .smtrc file while it is being acquired.
 
-    group.create_dataset(
-        "traces/metadata", data=records, dtype=TRACE_DTYPE, **DATASET_OPTS
-    )
+    Trace and statepath datasets are created with an unlimited frame axis and grown
+    as blocks of frames are appended. The file is switched to SWMR mode after the
+    movie is initialized, so it can be opened concurrently with
+    ``Experiment(filename, swmr=True)`` to view partial traces.
+
+    The trace metadata table is written once. Until the writer is closed the stop
+    limits are STOP_AT_END, which readers take as the last frame written, so
+    appending frames only updates the n_frames attribute.
+
+    Parameters
+    ----------
+    savename: Path
+        file path to write HDF5
+    experiment_type: {"fret"}
+        experiment type, controls trace class
+    bleedthrough: float
+        fractional bleedthrough of channel 1 emission to channel 2
+    gamma: float
+        gamma correction
+    peaks: np.ndarray or List[Coordinates]
+        [N x 4] peak localization coordinates
+    metadata: MovieMetadata
+        movie metadata; n_frames is ignored and starts at 0
+    snapshot: np.ndarray
+        [H x W] movie snapshot image
+    append: bool
+        add the movie to an existing file, which must use the latest file format
+    frame_chunk: int
+        number of frames per chunk along the time axis
+    compression: {"fast", "balanced", "archive"} or None
+        dataset compression profile
+    chunk_policy: {"row", "tile", "block"} or None
+        chunk layout of per-frame datasets; chunks span at most frame_chunk frames
+    """
+
+    def __init__(
+        self,
+        savename,
+        experiment_type,
+        bleedthrough,
+        gamma,
+        peaks,
+        metadata,
+        snapshot=None,
+        *,
+        append=False,
+        frame_chunk=FRAME_CHUNK_SIZE,
+        compression=None,
+        chunk_policy=None,
+    ):
+        self._metadata = replace(metadata, n_frames=0)
+        self._file = _open_file(
+            savename,
+            experiment_type,
+            bleedthrough,
+            gamma,
+            append,
+            libver="latest",
+            compression=compression,
+            chunk_policy=chunk_policy,
+        )
+        try:
+            if f"movies/movie_{metadata.uid}" in self._file:
+                raise ValueError(f"movie {metadata.uid} already exists in file.")
+            self._group = _initialize_movie(self._file, self._metadata, snapshot)
+            self._initialize_datasets(frame_chunk)
+            _write_trace_metadata(self._group, self._metadata, peaks, STOP_AT_END)
+            self._file.swmr_mode = True
+        except Exception:
+            self._file.close()
+            raise
+
+    def _initialize_datasets(self, frame_chunk):
+        n_traces = self._metadata.n_traces
+        policy = _chunk_policy(self._group)
+
+        def options(itemsize):
+            return dict(
+                shape=(n_traces, 0),
+                maxshape=(n_traces, None),
+                chunks=_chunk_shape(policy, n_traces, frame_chunk, itemsize),
+                **_dataset_opts(self._group),
+            )
+
+        for name in ("channel_1", "channel_2"):
+            self._group.create_dataset(f"traces/{name}", dtype="int16", **options(2))
+        for name, (value, dtype) in STATEPATH_DEFAULTS.items():
+            self._group.create_dataset(
+                f"statepaths/{name}",
+                dtype=np.dtype(dtype).name,
+                fillvalue=value,
+                **options(np.dtype(dtype).itemsize),
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def n_frames(self):
+        return self._group.attrs["n_frames"]
+
+    def append_frames(self, channel_1, channel_2):
+        """Append a block of frames to every trace.
+
+        Parameters
+        ----------
+        channel_1: np.ndarray
+            [N x t] new channel 1 data, traces as rows
+        channel_2: np.ndarray
+            [N x t] new channel 2 data, traces as rows
+        """
+        n_traces, n_new = np.shape(channel_1)
+        if np.shape(channel_2) != (n_traces, n_new):
+            raise ValueError("channel_1 and channel_2 blocks must have the same shape")
+        if n_traces != self._metadata.n_traces:
+            raise ValueError(
+                f"expected blocks with {self._metadata.n_traces} traces; got {n_traces}"
+            )
+        if n_new == 0:
+            return
+
+        start = self.n_frames
+        stop = start + n_new
+        for name, data in (
+            ("traces/channel_1", channel_1),
+            ("traces/channel_2", channel_2),
+        ):
+            dataset = self._group[name]
+            dataset.resize(stop, axis=1)
+            dataset[:, start:stop] = data
+        for name in ("statepaths/photophysics", "statepaths/conformation"):
+            self._group[name].resize(stop, axis=1)  # filled with default value
+
+        self._group.attrs["n_frames"] = stop
+        self._file.flush()
+
+    def append_records(self, records):
+        """Append a block of frames in the raw PMA layout.
+
+        Parameters
+        ----------
+        records: np.ndarray
+            [t x 2N] frames as rows, records interleaved (ch1, ch2, ch1, ...)
+        """
+        self.append_frames(records[:, 0::2].T, records[:, 1::2].T)
+
+    def close(self):
+        if self._file.id.valid:
+            try:
+                # fix the stop limits at the final length of the movie
+                table = self._group["traces/metadata"]
+                records = table[()]
+                records["stop"][records["stop"] == STOP_AT_END] = self.n_frames
+                table[...] = records
+                self._file.flush()
+            finally:
+                self._file.close()
@@ -1,16 +1,51 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import h5py
+import numpy as np
 
 import smtirf
 
-from .detail.metadata import MovieMetadata
+from .detail.compact import copy_movie_rows
+from .detail.data_dispatch import CHUNK_CACHE_BYTES, CHUNK_CACHE_SLOTS, MovieLoader
+from .detail.metadata import MovieMetadata, TraceMetadataStore
+from .detail.metrics import METRICS, TraceMetrics
+from .detail.query import TraceColumns, TraceSelection, evaluate_query
 from .detail.registry import TRACE_REGISTRY
+from .detail.signals import (
+    prefetch_raw_signals,
+    ragged_offsets,
+    read_ragged_signals,
+    read_signals,
+)
+from .detail.training import TrainingReport, trace_seeds, train_ragged
+from .detail.writer import set_date_modified, write_selected_rows
 
 
 class Experiment:
-    def __init__(self, filename):
-        self._file_handle = h5py.File(Path(filename), "r")
+    def __init__(self, filename, swmr=False, lazy=True):
+        """Open an experiment file.
+
+        Trace metadata is read in one call per movie. With lazy=True, trace objects
+        are created on first access and then kept, so opening a file and memory use
+        for untouched traces do not scale with the number of traces.
+
+        Parameters
+        ----------
+        filename: Path
+            path to .smtrc file
+        swmr: bool
+            open in single-writer/multiple-reader mode to follow a movie that is
+            still being acquired; call refresh() to load newly written frames
+        lazy: bool
+            create trace objects on first access instead of when opening the file
+        """
+        self._filename = Path(filename)
+        self._swmr = swmr
+        self._file_handle = self._open_file()
         self._experiment_type = self._file_handle.attrs["experiment_type"]
 
         self._movies = {
@@ -18,33 +53,278 @@ class Experiment:
             for key, group in self._file_handle["movies"].items()
         }
 
-        # todo: cleanup
-        trace_class = TRACE_REGISTRY[self._experiment_type]
-        self._traces = []
-        for group in self._file_handle["movies"].values():
-            trace_ids = group["trace_ids"][:]
-            for uid in trace_ids:
-                trace = trace_class(self._file_handle, uid.decode("utf-8"))
-                self._traces.append(trace)
+        self._trace_metadata = TraceMetadataStore(self._file_handle)
+        self._loaders = {
+            movie_uid: MovieLoader(self._file_handle, movie_uid)
+            for movie_uid in self._trace_metadata.movie_uids
+        }
+        self._metrics = TraceMetrics(self._loaders, self._trace_metadata)
+        self._trace_class = TRACE_REGISTRY[self._experiment_type]
+        self._order = np.arange(len(self._trace_metadata))
+        self._traces = {}  # row -> Trace, for traces that have been accessed
+        self._models = {}  # row -> model, for traces trained by train_all
+        if not lazy:
+            for row in self._order:
+                self._get_trace(row)
 
         # self.comments = comments
         # self.results = Results(self) if results is None else Results(self, **results)
 
-    def save(self, savename):
-        Experiment.write_to_hdf(savename, self)
+    def refresh(self):
+        """Reload frames and trace metadata written since the file was opened.
+
+        Only meaningful for experiments opened with swmr=True.
+        """
+        for loader in self._loaders.values():
+            loader.refresh()
+
+        self._movies = {
+            key: MovieMetadata._from_group(group)
+            for key, group in self._file_handle["movies"].items()
+        }
+        self._trace_metadata.reload()
+        for trace in self._traces.values():
+            trace._reload()
+
+    def _open_file(self):
+        options = dict(rdcc_nbytes=CHUNK_CACHE_BYTES, rdcc_nslots=CHUNK_CACHE_SLOTS)
+        if self._swmr:
+            return h5py.File(self._filename, "r", libver="latest", swmr=True, **options)
+        return h5py.File(self._filename, "r", **options)
+
+    @property
+    def is_modified(self):
+        """Whether there are trace edits that have not been saved."""
+        return bool(self._trace_metadata.dirty.any()) or any(
+            loader.has_pending_statepaths for loader in self._loaders.values()
+        )
+
+    def save(self):
+        """Write edited trace metadata and statepaths to file.
+
+        Only the traces changed since the file was opened or last saved are written,
+        with one write per movie and dataset, so the time to save a few edits does
+        not depend on the size of the file. Per-trace gamma and bleedthrough are not
+        saved.
+        """
+        if self._swmr:
+            raise ValueError("cannot save an experiment opened in SWMR mode.")
+        if not self.is_modified:
+            return
+
+        # cached dataset handles keep externally linked files open read-only
+        for loader in self._loaders.values():
+            loader.release()
+        self._file_handle.close()
+        try:
+            with h5py.File(self._filename, "r+") as hf:
+                for movie_uid, loader in self._loaders.items():
+                    self._write_edits(hf[loader.movie_path], movie_uid)
+                set_date_modified(hf)
+        finally:
+            self._file_handle = self._open_file()
+            self._trace_metadata.rebind(self._file_handle)
+            for loader in self._loaders.values():
+                loader.rebind(self._file_handle)
+
+        self._trace_metadata.dirty[:] = False
+        for loader in self._loaders.values():
+            for statepaths in loader.pending_statepaths.values():
+                statepaths.clear()
+
+    def save_as(self, savename, selected_only=False):
+        """Write the experiment, including unsaved edits, to a new file.
+
+        Movie groups are copied as HDF5 objects, or for selected_only as raw
+        compressed chunks of the kept rows, so no trace data is decompressed or
+        recompressed; only edited metadata and statepaths are written. Movies
+        linked from a merged file are copied, so the new file is self-contained.
+        This experiment stays open on its own file and its edits remain unsaved.
+
+        Parameters
+        ----------
+        savename: Path
+            file path to write; overwritten if it exists
+        selected_only: bool
+            only keep selected traces; movies without selected traces are dropped,
+            as is the import manifest
+        """
+        savename = Path(savename)
+        if savename.resolve() == self._filename.resolve():
+            raise ValueError("cannot save_as to the open file; use save() instead.")
+
+        store = self._trace_metadata
+        source = self._file_handle
+        with h5py.File(savename, "w") as hf:
+            hf.attrs.update(source.attrs)
+            for name, node in source.items():
+                if name in ("movies", "virtual") or (
+                    selected_only and name == "manifest"
+                ):
+                    continue
+                source.copy(node, hf, name)
+            movies = hf.create_group("movies")
+            movies.attrs.update(source["movies"].attrs)
+
+            for movie_uid, loader in self._loaders.items():
+                group = source[loader.movie_path]
+                name = group.name.rsplit("/", 1)[-1]
+                if not selected_only:
+                    source.copy(group, movies, name)
+                    self._write_edits(movies[name], movie_uid)
+                    continue
+
+                movie_slice = store.movie_slices[movie_uid]
+                index = store.index[movie_slice][store.is_selected[movie_slice]]
+                if len(index):
+                    copy = copy_movie_rows(group, movies, name, index)
+                    self._write_edits(copy, movie_uid, index)
+            set_date_modified(hf)
+
+    def _write_edits(self, group, movie_uid, index=None):
+        """Write unsaved edits of the traces of a movie into a movie group.
+
+        Parameters
+        ----------
+        group: h5py.Group
+            movie group open for writing
+        movie_uid: str
+            UID of the movie
+        index: np.ndarray or None
+            sorted trace indices kept in group if it is a compacted copy; edits of
+            other traces are skipped
+        """
+        store = self._trace_metadata
+        movie_slice = store.movie_slices[movie_uid]
+        (rows,) = np.nonzero(store.dirty[movie_slice])
+        rows += movie_slice.start
+        keep, positions = _positions(store.index[rows], index)
+        if len(positions):
+            write_selected_rows(
+                group["traces/metadata"], positions, store.records(rows[keep])
+            )
+
+        loader = self._loaders[movie_uid]
+        for kind, statepaths in loader.pending_statepaths.items():
+            trace_index = np.array(sorted(statepaths), dtype=np.intp)
+            keep, positions = _positions(trace_index, index)
+            if len(positions):
+                write_selected_rows(
+                    group[f"statepaths/{kind}"],
+                    positions,
+                    np.stack([statepaths[i] for i in trace_index[keep]]),
+                )
+
+    def _get_trace(self, row):
+        try:
+            return self._traces[row]
+        except KeyError:
+            metadata = self._trace_metadata.view(int(row))
+            trace = self._trace_class(self._loaders[metadata.movie_uid], metadata)
+            trace._model = self._models.get(row)
+            self._traces[row] = trace
+            return trace
 
     def __getitem__(self, index):
-        return self._traces[index]
+        if isinstance(index, slice):
+            return [self._get_trace(row) for row in self._order[index]]
+        return self._get_trace(self._order[index])
+
+    def __iter__(self):
+        for row in self._order:
+            yield self._get_trace(row)
 
     def __len__(self):
-        return len(self._traces)
+        return len(self._order)
+
+    def iter_traces(self, prefetch=64, workers=1):
+        """Iterate over traces in experiment order, reading ahead in the background.
+
+        Raw signals are read into SIGNAL_CACHE in batches of prefetch traces. While
+        a batch is consumed, up to workers following batches are read by a thread
+        pool, so the loop body mostly sees signals already in memory. Row-chunked
+        channels are decompressed outside of HDF5, without holding the GIL (see
+        smtirf.detail.chunks); calls into HDF5 are serialized by h5py, so more than
+        a few workers rarely helps.
+
+        Parameters
+        ----------
+        prefetch: int
+            number of traces read per batch
+        workers: int
+            number of batches read ahead
+        """
+        if prefetch < 1 or workers < 1:
+            raise ValueError("prefetch and workers must be positive.")
+
+        order = self._order.copy()
+        batches = [order[k : k + prefetch] for k in range(0, len(order), prefetch)]
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        try:
+            for k, batch in enumerate(batches):
+                while len(pending) <= workers and k + len(pending) < len(batches):
+                    pending.append(
+                        executor.submit(
+                            prefetch_raw_signals,
+                            self._loaders,
+                            self._trace_metadata,
+                            batches[k + len(pending)],
+                        )
+                    )
+                pending.popleft().result()
+                for row in batch:
+                    yield self._get_trace(row)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
 
     def __str__(self):
         return f"{self.__class__.__name__}\t{self.n_selected}/{len(self)} selected"
 
     @property
     def n_selected(self):
-        return sum(1 for trace in self if trace.is_selected)
+        return self._trace_metadata.n_selected
+
+    def get_signals(self, kind, selected=None, *, stage="final", layout="padded"):
+        """Return a signal of many traces, read in one call per movie and channel.
+
+        Parameters
+        ----------
+        kind: str
+            signal kind; "donor", "acceptor", "total" or "fret" for FRET experiments,
+            "channel_1", "channel_2" or "total" for two-color experiments
+        selected: bool or None
+            only include selected (True) or unselected (False) traces; all traces if
+            None. Traces are in experiment order.
+        stage: {"raw", "baselined", "corrected", "final"}
+            stage of the correction pipeline; "final" masks frames outside of the
+            start/stop limits of each trace
+        layout: {"padded", "ragged"}
+            return a padded [N x T] matrix with a validity mask, or the valid frames
+            of all traces concatenated with per-trace offsets
+
+        Returns
+        -------
+        PaddedSignals or RaggedSignals
+        """
+        if layout not in ("padded", "ragged"):
+            raise ValueError(f"layout must be 'padded' or 'ragged'; got '{layout}'")
+
+        read = read_signals if layout == "padded" else read_ragged_signals
+        return read(
+            self._loaders,
+            self._trace_metadata,
+            self._selected_rows(selected),
+            self._experiment_type,
+            kind,
+            stage,
+        )
+
+    def _selected_rows(self, selected):
+        rows = self._order
+        if selected is not None:
+            rows = rows[self._trace_metadata.is_selected[rows] == selected]
+        return rows
 
     def detect_baseline(
         self,
@@ -63,27 +343,218 @@ class Experiment:
         for trc, sp in zip(self, M.SP, strict=False):
             trc.set_signal_labels(sp, where=where, correctOffsets=correctOffsets)
 
+    def train_all(
+        self,
+        modelType,
+        K,
+        sharedVariance=True,
+        *,
+        kind="fret",
+        selected=None,
+        n_jobs=None,
+        chunksize=64,
+        seed=0,
+        progress=None,
+        **kwargs,
+    ):
+        """Train a model on each trace and set its Viterbi statepath.
+
+        Signals are read in bulk directly into a ragged buffer, in shared memory if
+        n_jobs > 1, and traces are trained in chunks by a process pool attached to
+        it; see smtirf.detail.training.train_ragged. Statepaths are staged as chunks
+        complete and written to file, with one write per movie, by save().
+
+        The global numpy random state is seeded for each trace from seed and its
+        Trace UID, so results do not depend on n_jobs, chunksize or trace order,
+        and is restored afterwards.
+        Errors raised while training a trace are collected in the report instead of
+        being raised.
+
+        Parameters
+        ----------
+        modelType: str
+            model type, see HiddenMarkovModel.train_new
+        K: int
+            number of states
+        sharedVariance: bool
+            whether all states share one variance
+        kind: str
+            signal to train on; see get_signals
+        selected: bool or None
+            only train selected (True) or unselected (False) traces; all if None
+        n_jobs: int or None
+            number of worker processes; all CPUs if None, 1 trains in this process
+        chunksize: int
+            number of traces per task
+        seed: int
+            non-negative base seed of the per-trace random states
+        progress: Callable or None
+            called as progress(n_done, n_total) after each chunk
+        **kwargs
+            passed to HiddenMarkovModel.train_new
+
+        Returns
+        -------
+        TrainingReport
+        """
+        n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+        if n_jobs < 1 or chunksize < 1:
+            raise ValueError("n_jobs and chunksize must be positive.")
+
+        tic = time.perf_counter()
+        store = self._trace_metadata
+        rows = self._selected_rows(selected)
+        trace_uids = store.trace_uids[rows]
+        names = np.char.decode(trace_uids, "utf-8")
+        options = dict(
+            modelType=modelType, K=K, sharedVariance=sharedVariance, kwargs=kwargs
+        )
+
+        def read(out):
+            return read_ragged_signals(
+                self._loaders, store, rows, self._experiment_type, kind, out=out
+            )
+
+        report = TrainingReport(n_jobs=n_jobs)
+        n_done = 0
+        for positions, models, statepaths, errors in train_ragged(
+            read,
+            ragged_offsets(store, rows)[-1],
+            trace_seeds(seed, trace_uids),
+            options,
+            n_jobs,
+            chunksize,
+        ):
+            for position, theta in models.items():
+                self._set_model(rows[position], theta, statepaths[position])
+                report.models[names[position]] = theta
+            for position, message in errors.items():
+                report.errors[names[position]] = message
+            n_done += len(positions)
+            if progress is not None:
+                progress(n_done, len(rows))
+
+        report.wall_time = time.perf_counter() - tic
+        return report
+
+    def _set_model(self, row, theta, labels):
+        """Set the model of a trace and its statepath within the trace limits."""
+        store = self._trace_metadata
+        loader = self._loaders[store.movie_uids[store.movie_index[row]]]
+        statepath = np.full(loader.n_frames, -1)
+        start = store.start[row]
+        statepath[start : start + len(labels)] = labels
+
+        self._models[row] = theta
+        if row in self._traces:
+            trace = self._traces[row]
+            trace._model = theta
+            trace.set_statepath(statepath)
+        else:
+            loader.set_statepath("conformation", store.index[row], statepath)
+
+    def metric(self, name):
+        """Return a quality metric of all traces, in experiment order.
+
+        Metrics are computed in vectorized passes over bulk reads and cached until
+        the offsets, limits or corrections of a trace change.
+
+        Parameters
+        ----------
+        name: {"corrcoef", "snr", "mean_total", "length"}
+            donor/acceptor correlation, signal-to-noise ratio of the total
+            intensity, mean total intensity, or number of frames within limits
+        """
+        return self._metrics[name][self._order]
+
+    @property
+    def columns(self):
+        """Per-trace metadata and metric columns, in experiment order."""
+        return TraceColumns(self._trace_metadata, self._metrics, self._order)
+
+    def query(self, expression, **variables):
+        """Return a view of the traces matching a query expression.
+
+        Parameters
+        ----------
+        expression: str
+            vectorized predicate over columns, eg
+            ``'corrcoef < -0.5 & length > 200 & movie == "20250824T163642"'``;
+            see smtirf.detail.query.evaluate_query
+        **variables
+            additional names available in the expression
+
+        Returns
+        -------
+        TraceSelection
+        """
+        return self.filter(evaluate_query(expression, self.columns, variables))
+
+    def filter(self, predicate):
+        """Return a view of the traces matching a predicate.
+
+        Parameters
+        ----------
+        predicate: np.ndarray or Callable
+            [N] bool mask in experiment order, or a function taking the experiment
+            columns and returning such a mask
+
+        Returns
+        -------
+        TraceSelection
+        """
+        mask = predicate(self.columns) if callable(predicate) else predicate
+        mask = np.asarray(mask)
+        if mask.dtype != bool or mask.shape != (len(self),):
+            raise ValueError(f"mask must be a boolean array of length {len(self)}")
+        (indices,) = np.nonzero(mask)
+        return TraceSelection(self, indices)
+
     def sort(self, key="corrcoef"):
-        if key == "corrcoef":
-            self._traces.sort(key=lambda x: x.corrcoef, reverse=False)
+        """Sort traces in place.
+
+        Parameters
+        ----------
+        key: {"corrcoef", "snr", "mean_total", "length", "index", "selected"}
+            a metric (ascending, undefined values last), the order of traces in the
+            file, or selected traces first
+        """
+        if key in METRICS:
+            order = np.argsort(self.metric(key), kind="stable")
         elif key == "index":
-            self._traces.sort(key=lambda x: str(x._id), reverse=False)
-        elif key == "cluster":
-            self._traces.sort(key=lambda x: str(x.clusterIndex), reverse=False)
+            order = np.argsort(self._order, kind="stable")
         elif key == "selected":
-            self._traces.sort(key=lambda x: x.isSelected, reverse=True)  # descending
+            selected = self._trace_metadata.is_selected[self._order]
+            order = np.argsort(~selected, kind="stable")
         else:
             raise KeyError(f"cannot sort by key '{key}'")
+        self._order = self._order[order]
 
     def select_all(self):
-        for trace in self:
-            trace.set_selected(True)
+        self._set_selected(slice(None), True)
 
     def select_none(self):
-        for trace in self:
-            trace.set_selected(False)
+        self._set_selected(slice(None), False)
+
+    def _set_selected(self, rows, value):
+        """Set is_selected of store rows, updating statepaths of accessed traces."""
+        self._trace_metadata.is_selected[rows] = value
+        self._trace_metadata.dirty[rows] = True
+        changed = np.zeros(len(self._trace_metadata), dtype=bool)
+        changed[rows] = True
+        for row, trace in self._traces.items():
+            if changed[row]:
+                trace._update_statepath()
 
     def update_results(self):
         # self.results = smtirf.results.Results(self)
         self.results.hist.calculate()
         self.results.tdp.calculate()
+
+
+def _positions(trace_index, index):
+    """Return which traces are kept in a copy with rows index, and their rows."""
+    if index is None:
+        return np.ones(len(trace_index), dtype=bool), trace_index
+    keep = np.isin(trace_index, index)
+    return keep, np.searchsorted(index, trace_index[keep])
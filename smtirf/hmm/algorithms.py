@@ -1,133 +1,574 @@
+import heapq
 import warnings
+from contextlib import contextmanager
 
+import numba
 import numpy as np
-from numba import jit
+from numba import jit, prange
 
-from .detail import ExitFlag
-from .distributions import Dirichlet, DirichletArray, NormalGamma
+from .detail import ExitFlag, SufficientStatistics
+from .distributions import (
+    Dirichlet,
+    DirichletArray,
+    NormalGamma,
+    _quadratic_emissions,
+)
 
 
 def train_baumwelch(x, theta, maxIter=250, tol=1e-5, printWarnings=True):
+    return train_baumwelch_global(
+        [x], theta, maxIter=maxIter, tol=tol, printWarnings=printWarnings, n_jobs=1
+    )
+
+
+def train_variational(x, theta, maxIter=250, tol=1e-5, printWarnings=True):
+    return train_variational_global(
+        [x], theta, maxIter=maxIter, tol=tol, printWarnings=printWarnings, n_jobs=1
+    )
+
+
+def train_baumwelch_global(
+    X, theta, maxIter=250, tol=1e-5, printWarnings=True, n_jobs=None
+):
+    """Baum-Welch training of one model shared by many traces.
+
+    The E-step runs over all traces in parallel and pools their sufficient
+    statistics for a single M-step per iteration; see fwdback_segments.
+    """
+    segments = X if isinstance(X, Segments) else Segments(X)
+    workspace = SegmentsWorkspace(segments, theta.K)
     L = np.zeros(maxIter)
     isConverged = False
     for itr in range(maxIter):
         # E-step
-        gamma, xi, lnZ = fwdback(theta.pi, theta.A, theta.p_X(x).T)
-        L[itr] = lnZ
+        _, stats = fwdback_segments(
+            segments,
+            theta.pi,
+            theta.A,
+            theta.emission_coefficients(),
+            n_jobs,
+            workspace,
+        )
+        L[itr] = stats.lnZ
         # Check for convergence
-        if itr > 1:
-            deltaL = L[itr] - L[itr - 1]
-            if deltaL < 0 and printWarnings:
-                # todo: check stacklevel, pytest
-                warnings.warn(
-                    f"log likelihood decreasing by {np.abs(deltaL):0.4f}", stacklevel=1
-                )
-            if np.abs(deltaL) < tol:
-                isConverged = True
-                break
+        if itr > 1 and _is_converged(L, itr, tol, printWarnings, "log likelihood"):
+            isConverged = True
+            break
         # M-step
-        theta.update(x, gamma, xi)
+        theta.update_global(stats)
 
     return ExitFlag(L[: itr + 1], isConverged)
 
 
-def train_variational(x, theta, maxIter=250, tol=1e-5, printWarnings=True):
+def train_variational_global(
+    X, theta, maxIter=250, tol=1e-5, printWarnings=True, n_jobs=None
+):
+    """Variational Bayes training of one model shared by many traces.
+
+    The lower bound is the sum of the log normalizations of all traces less the
+    divergence of the shared posterior from the prior.
+    """
+    segments = X if isinstance(X, Segments) else Segments(X)
     u, w = theta._u, theta._w
+    workspace = SegmentsWorkspace(segments, theta.K)
     L = np.zeros(maxIter)
     isConverged = False
     for itr in range(maxIter):
         # E-step
-        gamma, xi, lnZ = fwdback(
-            np.exp(w.lnPiStar), np.exp(w.lnAStar), np.exp(w.mahalanobis(x))
+        _, stats = fwdback_segments(
+            segments,
+            np.exp(w.lnPiStar),
+            np.exp(w.lnAStar),
+            w.mahalanobis_coefficients(),
+            n_jobs,
+            workspace,
         )
         # Evaluate ELBO
-        L[itr] = lnZ - kldiv(u, w)
+        L[itr] = stats.lnZ - kldiv(u, w)
         # Check for convergence
-        if itr > 0:
-            deltaL = L[itr] - L[itr - 1]
-            if deltaL < 0 and printWarnings:
-                # todo: check stacklevel, pytest
-                warnings.warn(
-                    f"lower bound decreasing by {np.abs(deltaL):0.4f}", stacklevel=1
-                )
-            if np.abs(deltaL) < tol:
-                isConverged = True
-                break
+        if itr > 0 and _is_converged(L, itr, tol, printWarnings, "lower bound"):
+            isConverged = True
+            break
         # M-step
-        theta.update(u, x, gamma, xi)
+        theta.update_global(u, stats)
 
     # TODO: need to sort mu
 
     return ExitFlag(L[: itr + 1], isConverged)
 
 
-@jit(nopython=True)
-def fwdback(pi, A, B):
+def _is_converged(L, itr, tol, printWarnings, quantity):
+    deltaL = L[itr] - L[itr - 1]
+    if deltaL < 0 and printWarnings:
+        # todo: check stacklevel, pytest
+        warnings.warn(f"{quantity} decreasing by {np.abs(deltaL):0.4f}", stacklevel=2)
+    return np.abs(deltaL) < tol
+
+
+def as_observations(X):
+    """Return the observations of each trace as contiguous float64 arrays.
+
+    Raises ValueError if there are none.
+    """
+    X = [np.ascontiguousarray(x, dtype=np.float64) for x in X]
+    if not any(x.size for x in X):
+        raise ValueError("no observations to train on.")
+    return X
+
+
+class Segments:
+    """Observations of many traces concatenated into one array.
+
+    Segments are processed in groups of about equal total length, several groups
+    per numba thread to balance the load; see fwdback_segments and
+    viterbi_segments.
+
+    Parameters
+    ----------
+    X: Iterable[np.ndarray]
+        observations of each trace
+
+    Attributes
+    ----------
+    x: np.ndarray
+        [N] concatenated observations
+    offsets: np.ndarray
+        [M + 1] start of each segment in x, and N
+    """
+
+    def __init__(self, X):
+        X = as_observations(X)
+        lengths = np.array([x.size for x in X], dtype=np.int64)
+        self.x = np.concatenate(X)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        groups = _partition(lengths, 4 * numba.config.NUMBA_NUM_THREADS)
+        # segments of each group are order[bounds[g] : bounds[g + 1]]
+        self._order = np.concatenate(groups).astype(np.int64)
+        self._bounds = np.concatenate(([0], np.cumsum([len(g) for g in groups])))
+        # frame buffers of each group, sized for its longest segment, are
+        # rows[g] : rows[g + 1] of a SegmentsWorkspace
+        self._rows = np.concatenate(
+            ([0], np.cumsum([lengths[g].max() for g in groups]))
+        ).astype(np.int64)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def split(self, values):
+        """Split [N ...] values along the first axis into views of each segment."""
+        return np.split(values, self.offsets[1:-1])
+
+
+class SegmentsWorkspace:
+    """Preallocated forward-backward buffers for every group of Segments.
+
+    A workspace is allocated once per training run and reused across EM
+    iterations; see fwdback_segments.
+
+    Parameters
+    ----------
+    segments: Segments
+        observations the workspace is used for
+    K: int
+        number of states
+    """
+
+    def __init__(self, segments, K):
+        n_frames, n_groups = segments._rows[-1], len(segments._bounds) - 1
+        self.segments = segments
+        self.K = K
+        self.alpha = np.empty((n_frames, K))  # overwritten by gamma
+        self.emissions = np.empty((n_frames, K))
+        self.c = np.empty(n_frames)
+        self.beta = np.empty((n_groups, 2, K))
+        self.xi = np.empty((n_groups, K, K))
+        self.work = np.empty((n_groups, K))
+
+    def fits(self, segments, K):
+        return segments is self.segments and K == self.K
+
+
+def fwdback_segments(segments, pi, A, coefficients, n_jobs=None, workspace=None):
+    """Forward-backward over every segment in one parallel pass.
+
+    Log emission probabilities of each trace are computed from the coefficients of
+    quadratic_emissions into a [T x K] workspace buffer, then shifted as in
+    fwdback(..., log=True) and exponentiated in place. Each group of traces run by
+    one thread has buffers as long as its longest trace, reused for all its traces.
+
+    Parameters
+    ----------
+    segments: Segments
+        observations of all traces
+    pi: np.ndarray
+        [K] initial state probabilities
+    A: np.ndarray
+        [K x K] transition matrix
+    coefficients: tuple[np.ndarray, np.ndarray, np.ndarray]
+        [K] means, offsets and scales of the log emission probabilities
+    n_jobs: int or None
+        number of numba threads; None for all
+    workspace: SegmentsWorkspace or None
+        buffers to compute in; allocated for this call if None
+
+    Returns
+    -------
+    lnZ: np.ndarray
+        [M] log likelihood of each segment; 0 for empty segments
+    stats: SufficientStatistics
+        statistics summed over all segments
+    """
+    m, offset, scale = coefficients
+    K, n_groups = m.size, len(segments._bounds) - 1
+    if workspace is None:
+        workspace = SegmentsWorkspace(segments, K)
+    elif not workspace.fits(segments, K):
+        raise ValueError(
+            f"workspace for {workspace.K} states and other segments cannot hold "
+            f"these segments with {K} states."
+        )
+    lnZ = np.zeros(len(segments))
+    sums = [np.zeros((n_groups, K)) for _ in range(4)]
+    xi = np.zeros((n_groups, K, K))
+    with _num_threads(n_jobs):
+        _fwdback_segments(
+            segments.x,
+            segments.offsets,
+            segments._order,
+            segments._bounds,
+            segments._rows,
+            pi,
+            A,
+            m,
+            offset,
+            scale,
+            workspace.alpha,
+            workspace.emissions,
+            workspace.c,
+            workspace.beta,
+            workspace.xi,
+            workspace.work,
+            lnZ,
+            xi,
+            *sums,
+        )
+
+    stats = SufficientStatistics(K)
+    stats.gamma0, stats.Nk, stats.x, stats.x2 = (values.sum(axis=0) for values in sums)
+    stats.xi = xi.sum(axis=0)
+    stats.lnZ = lnZ.sum()
+    stats.n_traces = len(segments._order)
+    return lnZ, stats
+
+
+def viterbi_segments(segments, lnPi, lnA, coefficients, n_jobs=None):
+    """Most likely state path of every segment in one parallel pass.
+
+    Parameters
+    ----------
+    segments: Segments
+        observations of all traces
+    lnPi: np.ndarray
+        [K] log initial state probabilities
+    lnA: np.ndarray
+        [K x K] log transition matrix
+    coefficients: tuple[np.ndarray, np.ndarray, np.ndarray]
+        [K] means, offsets and scales of the log emission probabilities; see
+        quadratic_emissions
+    n_jobs: int or None
+        number of numba threads; None for all
+
+    Returns
+    -------
+    np.ndarray:
+        [N] int32 state paths, concatenated like the observations
+    """
+    m, offset, scale = coefficients
+    Q = np.zeros(segments.x.size, dtype=np.int32)
+    with _num_threads(n_jobs):
+        _viterbi_segments(
+            segments.x,
+            segments.offsets,
+            segments._order,
+            segments._bounds,
+            lnPi,
+            lnA,
+            m,
+            offset,
+            scale,
+            Q,
+        )
+    return Q
+
+
+@contextmanager
+def _num_threads(n_jobs):
+    if n_jobs is None:
+        yield
+        return
+    if n_jobs < 1:
+        raise ValueError("n_jobs must be positive.")
+    previous = numba.get_num_threads()
+    numba.set_num_threads(min(n_jobs, numba.config.NUMBA_NUM_THREADS))
+    try:
+        yield
+    finally:
+        numba.set_num_threads(previous)
+
+
+def _partition(lengths, n_groups):
+    """Split trace indices into at most n_groups groups of about equal total length.
+
+    Empty traces are left out.
+    """
+    loads = [(0, k) for k in range(n_groups)]
+    groups = [[] for _ in range(n_groups)]
+    for n in sorted(range(len(lengths)), key=lambda n: -lengths[n]):
+        if lengths[n] == 0:
+            break
+        load, k = heapq.heappop(loads)
+        groups[k].append(n)
+        heapq.heappush(loads, (load + lengths[n], k))
+    return [sorted(group) for group in groups if group]
+
+
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def _fwdback_segments(
+    x,
+    offsets,
+    order,
+    bounds,
+    rows,
+    pi,
+    A,
+    m,
+    offset,
+    scale,
+    alpha_buffer,
+    B_buffer,
+    c_buffer,
+    beta_buffer,
+    xi_buffer,
+    work_buffer,
+    lnZ,
+    xi,
+    gamma0,
+    Nk,
+    sx,
+    sx2,
+):
+    K = m.size
+    for g in prange(bounds.size - 1):
+        alpha = alpha_buffer[rows[g] : rows[g + 1]]
+        B = B_buffer[rows[g] : rows[g + 1]]
+        c = c_buffer[rows[g] : rows[g + 1]]
+        beta, xi_n, work = beta_buffer[g], xi_buffer[g], work_buffer[g]
+
+        for r in range(bounds[g], bounds[g + 1]):
+            n = order[r]
+            xn = x[offsets[n] : offsets[n + 1]]
+            T = xn.size
+            _quadratic_emissions(xn, m, offset, scale, B[:T])
+            shift = _exp_shifted(B[:T], B[:T])
+            lnZ[n] = shift + _fwdback(pi, A, B[:T], alpha[:T], c[:T], beta, xi_n, work)
+
+            # sufficient statistics; alpha now holds gamma
+            xi[g] += xi_n
+            for k in range(K):
+                gamma0[g, k] += alpha[0, k]
+            for t in range(T):
+                for k in range(K):
+                    p = alpha[t, k]
+                    Nk[g, k] += p
+                    sx[g, k] += p * xn[t]
+                    sx2[g, k] += p * xn[t] * xn[t]
+
+
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def _viterbi_segments(x, offsets, order, bounds, lnPi, lnA, m, offset, scale, Q):
+    K = m.size
+    for g in prange(bounds.size - 1):
+        n_frames = 0
+        for r in range(bounds[g], bounds[g + 1]):
+            n = order[r]
+            n_frames = max(n_frames, offsets[n + 1] - offsets[n])
+        lnB = np.empty((n_frames, K))
+        psi = np.empty((n_frames, K), dtype=np.int32)
+        delta = np.empty(K)
+        previous = np.empty(K)
+
+        for r in range(bounds[g], bounds[g + 1]):
+            n = order[r]
+            start, stop = offsets[n], offsets[n + 1]
+            T = stop - start
+            _quadratic_emissions(x[start:stop], m, offset, scale, lnB[:T])
+            _viterbi(lnPi, lnA, lnB[:T], psi[:T], delta, previous, Q[start:stop])
+
+
+def fwdback(pi, A, B, log=False):
+    """Scaled forward-backward algorithm.
+
+    With log emission probabilities, each frame is shifted by its largest log
+    probability before exponentiating, so frames far from every state do not
+    underflow to zero probability.
+
+    Parameters
+    ----------
+    pi: np.ndarray
+        [K] initial state probabilities
+    A: np.ndarray
+        [K x K] transition matrix
+    B: np.ndarray
+        [T x K] emission probabilities, or their logarithms if log
+    log: bool
+        whether B holds log emission probabilities
+
+    Returns
+    -------
+    gamma: np.ndarray
+        [T x K] state probabilities
+    xi: np.ndarray
+        [K x K] transition probabilities summed over time
+    L: float
+        log likelihood
+    """
+    T, K = B.shape
+    shift = 0.0
+    if log:
+        lnB, B = B, np.empty((T, K))
+        shift = _exp_shifted(lnB, B)
+    alpha, c, xi = np.empty((T, K)), np.empty(T), np.empty((K, K))
+    L = _fwdback(pi, A, B, alpha, c, np.empty((2, K)), xi, np.empty(K))
+    return alpha, xi, L + shift
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _fwdback(pi, A, B, alpha, c, beta, xi, work):
+    """Forward-backward in preallocated buffers; see fwdback.
+
+    The transition probabilities are summed over time as the backward loop runs,
+    and only two frames of beta are kept. alpha is overwritten by gamma. Returns
+    the log likelihood.
+    """
     T, K = B.shape
-    alpha = np.zeros((T, K))
-    beta = np.zeros((T, K))
-    c = np.zeros(T)
 
     # forward loop
-    alpha[0] = pi * B[0]
-    c[0] = np.sum(alpha[0])
-    alpha[0] = alpha[0] / c[0]
+    norm = 0.0
+    for k in range(K):
+        alpha[0, k] = pi[k] * B[0, k]
+        norm += alpha[0, k]
+    c[0] = norm
+    for k in range(K):
+        alpha[0, k] /= norm
     for t in range(1, T):
+        norm = 0.0
         for k in range(K):
-            alpha[t, k] = np.sum(alpha[t - 1] * A[:, k]) * B[t, k]
-        c[t] = np.sum(alpha[t])
-        alpha[t] = alpha[t] / c[t]
-
-    # backward loop
-    beta[-1] = 1
-    for t in range(1, T):
+            s = 0.0
+            for i in range(K):
+                s += alpha[t - 1, i] * A[i, k]
+            alpha[t, k] = s * B[t, k]
+            norm += alpha[t, k]
+        c[t] = norm
         for k in range(K):
-            beta[-(t + 1), k] = np.sum(A[k] * B[-t] * beta[-t]) / c[-t]
+            alpha[t, k] /= norm
 
-    # state probabilities
-    gamma = alpha * beta
-    # transition probabilities
-    xi = np.zeros((T - 1, K, K))
-    for t in range(T - 1):
+    # backward loop, accumulating xi and turning alpha into gamma
+    xi[:, :] = 0.0
+    nxt = (T - 1) % 2
+    for k in range(K):
+        beta[nxt, k] = 1.0
+    for t in range(T - 2, -1, -1):
+        cur = t % 2
+        for j in range(K):
+            work[j] = B[t + 1, j] * beta[nxt, j] / c[t + 1]
         for i in range(K):
+            s = 0.0
             for j in range(K):
-                xi[t, i, j] = (
-                    alpha[t, i] * A[i, j] * B[t + 1, j] * beta[t + 1, j] / c[t + 1]
-                )
-    xi = np.sum(xi, axis=0)  # sum over time
-    L = np.sum(np.log(c))  # log(likelihood) !!! usual BaumWelch minimizes -log(L)
+                p = A[i, j] * work[j]
+                s += p
+                xi[i, j] += alpha[t, i] * p
+            beta[cur, i] = s
+        for j in range(K):
+            alpha[t + 1, j] *= beta[nxt, j]
+        nxt = cur
+    for k in range(K):
+        alpha[0, k] *= beta[nxt, k]
 
-    return gamma, xi, L
+    L = 0.0  # log(likelihood) !!! usual BaumWelch minimizes -log(L)
+    for t in range(T):
+        L += np.log(c[t])
+    return L
 
 
-@jit(nopython=True)
-def _viterbi(x, pi, A, B):
-    # setup
-    T, K = B.shape
-    pi = np.log(pi)
-    A = np.log(A)
-    B = np.log(B)
-    psi = np.zeros(B.shape, dtype=np.int32)
-    Q = np.zeros(T, dtype=np.int32)
+@jit(nopython=True, nogil=True, cache=True)
+def _exp_shifted(lnB, B):
+    """Exponentiate each frame of lnB shifted by its maximum into B.
+
+    Returns the sum of the shifts, which is added back to the log likelihood.
+    """
+    T, K = lnB.shape
+    total = 0.0
+    for t in range(T):
+        shift = lnB[t, 0]
+        for k in range(1, K):
+            shift = max(shift, lnB[t, k])
+        if not np.isfinite(shift):
+            shift = 0.0
+        for k in range(K):
+            B[t, k] = np.exp(lnB[t, k] - shift)
+        total += shift
+    return total
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def viterbi(lnPi, lnA, lnB):
+    """Most likely state path, computed in log space.
+
+    Parameters
+    ----------
+    lnPi: np.ndarray
+        [K] log initial state probabilities
+    lnA: np.ndarray
+        [K x K] log transition matrix
+    lnB: np.ndarray
+        [T x K] log emission probabilities
+
+    Returns
+    -------
+    np.ndarray:
+        [T] int32 state path
+    """
+    T, K = lnB.shape
+    Q = np.empty(T, dtype=np.int32)
+    psi = np.empty((T, K), dtype=np.int32)
+    _viterbi(lnPi, lnA, lnB, psi, np.empty(K), np.empty(K), Q)
+    return Q
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _viterbi(lnPi, lnA, lnB, psi, delta, previous, Q):
+    """Viterbi in preallocated buffers; the state path is written to Q."""
+    T, K = lnB.shape
 
     # initialization
-    delta = np.expand_dims(pi + B[0], 1)
+    for k in range(K):
+        delta[k] = lnPi[k] + lnB[0, k]
     # recursion
     for t in range(1, T):
-        R = delta + A
+        previous[:] = delta
         for k in range(K):
-            psi[t, k] = np.argmax(R[:, k])
-            delta[k] = np.max(R[:, k]) + B[t, k]
+            best, value = 0, previous[0] + lnA[0, k]
+            for i in range(1, K):
+                if previous[i] + lnA[i, k] > value:
+                    best, value = i, previous[i] + lnA[i, k]
+            psi[t, k] = best
+            delta[k] = value + lnB[t, k]
 
     # termination
-    # todo: check if this is still needed
-    # psiStar = np.max(delta)
-    Q[-1] = np.argmax(delta)
+    Q[T - 1] = np.argmax(delta)
     # path backtracking
-    for t in range(1, T):
-        Q[-(t + 1)] = psi[-t, Q[-t]]
-
-    return Q
+    for t in range(T - 1, 0, -1):
+        Q[t - 1] = psi[t, Q[t]]
 
 
 def kldiv(u, w):
@@ -54,3 +54,31 @@ class ExitFlag:
     @property
     def Lmax(self):
         return self.L[-1]
+
+
+class SufficientStatistics:
+    """Expected sufficient statistics of a Normal emission HMM, summed over traces.
+
+    Parameters
+    ----------
+    K: int
+        number of states
+    """
+
+    def __init__(self, K):
+        self.gamma0 = np.zeros(K)  # initial state probabilities
+        self.xi = np.zeros((K, K))  # transition probabilities summed over time
+        self.Nk = np.zeros(K)  # state occupancies
+        self.x = np.zeros(K)  # occupancy-weighted sums of the observations
+        self.x2 = np.zeros(K)  # ... and of their squares
+        self.lnZ = 0.0  # log likelihood
+        self.n_traces = 0
+
+    @property
+    def xbar(self):
+        return self.x / self.Nk
+
+    @property
+    def S(self):
+        """variance of the observations in each state"""
+        return self.x2 / self.Nk - self.xbar**2
@@ -1,4 +1,5 @@
 import numpy as np
+from numba import jit
 from scipy.special import digamma, gammaln
 from sklearn.cluster import KMeans
 
@@ -14,6 +15,8 @@ __all__ = [
     "NormalGamma",
     "NormalGammaSharedVariance",
     "MultimerNormalGamma",
+    "quadratic_coefficients",
+    "quadratic_emissions",
 ]
 
 
@@ -153,10 +156,17 @@ class Normal:
         return np.sqrt(1 / self.tau)
 
     def p_X(self, x):
-        """P(x|μ,τ)"""
-        X = row(x) - col(self.mu)
-        lnP = -0.5 * np.log(2 * np.pi / col(self.tau)) - col(self.tau) / 2 * X**2
-        return np.exp(lnP)
+        """P(x|μ,τ) as [K x T]"""
+        return np.exp(self.lnp_X(x)).T
+
+    def lnp_X(self, x):
+        """ln P(x|μ,τ) as [T x K]"""
+        return quadratic_emissions(x, *self.emission_coefficients())
+
+    def emission_coefficients(self):
+        """Coefficients of lnp_X; see quadratic_emissions."""
+        tau = self.tau * np.ones(self.K)
+        return quadratic_coefficients(self.mu, -0.5 * np.log(2 * np.pi / tau), tau / 2)
 
     # ==> TODO: change to static method
     # ==>       use SharedVariance as base class??
@@ -170,15 +180,7 @@ class Normal:
         tau = 1 / np.std(x0) ** 2
         self._tau = np.full(self.K, tau)
 
-    @staticmethod
-    def calc_sufficient_statistics(x, gamma):
-        Nk = gamma.sum(axis=0)
-        xbar = np.sum(gamma * col(x), axis=0) / Nk
-        S = np.sum(gamma * (col(x) - row(xbar)) ** 2, axis=0) / Nk  # variance
-        return Nk, xbar, S
-
-    def update(self, x, gamma):
-        Nk, xbar, S = self.calc_sufficient_statistics(x, gamma)
+    def update_statistics(self, Nk, xbar, S):
         self._mu = xbar
         self._tau = 1 / S
 
@@ -190,8 +192,7 @@ class NormalSharedVariance(Normal):
         self._mu = mu
         self._tau = tau
 
-    def update(self, x, gamma):
-        Nk, xbar, S = self.calc_sufficient_statistics(x, gamma)
+    def update_statistics(self, Nk, xbar, S):
         self._mu = xbar
         self._tau = 1 / ((S * Nk).sum() / Nk.sum())  # un-normalize S, sum, re-normalize
 
@@ -262,8 +263,12 @@ class NormalGamma(Normal):
         return digamma(self.a) - np.log(self.b)
 
     def mahalanobis(self, x):
-        Delta2 = row(1 / self.beta) + row(self.tau) * (col(x) - row(self.m)) ** 2
-        return 0.5 * row(self.lnTauStar) - 0.5 * np.log(2 * np.pi) - 0.5 * Delta2
+        return quadratic_emissions(x, *self.mahalanobis_coefficients())
+
+    def mahalanobis_coefficients(self):
+        """Coefficients of mahalanobis; see quadratic_emissions."""
+        offset = 0.5 * self.lnTauStar - 0.5 * np.log(2 * np.pi) - 0.5 / self.beta
+        return quadratic_coefficients(self.m, offset, self.tau / 2)
 
     def sample(self):
         sigma = np.sqrt(1 / (self.beta * self.tau))
@@ -396,10 +401,10 @@ class MultimerNormalGamma(NormalGammaSharedVariance):
         lnP = -0.5 * np.log(2 * np.pi / tau) - tau / 2 * X**2
         return np.exp(lnP)
 
-    def mahalanobis(self, x):
-        epsilonbeta = row(np.hstack((self.epsilon, np.ones(self.K - 1) * self.beta)))
-        Delta2 = 1 / epsilonbeta + self.tau * (col(x) - row(self.m)) ** 2
-        return 0.5 * self.lnTauStar - 0.5 * np.log(2 * np.pi) - 0.5 * Delta2
+    def mahalanobis_coefficients(self):
+        epsilonbeta = np.hstack((self.epsilon, np.ones(self.K - 1) * self.beta))
+        offset = 0.5 * self.lnTauStar - 0.5 * np.log(2 * np.pi) - 0.5 / epsilonbeta
+        return quadratic_coefficients(self.m, offset, self.tau / 2)
 
     def sample(self):
         # draw offset
@@ -425,3 +430,47 @@ class MultimerNormalGamma(NormalGammaSharedVariance):
         b1 = (uPhi.epsilon * N0 / (uPhi.epsilon + N0)) * (dbar - uPhi.d0) ** 2
         b2 = (uPhi.beta * Nk / (uPhi.beta + Nk)) * (xbar - uPhi.m0) ** 2
         self._b = uPhi.b + 0.5 * ((N0 + Nk) * S) + 0.5 * (b1 + b2)
+
+
+def quadratic_coefficients(m, offset, scale):
+    """Broadcast the coefficients of quadratic_emissions to [K] float64 arrays."""
+    K = np.size(m)
+    return tuple(
+        np.broadcast_to(np.asarray(v, dtype=np.float64), K).copy()
+        for v in (m, offset, scale)
+    )
+
+
+def quadratic_emissions(x, m, offset, scale):
+    """Log emission probabilities of the form offset - scale * (x - m)²
+
+    Parameters
+    ----------
+    x: np.ndarray
+        [T] observations
+    m: np.ndarray
+        [K] state means
+    offset: np.ndarray or float
+        [K] or scalar constant term
+    scale: np.ndarray or float
+        [K] or scalar, half the precision
+
+    Returns
+    -------
+    np.ndarray:
+        [T x K] log emission probabilities
+    """
+    m, offset, scale = quadratic_coefficients(m, offset, scale)
+    x = np.asarray(x, dtype=np.float64)
+    lnB = np.empty((x.size, m.size))
+    _quadratic_emissions(x, m, offset, scale, lnB)
+    return lnB
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _quadratic_emissions(x, m, offset, scale, lnB):
+    T, K = lnB.shape
+    for t in range(T):
+        for k in range(K):
+            d = x[t] - m[k]
+            lnB[t, k] = offset[k] - scale[k] * d * d
@@ -87,9 +87,18 @@ class HMMHyperParameters:
     def mahalanobis(self, x):
         return self._phi.mahalanobis(x)
 
+    def mahalanobis_coefficients(self):
+        return self._phi.mahalanobis_coefficients()
+
     def p_X(self, x):
         return self._phi.p_X(x)
 
+    def lnp_X(self, x):
+        return self._phi.lnp_X(x)
+
+    def emission_coefficients(self):
+        return self._phi.emission_coefficients()
+
     def update(self, u, gamma, xiSum, Nk, xbar, S):
         self._rho.update(u._rho, gamma[0])
         self._alpha.update(u._alpha, xiSum)
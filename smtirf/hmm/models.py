@@ -4,7 +4,7 @@ import numpy as np
 
 from .. import SMJsonDecoder, SMJsonEncoder
 from . import algorithms as hmmalg, hyperparameters as hyper
-from .detail import ExitFlag, col, normalize_rows, row
+from .detail import ExitFlag, normalize_rows, row
 from .distributions import Categorical, CategoricalArray, Normal, NormalSharedVariance
 
 
@@ -16,9 +16,42 @@ class BaseHiddenMarkovModel:
         return [(s, y) for s, y in zip(S, Y, strict=False)]
 
     def label(self, x, deBlur=False, deSpike=False):
-        SP = hmmalg._viterbi(x, self.pi, self.A, self.p_X(x).T).astype(int)
+        with np.errstate(divide="ignore"):  # log(0) = -inf is fine
+            lnPi, lnA = np.log(self.pi), np.log(self.A)
+        SP = hmmalg.viterbi(lnPi, lnA, self.lnp_X(x)).astype(int)
         return SP
 
+    def label_traces(self, X, n_jobs=None):
+        """Viterbi state paths of many traces, computed in one parallel pass.
+
+        Parameters
+        ----------
+        X: Iterable[np.ndarray] or Segments
+            observations of each trace
+        n_jobs: int or None
+            number of threads; None for all
+
+        Returns
+        -------
+        list[np.ndarray]:
+            state path of each trace
+        """
+        segments = X if isinstance(X, hmmalg.Segments) else hmmalg.Segments(X)
+        with np.errstate(divide="ignore"):  # log(0) = -inf is fine
+            lnPi, lnA = np.log(self.pi), np.log(self.A)
+        SP = hmmalg.viterbi_segments(
+            segments, lnPi, lnA, self.emission_coefficients(), n_jobs
+        )
+        return segments.split(SP.astype(int))
+
+    def score_traces(self, X, n_jobs=None):
+        """Log likelihood of each of many traces, computed in one parallel pass."""
+        segments = X if isinstance(X, hmmalg.Segments) else hmmalg.Segments(X)
+        lnZ, _ = hmmalg.fwdback_segments(
+            segments, self.pi, self.A, self.emission_coefficients(), n_jobs
+        )
+        return lnZ
+
     def get_emission_path(self, SP):
         return self.mu[SP]
 
@@ -85,19 +118,44 @@ class ClassicHiddenMarkovModel(BaseHiddenMarkovModel):
     def p_X(self, x):
         return self._phi.p_X(x)
 
-    # TODO => update_global, train_new_global
+    def lnp_X(self, x):
+        return self._phi.lnp_X(x)
 
-    def update(self, x, gamma, xi):
-        self._pi.update(gamma[0])
-        self._A.update(xi / col(gamma[:-1].sum(axis=0)))
-        self._phi.update(x, gamma)
+    def emission_coefficients(self):
+        return self._phi.emission_coefficients()
+
+    def update_global(self, stats):
+        self._pi.update(stats.gamma0 / stats.gamma0.sum())
+        self._A.update(normalize_rows(stats.xi))
+        self._phi.update_statistics(stats.Nk, stats.xbar, stats.S)
 
     def train(self, x, maxIter=1000, tol=1e-5, printWarnings=True):
         self.exitFlag = hmmalg.train_baumwelch(
             x, self, maxIter=maxIter, tol=tol, printWarnings=printWarnings
         )
 
-    # TODO => muScale for PIFE data
+    def train_global(self, X, maxIter=1000, tol=1e-5, printWarnings=True, n_jobs=None):
+        self.exitFlag = hmmalg.train_baumwelch_global(
+            X,
+            self,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+            n_jobs=n_jobs,
+        )
+
+    @classmethod
+    def _initial_models(cls, K, sharedVariance):
+        # TODO => muScale for PIFE data
+        pi = np.ones(K) / K
+        A = normalize_rows(np.eye(K) * 1 + np.ones((K, K)))
+        mu = np.linspace(0, 1, K + 2)[1:-1]
+        if sharedVariance:
+            sigma = 0.1
+        else:
+            sigma = np.ones(K) * 0.1
+        return [cls(K, pi, A, mu, 1 / sigma**2, sharedVariance)]
+
     @classmethod
     def train_new(
         cls,
@@ -109,20 +167,37 @@ class ClassicHiddenMarkovModel(BaseHiddenMarkovModel):
         tol=1e-5,
         printWarnings=True,
     ):
-        # initial guess for parameters
-        pi = np.ones(K) / K
-        A = normalize_rows(np.eye(K) * 1 + np.ones((K, K)))
-        mu = np.linspace(0, 1, K + 2)[1:-1]
-        if sharedVariance:
-            sigma = 0.1
-        else:
-            sigma = np.ones(K) * 0.1
-        theta = cls(K, pi, A, mu, 1 / sigma**2, sharedVariance)
-        # TRAIN
-        if refineByKmeans:
-            theta.refine_by_kmeans(x)
-        theta.train(x)
-        return theta
+        return HiddenMarkovModel._train_candidates(
+            cls._initial_models(K, sharedVariance),
+            x,
+            refineByKmeans,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+        )
+
+    @classmethod
+    def train_new_global(
+        cls,
+        X,
+        K,
+        sharedVariance,
+        refineByKmeans=True,
+        maxIter=1000,
+        tol=1e-5,
+        printWarnings=True,
+        n_jobs=None,
+    ):
+        return HiddenMarkovModel._train_candidates(
+            cls._initial_models(K, sharedVariance),
+            X,
+            refineByKmeans,
+            pooled=True,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+            n_jobs=n_jobs,
+        )
 
     def refine_by_kmeans(self, x):
         self._phi.refine_by_kmeans(x)
@@ -187,25 +262,48 @@ class VariationalHiddenMarkovModel(BaseHiddenMarkovModel):
     def p_X(self, x):
         return self._w.p_X(x)
 
-    def update(self, u, x, gamma, xi):
-        # calculate sufficient calculate sufficient statistics
-        Nk = gamma.sum(axis=0)
-        xbar = np.sum(gamma * col(x), axis=0) / Nk
-        S = np.sum(gamma * (col(x) - row(xbar)) ** 2, axis=0) / Nk  # variance
-        # update posterior
-        self._w.update(u, gamma, xi, Nk, xbar, S)
+    def lnp_X(self, x):
+        return self._w.lnp_X(x)
+
+    def emission_coefficients(self):
+        return self._w.emission_coefficients()
 
-    # TODO => update_global, train_new_global
+    def update_global(self, u, stats):
+        self._w.update(u, row(stats.gamma0), stats.xi, stats.Nk, stats.xbar, stats.S)
 
     def train(self, x, maxIter=1000, tol=1e-5, printWarnings=True):
         self.exitFlag = hmmalg.train_variational(
             x, self, maxIter=maxIter, tol=tol, printWarnings=printWarnings
         )
+        self._sort()
+
+    def train_global(self, X, maxIter=1000, tol=1e-5, printWarnings=True, n_jobs=None):
+        self.exitFlag = hmmalg.train_variational_global(
+            X,
+            self,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+            n_jobs=n_jobs,
+        )
+        self._sort()
+
+    def _sort(self):
         try:
             self._w.sort()
         except IndexError:  # multimer model has no sort method
             pass
 
+    @classmethod
+    def _initial_models(cls, K, sharedVariance, repeats):
+        # initialize prior
+        if sharedVariance:
+            u = hyper.HMMHyperParametersSharedVariance.uninformative(K)
+        else:
+            u = hyper.HMMHyperParameters.uninformative(K)
+        # sample posteriors from prior for r repeats
+        return [cls(K, u, u.sample_posterior(), sharedVariance) for r in range(repeats)]
+
     @classmethod
     def train_new(
         cls,
@@ -218,24 +316,38 @@ class VariationalHiddenMarkovModel(BaseHiddenMarkovModel):
         tol=1e-5,
         printWarnings=False,
     ):
-        # initialize prior
-        if sharedVariance:
-            u = hyper.HMMHyperParametersSharedVariance.uninformative(K)
-        else:
-            u = hyper.HMMHyperParameters.uninformative(K)
-        # sample posteriors from prior for r repeats
-        thetas = [
-            cls(K, u, u.sample_posterior(), sharedVariance) for r in range(repeats)
-        ]
-        # TODO => update by kmeans
-        # TRAIN
-        for theta in thetas:
-            if refineByKmeans:
-                theta.refine_by_kmeans(x)
-            theta.train(x, printWarnings=printWarnings)
-        # select most likely model (largest Lmax)
-        thetas.sort(reverse=True, key=lambda theta: theta.exitFlag.Lmax)
-        return thetas[0]
+        return HiddenMarkovModel._train_candidates(
+            cls._initial_models(K, sharedVariance, repeats),
+            x,
+            refineByKmeans,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+        )
+
+    @classmethod
+    def train_new_global(
+        cls,
+        X,
+        K,
+        sharedVariance,
+        refineByKmeans=True,
+        repeats=5,
+        maxIter=1000,
+        tol=1e-5,
+        printWarnings=False,
+        n_jobs=None,
+    ):
+        return HiddenMarkovModel._train_candidates(
+            cls._initial_models(K, sharedVariance, repeats),
+            X,
+            refineByKmeans,
+            pooled=True,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+            n_jobs=n_jobs,
+        )
 
     def refine_by_kmeans(self, x):
         self._w.refine_by_kmeans(x, self._u)
@@ -264,6 +376,11 @@ class MultimerHiddenMarkovModel(VariationalHiddenMarkovModel):
     def mu0(self):
         return self._w.mu0
 
+    @classmethod
+    def _initial_models(cls, K, sharedVariance, repeats):
+        u = hyper.HmmHyperParametersMultimer.uninformative(K)
+        return [cls(K, u, u.sample_posterior(), sharedVariance) for r in range(repeats)]
+
     @classmethod
     def train_new(
         cls,
@@ -276,41 +393,49 @@ class MultimerHiddenMarkovModel(VariationalHiddenMarkovModel):
         tol=1e-5,
         printWarnings=False,
     ):
-        # initialize prior
-        if sharedVariance:
-            u = hyper.HmmHyperParametersMultimer.uninformative(K)
-        else:
-            u = hyper.HmmHyperParametersMultimer.uninformative(K)
-        # sample posteriors from prior for r repeats
-        thetas = [
-            cls(K, u, u.sample_posterior(), sharedVariance) for r in range(repeats)
-        ]
-        # TODO => update by kmeans
-        # TRAIN
-        for theta in thetas:
-            if refineByKmeans:
-                # theta.refine_by_kmeans(x)
-                # TODO => warn not implemented
-                pass
-            theta.train(x, printWarnings=printWarnings)
-        # select most likely model (largest Lmax)
-        thetas.sort(reverse=True, key=lambda theta: theta.exitFlag.Lmax)
-        return thetas[0]
-
-    def update(self, u, x, gamma, xi):
-        # calculate sufficient calculate sufficient statistics
-        T, K = gamma.shape
-        Nk = gamma.sum(axis=0)
-        # average baseline offset
-        dbar = np.sum(gamma[:, 0] * x) / Nk[0]  # [1, ]
-        # correct signal for offset, estimate monomer intensity
-        xk = np.repeat(col(x), K - 1, axis=1) - dbar  # [T x K-1]
-        xk = xk / row(np.arange(1, K))
-        xbar = np.sum(gamma[:, 1:] * xk) / Nk[1:].sum()  # [1, ]
-        mu = np.arange(K) * xbar + dbar  # [K, ]
-        S = np.sum(gamma * (col(x) - row(mu)) ** 2, axis=0).sum() / Nk.sum()  # variance
-        # update posterior
-        self._w.update(u, gamma, xi, Nk, dbar, xbar, S)
+        # TODO => refine by kmeans; refineByKmeans is ignored
+        return HiddenMarkovModel._train_candidates(
+            cls._initial_models(K, sharedVariance, repeats),
+            x,
+            False,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+        )
+
+    @classmethod
+    def train_new_global(
+        cls,
+        X,
+        K,
+        sharedVariance,
+        refineByKmeans=False,
+        repeats=5,
+        maxIter=1000,
+        tol=1e-5,
+        printWarnings=False,
+        n_jobs=None,
+    ):
+        return HiddenMarkovModel._train_candidates(
+            cls._initial_models(K, sharedVariance, repeats),
+            X,
+            False,
+            pooled=True,
+            maxIter=maxIter,
+            tol=tol,
+            printWarnings=printWarnings,
+            n_jobs=n_jobs,
+        )
+
+    def update_global(self, u, stats):
+        K = self.K
+        Nk = stats.Nk
+        # average baseline offset and monomer intensity
+        dbar = stats.x[0] / Nk[0]
+        xbar = np.sum((stats.x[1:] - dbar * Nk[1:]) / np.arange(1, K)) / Nk[1:].sum()
+        mu = np.arange(K) * xbar + dbar
+        S = np.sum(stats.x2 - 2 * mu * stats.x + mu**2 * Nk) / Nk.sum()  # variance
+        self._w.update(u, row(stats.gamma0), stats.xi, Nk, dbar, xbar, S)
 
 
 class HiddenMarkovModel:
@@ -327,6 +452,61 @@ class HiddenMarkovModel:
         theta = cls.train_new(x, K, sharedVariance, **kwargs)
         return theta
 
+    @staticmethod
+    def train_global(modelType, traces, K, sharedVariance, **kwargs):
+        """Train one model shared by many traces.
+
+        Every EM iteration runs the E-step over all traces in parallel, pools their
+        sufficient statistics and updates the shared model once.
+
+        Parameters
+        ----------
+        modelType: str
+            key of MODEL_TYPES
+        traces: Iterable[np.ndarray]
+            observations of each trace
+        K: int
+            number of states
+        sharedVariance: bool
+            whether all states share one variance
+        kwargs:
+            maxIter, tol, printWarnings, {repeats}, n_jobs (numba threads running
+            the E-step over partitions of the traces; None for all)
+        """
+        cls = HiddenMarkovModel.MODEL_TYPES[modelType]
+        X = hmmalg.as_observations(traces)
+        theta = cls.train_new_global(X, K, sharedVariance, **kwargs)
+        return theta
+
+    @staticmethod
+    def _train_candidates(thetas, x, refineByKmeans, pooled=False, **kwargs):
+        """Train initial models and return the most likely.
+
+        Parameters
+        ----------
+        thetas: list[BaseHiddenMarkovModel]
+            initial models, eg posterior samples of a prior
+        x: np.ndarray or list[np.ndarray]
+            observations of one trace, or of each trace if pooled
+        refineByKmeans: bool
+            refine the emission parameters of each model by k-means first
+        pooled: bool
+            train one model shared by all traces; see train_global
+        kwargs:
+            passed to train, or to train_global if pooled
+        """
+        if refineByKmeans:
+            sample = _kmeans_sample(x) if pooled else x
+        for theta in thetas:
+            if refineByKmeans:
+                theta.refine_by_kmeans(sample)
+            if pooled:
+                theta.train_global(x, **kwargs)
+            else:
+                theta.train(x, **kwargs)
+        # select most likely model (largest Lmax)
+        return max(thetas, key=lambda theta: theta.exitFlag.Lmax)
+
     @staticmethod
     def from_json(jString):
         if jString is None:
@@ -338,3 +518,14 @@ class HiddenMarkovModel:
         modelType = model.pop("modelType")
         cls = HiddenMarkovModel.MODEL_TYPES[modelType]
         return cls._from_json(model)
+
+
+KMEANS_SAMPLE_SIZE = 100_000
+
+
+def _kmeans_sample(X):
+    """Pool the observations of all traces, subsampled for k-means initialization."""
+    x = np.concatenate([np.ravel(x) for x in X])
+    if x.size > KMEANS_SAMPLE_SIZE:
+        x = np.random.choice(x, KMEANS_SAMPLE_SIZE, replace=False)
+    return x
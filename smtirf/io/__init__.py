@@ -1,3 +1,5 @@
 from . import pma
+from .merge import merge
+from .rechunk import rechunk
 
-__all__ = ["pma"]
+__all__ = ["merge", "pma", "rechunk"]
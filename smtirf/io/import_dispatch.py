@@ -1,8 +1,24 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
 
+import h5py
+
+from ..detail.manifest import ManifestEntry, read_manifest, write_manifest_entry
 from ..detail.metadata import MovieMetadata
+from ..detail.processes import process_context
 from ..detail.registry import TRACE_REGISTRY
-from ..detail.writer import write_movie_to_hdf
+from ..detail.writer import (
+    FRAME_CHUNK_SIZE,
+    LiveMovieWriter,
+    _delete_movie,
+    _open_file,
+    _write_movie,
+)
 from . import pma
 
 
@@ -13,15 +29,8 @@ def _validate_experiment_type(experiment_type):
         )
 
 
-# todo: bleed, gamma
-def load_from_pma(
-    filename, experiment_type="fret", *, savename=None, bleedthrough=0.0, gamma=1.0
-):
-    _validate_experiment_type(experiment_type)
-
+def _get_required_pma_files(filename, optional=()):
     filename = Path(filename)
-    savename = filename.with_suffix(".smtrc") if savename is None else Path(savename)
-
     required_files = {
         "traces": filename.with_suffix(".traces"),
         "peaks": filename.with_suffix(".pks"),
@@ -29,19 +38,22 @@ def load_from_pma(
         "snapshot": filename.with_name(f"{filename.stem}_ave.tif"),
     }
 
-    missing_files = [str(path) for path in required_files.values() if not path.exists()]
+    missing_files = [
+        str(path)
+        for key, path in required_files.items()
+        if key not in optional and not path.exists()
+    ]
     if len(missing_files) > 0:
         missing_string = ",\n".join(missing_files)
         raise FileNotFoundError(f"Missing required file(s):\n{missing_string}")
 
-    traces = pma._read_traces(required_files["traces"])
-    peaks = pma._read_pks(required_files["peaks"])
-    log = pma._read_log(required_files["log"])
-    snapshot = pma._read_tif(required_files["snapshot"])
+    return required_files
+
 
-    metadata = MovieMetadata(
-        n_traces=len(traces),
-        n_frames=traces[0].n_frames,
+def _make_movie_metadata(required_files, n_traces, n_frames, log):
+    return MovieMetadata(
+        n_traces=n_traces,
+        n_frames=n_frames,
         src_filename=required_files["traces"].name,
         timestamp=log["filming_date_and_time"],
         frame_length=log["exposure_time_ms"],  # todo: use kinetic cycle?
@@ -50,13 +62,386 @@ def load_from_pma(
         log=log,
     )
 
-    write_movie_to_hdf(
+
+@dataclass(frozen=True)
+class _ParsedMovie:
+    traces: object
+    peaks: object
+    metadata: MovieMetadata
+    snapshot: object
+    n_bytes: int = 0
+    seconds: float = 0.0
+    entry: ManifestEntry | None = None
+
+
+def _read_existing_manifest(savename):
+    if not Path(savename).exists():
+        return {}
+    with h5py.File(savename, "r") as hf:
+        return read_manifest(hf)
+
+
+def _plan_import(manifest, required_files):
+    """Compare a movie's source files against the manifest of the target file.
+
+    Returns
+    -------
+    entry: ManifestEntry or None
+        manifest entry (without content hash) for the movie; None if the source files
+        are unchanged by size and mtime, in which case the movie can be skipped
+    previous: ManifestEntry or None
+        existing manifest entry for the same source path
+    """
+    entry = ManifestEntry.from_files(required_files, compute_hash=False)
+    previous = manifest.get(entry.src_path)
+    if previous is not None and previous.has_same_stat(entry):
+        return None, previous
+    return entry, previous
+
+
+def _write_imported_movie(file_handle, movie, entry, previous):
+    """Write a movie and its manifest entry, replacing a previous import."""
+    if previous is not None and previous.movie_uid is not None:
+        _delete_movie(file_handle, previous.movie_uid)
+    _write_movie(file_handle, movie.traces, movie.peaks, movie.metadata, movie.snapshot)
+    write_manifest_entry(file_handle, entry.with_movie_uid(movie.metadata.uid))
+
+
+# todo: bleed, gamma
+def load_from_pma(
+    filename,
+    experiment_type="fret",
+    *,
+    savename=None,
+    bleedthrough=0.0,
+    gamma=1.0,
+    append=False,
+    compression=None,
+    chunk_policy=None,
+):
+    """Import a single PMA movie into a .smtrc file.
+
+    The source files are recorded in the file's import manifest. When appending, a
+    movie whose source files are unchanged since it was imported is skipped, and a
+    movie whose files have changed is re-imported in place of the old version.
+
+    Returns
+    -------
+    bool:
+        True if the movie was written, False if it was skipped as unchanged
+    """
+    _validate_experiment_type(experiment_type)
+
+    filename = Path(filename)
+    savename = filename.with_suffix(".smtrc") if savename is None else Path(savename)
+
+    required_files = _get_required_pma_files(filename)
+
+    manifest = _read_existing_manifest(savename) if append else {}
+    entry, previous = _plan_import(manifest, required_files)
+    if entry is None:
+        return False
+
+    entry = entry.with_hash(required_files)
+    if previous is not None and previous.content_hash == entry.content_hash:
+        with _open_file(
+            savename,
+            experiment_type,
+            bleedthrough,
+            gamma,
+            append,
+            compression=compression,
+            chunk_policy=chunk_policy,
+        ) as hf:
+            write_manifest_entry(hf, entry.with_movie_uid(previous.movie_uid))
+        return False
+
+    n_frames, n_records = pma._read_traces_header(required_files["traces"])
+    log = pma._read_log(required_files["log"])
+    movie = _ParsedMovie(
+        traces=pma._iter_trace_blocks(required_files["traces"]),
+        peaks=pma._read_pks_array(required_files["peaks"]),
+        metadata=_make_movie_metadata(required_files, n_records // 2, n_frames, log),
+        snapshot=pma._read_tif(required_files["snapshot"]),
+    )
+
+    with _open_file(
         savename,
         experiment_type,
         bleedthrough,
         gamma,
+        append,
+        compression=compression,
+        chunk_policy=chunk_policy,
+    ) as hf:
+        _write_imported_movie(hf, movie, entry, previous)
+    return True
+
+
+def load_from_pma_live(
+    filename,
+    experiment_type="fret",
+    *,
+    savename=None,
+    bleedthrough=0.0,
+    gamma=1.0,
+    append=False,
+    compression=None,
+    chunk_policy=None,
+    poll_interval=1.0,
+    idle_timeout=30.0,
+):
+    """Import a PMA movie while its .traces file is still being acquired.
+
+    The .traces file is polled for newly written frames, which are appended to the
+    movie's datasets. The file is written in SWMR mode and can be opened concurrently
+    with ``Experiment(savename, swmr=True)``. Ingest stops when the number of frames
+    in the .traces header has been reached, or when no new frames have been written
+    for idle_timeout seconds. The snapshot image is optional.
+
+    Returns
+    -------
+    int:
+        number of frames imported
+    """
+    _validate_experiment_type(experiment_type)
+
+    filename = Path(filename)
+    savename = filename.with_suffix(".smtrc") if savename is None else Path(savename)
+
+    required_files = _get_required_pma_files(filename, optional=("snapshot",))
+    expected_frames, n_records = pma._read_traces_header(required_files["traces"])
+    log = pma._read_log(required_files["log"])
+    metadata = _make_movie_metadata(required_files, n_records // 2, 0, log)
+    snapshot = (
+        pma._read_tif(required_files["snapshot"])
+        if required_files["snapshot"].exists()
+        else None
+    )
+
+    with LiveMovieWriter(
+        savename,
+        experiment_type,
+        bleedthrough,
+        gamma,
+        pma._read_pks_array(required_files["peaks"]),
+        metadata,
+        snapshot,
+        append=append,
+        compression=compression,
+        chunk_policy=chunk_policy,
+    ) as writer:
+        last_update = time.monotonic()
+        while expected_frames == 0 or writer.n_frames < expected_frames:
+            start = writer.n_frames
+            stop = start + FRAME_CHUNK_SIZE
+            if expected_frames > 0:
+                stop = min(stop, expected_frames)
+            block = pma._read_trace_frames(
+                required_files["traces"], start, n_records, stop
+            )
+            if block.channel_1.shape[1] > 0:
+                writer.append_frames(block.channel_1, block.channel_2)
+                last_update = time.monotonic()
+            elif time.monotonic() - last_update > idle_timeout:
+                break
+            else:
+                time.sleep(poll_interval)
+        return writer.n_frames
+
+
+@dataclass
+class StageReport:
+    """Accumulated busy time and data volume for one import stage."""
+
+    name: str
+    seconds: float = 0.0
+    n_bytes: int = 0
+    n_movies: int = 0
+
+    def add(self, seconds, n_bytes):
+        self.seconds += seconds
+        self.n_bytes += n_bytes
+        self.n_movies += 1
+
+    @property
+    def throughput(self):
+        """Throughput in MB/s of busy time."""
+        return self.n_bytes / 1024**2 / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class ImportReport:
+    """Per-stage throughput summary returned by load_from_pma_batch."""
+
+    n_workers: int
+    wall_time: float = 0.0
+    stages: dict = field(default_factory=dict)
+    n_skipped: int = 0
+    n_replaced: int = 0
+
+    def __str__(self):
+        s = f"\nImport Summary:\nWorkers:\t{self.n_workers}"
+        s += f"\nWall time:\t{self.wall_time:0.2f} s"
+        s += f"\nSkipped:\t{self.n_skipped} unchanged movies"
+        s += f"\nReplaced:\t{self.n_replaced} changed movies"
+        for stage in self.stages.values():
+            s += (
+                f"\n{stage.name}:\t{stage.n_movies} movies, "
+                f"{stage.n_bytes / 1024**2:0.1f} MB in {stage.seconds:0.2f} s "
+                f"({stage.throughput:0.1f} MB/s)"
+            )
+        if (write := self.stages.get("write")) is not None and self.wall_time > 0:
+            s += f"\nOverall:\t{write.n_bytes / 1024**2 / self.wall_time:0.1f} MB/s"
+        return s + "\n"
+
+
+def _parse_pma_movie(required_files, entry, previous_hash=None):
+    """Read all files of a single PMA movie; runs in a worker process.
+
+    The source files are hashed first; if the hash matches previous_hash the movie is
+    unchanged and only the updated manifest entry is returned.
+    """
+    tic = time.perf_counter()
+    entry = entry.with_hash(required_files)
+    if entry.content_hash == previous_hash:
+        return _ParsedMovie(None, None, None, None, entry=entry)
+
+    n_frames, n_records = pma._read_traces_header(required_files["traces"])
+    (traces,) = pma._iter_trace_blocks(
+        required_files["traces"], block_size=max(n_records // 2, 1)
+    )
+    peaks = pma._read_pks_array(required_files["peaks"])
+    log = pma._read_log(required_files["log"])
+    snapshot = pma._read_tif(required_files["snapshot"])
+    metadata = _make_movie_metadata(required_files, n_records // 2, n_frames, log)
+
+    return _ParsedMovie(
         traces,
         peaks,
         metadata,
         snapshot,
+        n_bytes=required_files["traces"].stat().st_size,
+        seconds=time.perf_counter() - tic,
+        entry=entry,
     )
+
+
+def load_from_pma_batch(
+    paths,
+    savename,
+    experiment_type="fret",
+    *,
+    n_workers=None,
+    bleedthrough=0.0,
+    gamma=1.0,
+    append=False,
+    compression=None,
+    chunk_policy=None,
+):
+    """Import many PMA movies into a single .smtrc file.
+
+    Movies are parsed in a pool of worker processes and written by the calling
+    process, so HDF5 writes remain single-writer. At most two movies per worker are
+    in flight at any time to bound memory use.
+
+    When appending, movies whose source files are unchanged according to the file's
+    import manifest are skipped, and changed movies are re-imported.
+
+    Parameters
+    ----------
+    paths: Path or Iterable[Path]
+        directory containing .traces files, or the movie filenames to import
+    savename: Path
+        file path to write HDF5
+    experiment_type: {"fret", "twocolor"}
+        experiment type, controls trace class
+    n_workers: int
+        number of parsing processes; defaults to the number of CPUs
+    bleedthrough: float
+        fractional bleedthrough of channel 1 emission to channel 2
+    gamma: float
+        gamma correction
+    append: bool
+        if True and savename exists, add the movies to the existing file
+    compression: {"fast", "balanced", "archive"} or None
+        dataset compression profile; see smtirf.detail.writer.COMPRESSION_PROFILES
+    chunk_policy: {"row", "tile", "block"} or None
+        chunk layout of per-frame datasets; see smtirf.detail.writer.CHUNK_POLICIES
+
+    Returns
+    -------
+    ImportReport:
+        per-stage timing and throughput
+    """
+    _validate_experiment_type(experiment_type)
+
+    if isinstance(paths, (str, os.PathLike)) and Path(paths).is_dir():
+        paths = sorted(Path(paths).glob("*.traces"))
+    movies = [_get_required_pma_files(path) for path in paths]
+    if len(movies) == 0:
+        raise ValueError("no movies to import.")
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    report = ImportReport(n_workers)
+    report.stages = {name: StageReport(name) for name in ("parse", "write")}
+
+    tic = time.perf_counter()
+    manifest = _read_existing_manifest(savename) if append else {}
+    plans = []
+    for required_files in movies:
+        entry, previous = _plan_import(manifest, required_files)
+        if entry is None:
+            report.n_skipped += 1
+        else:
+            plans.append((required_files, entry, previous))
+
+    if len(plans) == 0:
+        report.wall_time = time.perf_counter() - tic
+        return report
+
+    with (
+        ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=process_context()
+        ) as executor,
+        _open_file(
+            savename,
+            experiment_type,
+            bleedthrough,
+            gamma,
+            append,
+            compression=compression,
+            chunk_policy=chunk_policy,
+        ) as hf,
+    ):
+
+        def submit(plan):
+            required_files, entry, previous = plan
+            previous_hash = None if previous is None else previous.content_hash
+            future = executor.submit(
+                _parse_pma_movie, required_files, entry, previous_hash
+            )
+            return future, previous
+
+        remaining = iter(plans)
+        pending = deque(submit(plan) for plan in islice(remaining, 2 * n_workers))
+        while pending:
+            future, previous = pending.popleft()
+            movie = future.result()
+            if (plan := next(remaining, None)) is not None:
+                pending.append(submit(plan))
+
+            if movie.traces is None:  # content unchanged, refresh size and mtime
+                write_manifest_entry(hf, movie.entry.with_movie_uid(previous.movie_uid))
+                report.n_skipped += 1
+                continue
+            report.stages["parse"].add(movie.seconds, movie.n_bytes)
+
+            write_tic = time.perf_counter()
+            _write_imported_movie(hf, movie, movie.entry, previous)
+            report.stages["write"].add(time.perf_counter() - write_tic, movie.n_bytes)
+            if previous is not None:
+                report.n_replaced += 1
+
+    report.wall_time = time.perf_counter() - tic
+    return report
@@ -0,0 +1,110 @@
+import os
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ..detail.writer import _validate_file_attrs, set_date_modified
+
+VIRTUAL_DATASETS = ("traces/channel_1", "traces/channel_2")
+
+
+def merge(sources, savename, *, virtual=False):
+    """Combine .smtrc files into a master file that links to their movies.
+
+    Each movie group of the master file is an HDF5 external link to the movie in
+    its source file, so no trace data is copied and Experiment opens the master
+    file like any other. Edits saved through the master file are written to the
+    source files. Links are stored relative to the master file where possible, so
+    the master and source files can be moved together.
+
+    Parameters
+    ----------
+    sources: Iterable[Path]
+        .smtrc files to combine; must have the same experiment type, schema version
+        and corrections
+    savename: Path
+        master file to write; overwritten if it exists
+    virtual: bool
+        also write virtual datasets "virtual/channel_1" and "virtual/channel_2",
+        concatenating the raw traces of all movies into one [N x T] matrix, T being
+        the length of the longest movie; frames past the end of shorter movies
+        read as 0. "virtual/trace_ids" holds the Trace UID of each row.
+    """
+    savename = Path(savename)
+    sources = [Path(source) for source in sources]
+    if not sources:
+        raise ValueError("no files to merge.")
+    if savename.resolve() in {source.resolve() for source in sources}:
+        raise ValueError("cannot merge a file into itself.")
+
+    movies = {}  # movie group name -> (source, n_traces, n_frames)
+    with h5py.File(sources[0], "r") as hf:
+        attrs = dict(hf.attrs)
+    for source in sources:
+        with h5py.File(source, "r") as hf:
+            _validate_file_attrs(
+                hf,
+                attrs["experiment_type"],
+                attrs["bleedthrough"],
+                attrs["gamma"],
+                action="merge",
+            )
+            for name, group in hf["movies"].items():
+                if name in movies:
+                    raise ValueError(
+                        f"{name} is in both {movies[name][0]} and {source}."
+                    )
+                movies[name] = (
+                    source,
+                    int(group.attrs["n_traces"]),
+                    int(group.attrs["n_frames"]),
+                )
+
+    with h5py.File(savename, "w") as hf:
+        hf.attrs.update(attrs)
+        set_date_modified(hf)
+        group = hf.create_group("movies")
+        for name, (source, _, _) in movies.items():
+            group[name] = h5py.ExternalLink(
+                _link_path(source, savename.parent), f"/movies/{name}"
+            )
+        if virtual:
+            _write_virtual_datasets(hf, movies, savename.parent)
+
+
+def _write_virtual_datasets(file_handle, movies, directory):
+    n_traces = sum(n for _, n, _ in movies.values())
+    n_frames = max(n for _, _, n in movies.values())
+    group = file_handle.create_group("virtual")
+    trace_ids = []
+    for name, (source, _, _) in movies.items():
+        with h5py.File(source, "r") as hf:
+            trace_ids.append(hf[f"movies/{name}/trace_ids"][()])
+    group.create_dataset(
+        "trace_ids",
+        data=np.concatenate(trace_ids),
+        dtype=h5py.string_dtype("ascii", length=32),
+    )
+
+    for path in VIRTUAL_DATASETS:
+        layout = None
+        start = 0
+        for name, (source, n, t) in movies.items():
+            if layout is None:
+                with h5py.File(source, "r") as hf:
+                    dtype = hf[f"movies/{name}/{path}"].dtype
+                layout = h5py.VirtualLayout(shape=(n_traces, n_frames), dtype=dtype)
+            layout[start : start + n, :t] = h5py.VirtualSource(
+                _link_path(source, directory), f"/movies/{name}/{path}", shape=(n, t)
+            )
+            start += n
+        group.create_virtual_dataset(path.rsplit("/", 1)[-1], layout, fillvalue=0)
+
+
+def _link_path(source, directory):
+    """Return the path of source relative to directory, or absolute if impossible."""
+    try:
+        return Path(os.path.relpath(source.resolve(), directory.resolve())).as_posix()
+    except ValueError:  # eg on different drives
+        return source.resolve().as_posix()
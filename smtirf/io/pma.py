@@ -1,3 +1,4 @@
+import mmap
 import re
 import warnings
 from collections import namedtuple
@@ -7,7 +8,11 @@ import numpy as np
 from skimage import color
 from skimage.io import imread
 
-from ..detail.definitions import Coordinates, RawTrace
+from ..detail.definitions import Coordinates, RawTrace, RawTraceBlock
+
+TRACES_HEADER_BYTES = 6  # int32 n_frames + int16 n_records
+TRACE_BLOCK_SIZE = 256
+FRAME_WINDOW_SIZE = 1024
 
 
 def _read_traces(filename):
@@ -29,6 +34,119 @@ def _read_traces(filename):
     return [RawTrace(d, a) for d, a in zip(ch1_traces, ch2_traces, strict=False)]
 
 
+def _read_traces_header(filename):
+    """Return the number of frames and number of records from a .traces header."""
+    with open(filename.with_suffix(".traces"), "rb") as F:
+        n_frames = int(np.fromfile(F, dtype=np.int32, count=1)[0])
+        n_records = int(np.fromfile(F, dtype=np.int16, count=1)[0])
+    if (n_records % 2) != 0:
+        raise ValueError(f"odd number of records in dataset [{n_records}]")
+    return n_frames, n_records
+
+
+def _iter_trace_blocks(filename, block_size=TRACE_BLOCK_SIZE):
+    """Iterate over a .traces file in blocks of traces.
+
+    The file is memory-mapped, so only the current block is held in memory. Records
+    are stored interleaved (ch1, ch2, ch1, ...) with frames as rows; each block is
+    de-interleaved into contiguous [N x T] arrays, traces as rows. Mapped pages are
+    released as the block is copied so that resident memory does not grow with the
+    file.
+
+    Parameters
+    ----------
+    filename: Path
+        path to .traces file
+    block_size: int
+        maximum number of traces per block
+
+    Yields
+    ------
+    RawTraceBlock
+    """
+    n_frames, n_records = _read_traces_header(filename)
+    n_traces = n_records // 2
+    frame_bytes = n_records * np.dtype(np.int16).itemsize
+    with (
+        open(filename.with_suffix(".traces"), "rb") as F,
+        mmap.mmap(F.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+    ):
+        data = records = None
+        try:
+            data = np.frombuffer(
+                buffer,
+                dtype=np.int16,
+                count=n_frames * n_records,
+                offset=TRACES_HEADER_BYTES,
+            ).reshape((n_frames, n_records), order="C")
+
+            for start in range(0, n_traces, block_size):
+                stop = min(start + block_size, n_traces)
+                channel_1 = np.empty((stop - start, n_frames), dtype=np.int16)
+                channel_2 = np.empty((stop - start, n_frames), dtype=np.int16)
+                # every block spans all frames; copy in windows of frames and drop
+                # the mapped pages of each window to keep the resident set bounded
+                for frame in range(0, n_frames, FRAME_WINDOW_SIZE):
+                    window = slice(frame, frame + FRAME_WINDOW_SIZE)
+                    records = data[window, 2 * start : 2 * stop]
+                    channel_1[:, window] = records[:, 0::2].T
+                    channel_2[:, window] = records[:, 1::2].T
+                    _release_pages(
+                        buffer,
+                        TRACES_HEADER_BYTES + frame * frame_bytes,
+                        TRACES_HEADER_BYTES
+                        + min(frame + FRAME_WINDOW_SIZE, n_frames) * frame_bytes,
+                    )
+                yield RawTraceBlock(start, channel_1, channel_2)
+        finally:
+            # release exported buffers before the map is closed, also if the
+            # consumer stops early
+            data = records = None
+
+
+def _release_pages(buffer, begin, end):
+    """Drop the whole pages of a mapped byte range from the resident set.
+
+    The page holding end is kept; it is shared with the following window.
+    """
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    begin -= begin % mmap.PAGESIZE
+    end = len(buffer) if end >= len(buffer) else end - end % mmap.PAGESIZE
+    if end > begin:
+        buffer.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+
+
+def _read_trace_frames(filename, start, n_records, stop=None):
+    """Read a range of frames from a .traces file, which may still be growing.
+
+    Parameters
+    ----------
+    filename: Path
+        path to .traces file
+    start: int
+        index of the first frame to read
+    n_records: int
+        number of records (2 x number of traces) per frame
+    stop: int or None
+        index after the last frame to read; None reads all complete frames
+
+    Returns
+    -------
+    RawTraceBlock
+        block of all traces over the frame range
+    """
+    frame_bytes = n_records * np.dtype(np.int16).itemsize
+    with open(filename.with_suffix(".traces"), "rb") as F:
+        F.seek(TRACES_HEADER_BYTES + start * frame_bytes)
+        count = -1 if stop is None else (stop - start) * n_records
+        data = np.fromfile(F, dtype=np.int16, count=count)
+
+    n_frames = data.size // n_records  # drop any partially written frame
+    data = data[: n_frames * n_records].reshape((n_frames, n_records), order="C")
+    return RawTraceBlock(0, data[:, 0::2].T, data[:, 1::2].T)
+
+
 def _read_pks(filename):
     """
     Read coordinates from .pks file and return in structured format.
@@ -39,9 +157,18 @@ def _read_pks(filename):
         3   ch1_2_x   ch1_2_y   ch1_2_background (?)
         4   ch2_2_x   ch2_2_y   ch2_2_background (?)
     """
+    return [Coordinates.from_array(line) for line in _read_pks_array(filename)]
+
+
+def _read_pks_array(filename):
+    """Read coordinates from .pks file as an [N x 4] array.
+
+    Each row holds [ch1_x, ch1_y, ch2_x, ch2_y] for one trace; see _read_pks for the
+    file format.
+    """
     with open(filename, "r") as file:
-        data = np.loadtxt(file, dtype=float)[:, 1:-1]  # remove first and last columns
-    return [Coordinates.from_array(line) for line in data.reshape((-1, 4))]
+        data = np.array(file.read().split(), dtype=float).reshape((-1, 4))
+    return data[:, 1:-1].reshape((-1, 4))  # remove first and last columns
 
 
 def _read_log(filename):
@@ -0,0 +1,93 @@
+import math
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ..detail.writer import PER_FRAME_DATASETS, _chunk_shape, _validate_chunk_policy
+
+BAND_BYTES = 2**26
+
+
+def rechunk(src, dst, policy):
+    """Copy a .smtrc file into a new file using a different chunk policy.
+
+    Per-frame datasets (raw traces and statepaths) are streamed in bands of whole
+    source and destination chunks, so each chunk is read and written once and peak
+    memory is bounded by BAND_BYTES. Bands containing only the dataset fill value
+    are not written and remain unallocated. All other datasets, groups and
+    attributes are copied unchanged, keeping their compression filters.
+
+    Parameters
+    ----------
+    src: Path
+        existing .smtrc file
+    dst: Path
+        file path to write; overwritten if it exists
+    policy: {"row", "tile", "block"}
+        chunk policy of the new file; see smtirf.detail.writer.CHUNK_POLICIES
+    """
+    _validate_chunk_policy(policy)
+    if Path(src).resolve() == Path(dst).resolve():
+        raise ValueError("cannot rechunk a file in place.")
+
+    with h5py.File(src, "r") as hs, h5py.File(dst, "w") as hd:
+        hd.attrs.update(hs.attrs)
+        hd.attrs["chunk_policy"] = policy
+        for name, node in hs.items():
+            if name == "movies":
+                movies = hd.create_group("movies")
+                movies.attrs.update(node.attrs)
+                for movie_name, group in node.items():
+                    _copy_movie(group, movies, movie_name, policy)
+            else:
+                hs.copy(node, hd, name)
+
+
+def _copy_movie(group, parent, name, policy, prefix=""):
+    """Copy a movie group, rechunking its per-frame datasets."""
+    target = parent.create_group(name)
+    target.attrs.update(group.attrs)
+    for key, node in group.items():
+        path = f"{prefix}{key}"
+        if isinstance(node, h5py.Group):
+            _copy_movie(node, target, key, policy, prefix=f"{path}/")
+        elif path in PER_FRAME_DATASETS:
+            _rechunk_dataset(node, target, key, policy)
+        else:
+            group.copy(node, target, key)
+
+
+def _rechunk_dataset(dataset, group, name, policy):
+    """Stream a [N x T] dataset into group with the chunk shape of policy."""
+    n_traces, n_frames = dataset.shape
+    chunks = _chunk_shape(policy, n_traces, n_frames, dataset.dtype.itemsize)
+    target = group.create_dataset(
+        name,
+        shape=dataset.shape,
+        maxshape=dataset.maxshape,
+        dtype=dataset.dtype,
+        chunks=chunks,
+        fillvalue=dataset.fillvalue,
+        compression=dataset.compression,
+        compression_opts=dataset.compression_opts,
+        shuffle=dataset.shuffle,
+        fletcher32=dataset.fletcher32,
+    )
+    target.attrs.update(dataset.attrs)
+
+    for start, stop in _iter_bands(dataset, chunks[0]):
+        data = dataset[start:stop]
+        if not np.all(data == dataset.fillvalue):
+            target[start:stop] = data
+
+
+def _iter_bands(dataset, target_rows):
+    """Yield row ranges aligned to both the source chunks and target_rows."""
+    n_traces, n_frames = dataset.shape
+    source_rows = dataset.chunks[0] if dataset.chunks is not None else 1
+    rows = math.lcm(source_rows, target_rows)
+    row_bytes = max(n_frames * dataset.dtype.itemsize, 1)
+    rows *= max(BAND_BYTES // (rows * row_bytes), 1)
+    for start in range(0, n_traces, rows):
+        yield start, min(start + rows, n_traces)
@@ -5,7 +5,13 @@ import scipy.stats
 
 import smtirf
 
-from .detail.data_dispatch import FretDispatcher, TraceLoader, TwoColorDispatcher
+from .detail.data_dispatch import (
+    SIGNAL_CACHE,
+    FretDispatcher,
+    SignalDispatcher,
+    TwoColorDispatcher,
+    signal_key,
+)
 
 
 def with_statepath_update(func):
@@ -24,52 +30,146 @@ def with_statepath_update(func):
 
 
 class Trace:
-    def __init__(self, file_handle, uid):
-        self._loader = TraceLoader(file_handle, uid)
-        self._metadata = self._loader.get_metadata()
-
-        # todo: should this be mutable?
-        self._gamma = self._loader.gamma
-        self._bleed = self._loader.bleedthrough
-
-        match (t := self._loader.experiment_type):
-            case "fret":
-                dispatcher_cls = FretDispatcher
-            case "twocolor":
-                dispatcher_cls = TwoColorDispatcher
-            case _:
-                raise NotImplementedError(
-                    f"dispatcher is not implemented for experiment type {t}"
+    """Single-molecule trace, a lightweight view onto its movie's datasets.
+
+    Signals are read from file on access and statepaths on first access, so creating
+    a trace does no I/O.
+
+    Parameters
+    ----------
+    loader: MovieLoader
+        read access to the datasets of the trace's movie, shared between traces
+    metadata: TraceMetadataView
+        metadata of the trace
+    """
+
+    __slots__ = (
+        "_loader",
+        "_metadata",
+        "_photophysics_statepath_cache",
+        "_statepath_cache",
+        "_model",
+        "_dwells",
+    )
+    _dispatcher_cls = SignalDispatcher
+
+    def __init__(self, loader, metadata):
+        self._loader = loader
+        self._metadata = metadata
+
+        self._photophysics_statepath_cache = None
+        self._statepath_cache = None
+        self._model = None  # todo: placeholder until HMM refactor
+        self._dwells = None
+
+    def _reload(self):
+        """Discard cached statepaths, eg after new frames are added.
+
+        Metadata views are reloaded with their TraceMetadataStore.
+        """
+        self._photophysics_statepath_cache = None
+        self._statepath_cache = None
+
+    def _get_signal(self, stage, kind):
+        """Return a signal of the trace at a stage of the correction pipeline.
+
+        Signals are memoized in SIGNAL_CACHE. Derived stages are keyed by the
+        metadata revision, so changing offsets, limits or corrections invalidates
+        them; cached arrays are read-only.
+
+        Parameters
+        ----------
+        stage: {"raw", "baselined", "corrected", "final"}
+            stage of the correction pipeline
+        kind: {"time", "channel_1", "channel_2", "total", "fret"}
+            signal
+        """
+        if kind == "time" and stage != "final":
+            stage = "raw"
+        revision = 0 if stage == "raw" else self._metadata.revision
+        key = signal_key(self._loader, self._metadata.index, stage, kind, revision)
+        if (signal := SIGNAL_CACHE.get(key)) is None:
+            signal = SIGNAL_CACHE.put(key, self._compute_signal(stage, kind))
+        return signal
+
+    def _compute_signal(self, stage, kind):
+        match (stage, kind):
+            case (_, "total"):
+                return self._get_signal(stage, "channel_1") + self._get_signal(
+                    stage, "channel_2"
                 )
+            case (_, "fret"):
+                return self._get_signal(stage, "channel_2") / self._get_signal(
+                    stage, "total"
+                )
+            case ("final", _):
+                return self._get_signal("corrected", kind)[
+                    self._metadata.selected_slice
+                ]
+            case ("raw", "time"):
+                return np.arange(self._loader.n_frames) * self.frame_length
+            case ("raw", _):
+                return self._loader.get_data(kind, self._metadata.index)
+            case ("baselined", "channel_1"):
+                return self._get_signal("raw", kind) - self._metadata.ch1_offset
+            case ("baselined", "channel_2"):
+                return self._get_signal("raw", kind) - self._metadata.ch2_offset
+            case ("corrected", "channel_1"):
+                return self._get_signal("baselined", "channel_1") * self.gamma
+            case ("corrected", "channel_2"):
+                return self._get_signal("baselined", "channel_2") - (
+                    self._get_signal("baselined", "channel_1") * self.bleed
+                )
+            case _:
+                raise ValueError(f"unknown signal '{kind}'")
 
-        self._raw_dispatcher = dispatcher_cls(
-            lambda: np.arange(self._metadata.n_frames) * self.frame_length,
-            lambda: self._loader.get_data("channel_1"),
-            lambda: self._loader.get_data("channel_2"),
-        )
+    @property
+    def _photophysics_statepath(self):
+        if self._photophysics_statepath_cache is None:
+            self._photophysics_statepath_cache = self._loader.get_statepath(
+                "photophysics", self._metadata.index
+            )
+        return self._photophysics_statepath_cache
 
-        self._baselined_dispatcher = dispatcher_cls(
-            lambda: self.raw.time,
-            lambda: self.raw._channel_1() - self._metadata.ch1_offset,
-            lambda: self.raw._channel_2() - self._metadata.ch2_offset,
-        )
+    @property
+    def _statepath(self):
+        if self._statepath_cache is None:
+            self._statepath_cache = self._loader.get_statepath(
+                "conformation", self._metadata.index
+            )
+        return self._statepath_cache
+
+    def set_statepath(self, statepath, kind="conformation"):
+        """Set the statepath of the full trace; written to file by Experiment.save().
+
+        Parameters
+        ----------
+        statepath: np.ndarray
+            [T] state per frame
+        kind: {"conformation", "photophysics"}
+            statepath to set
+        """
+        statepath = self._loader.set_statepath(kind, self._metadata.index, statepath)
+        if kind == "conformation":
+            self._statepath_cache = statepath
+        else:
+            self._photophysics_statepath_cache = statepath
 
-        self._corrected_dispatcher = dispatcher_cls(
-            lambda: self.raw.time,
-            lambda: self._baselined_dispatcher._channel_1() * self._gamma,
-            lambda: self._baselined_dispatcher._channel_2()
-            - (self._baselined_dispatcher._channel_1() * self._bleed),
-        )
+    @property
+    def _raw_dispatcher(self):
+        return self._dispatcher_cls(self, "raw")
 
-        self._final_dispatcher = dispatcher_cls(
-            lambda: self.raw.time[self._metadata.selected_slice],
-            lambda: self.corrected._channel_1()[self._metadata.selected_slice],
-            lambda: self.corrected._channel_2()[self._metadata.selected_slice],
-        )
+    @property
+    def _baselined_dispatcher(self):
+        return self._dispatcher_cls(self, "baselined")
 
-        self._photophysics_statepath = self._loader.get_statepath("photophysics")
-        self._statepath = self._loader.get_statepath("conformation")
-        self._model = None  # todo: placeholder until HMM refactor
+    @property
+    def _corrected_dispatcher(self):
+        return self._dispatcher_cls(self, "corrected")
+
+    @property
+    def _final_dispatcher(self):
+        return self._dispatcher_cls(self, "final")
 
     def __str__(self):
         return (
@@ -86,11 +186,21 @@ class Trace:
 
     @property
     def bleed(self):
-        return self._bleed
+        return self._metadata.bleedthrough
+
+    @bleed.setter
+    @with_statepath_update
+    def bleed(self, value):
+        self._metadata.bleedthrough = value
 
     @property
     def gamma(self):
-        return self._gamma
+        return self._metadata.gamma
+
+    @gamma.setter
+    @with_statepath_update
+    def gamma(self, value):
+        self._metadata.gamma = value
 
     @property
     def raw(self):
@@ -112,6 +222,32 @@ class Trace:
     def corrcoef(self):
         return scipy.stats.pearsonr(self.donor, self.acceptor)[0]
 
+    @property
+    def model(self):
+        return self._model
+
+    @model.setter
+    def model(self, theta):
+        self._model = theta
+
+    @property
+    def dwells(self):
+        """DwellTable of the statepath; set by label_statepath()."""
+        return self._dwells
+
+    @dwells.setter
+    def dwells(self, table):
+        self._dwells = table
+
+    @property
+    def X(self):
+        """Observations a model of the trace is trained on."""
+        return self.total
+
+    @property
+    def SP(self):
+        return self.state_path
+
     @property
     def state_path(self):
         if self._model is None:
@@ -145,7 +281,7 @@ class Trace:
 
     @property
     def offsets(self):
-        return [self._metadata.donor_offset, self._metadata.acceptor_offset]
+        return [self._metadata.ch1_offset, self._metadata.ch2_offset]
 
     @with_statepath_update
     def set_offsets(self, values):
@@ -228,9 +364,9 @@ class Trace:
 
     def label_statepath(self):
         if self.model is not None:
-            self.set_statepath(
-                self.model.label(self.X, deBlur=self.deBlur, deSpike=self.deSpike)
-            )
+            statepath = np.full(len(self), -1)
+            statepath[self._metadata.selected_slice] = self.model.label(self.X)
+            self.set_statepath(statepath)
             self.dwells = smtirf.results.DwellTable(self)
 
     def get_export_data(self):
@@ -242,6 +378,9 @@ class Trace:
 
 
 class FretTrace(Trace):
+    __slots__ = ()
+    _dispatcher_cls = FretDispatcher
+
     @property
     def donor(self):
         return self._final_dispatcher.donor
@@ -254,8 +393,15 @@ class FretTrace(Trace):
     def fret(self):
         return self._final_dispatcher.fret
 
+    @property
+    def X(self):
+        return self.fret
+
 
 class TwoColorTrace(Trace):
+    __slots__ = ()
+    _dispatcher_cls = TwoColorDispatcher
+
     @property
     def channel_1(self):
         return self._final_dispatcher.channel_1
@@ -1,8 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 
 import numpy as np
 import pytest
+from skimage.io import imsave
 
 from smtirf.detail.definitions import Coordinates, Point, RawTrace
 from smtirf.detail.metadata import MovieMetadata
@@ -58,3 +59,63 @@ def smtrc_file(tmp_path_factory, mock_data):
         mock_data.snapshot,
     )
     return filepath
+
+
+@pytest.fixture
+def write_pma_movie():
+    """Factory writing a synthetic set of PMA files; returns the .traces path."""
+
+    def wrapped(base, stem="movie", n_traces=6, n_frames=20, timestamp=None, seed=0):
+        timestamp = (
+            datetime(year=2025, month=8, day=24, hour=16, minute=36, second=42)
+            if timestamp is None
+            else timestamp
+        )
+        rng = np.random.default_rng(seed)
+        filename = base / f"{stem}.traces"
+
+        records = rng.integers(0, 1000, size=(n_frames, n_traces * 2), dtype=np.int16)
+        with open(filename, "wb") as F:
+            np.array([n_frames], dtype=np.int32).tofile(F)
+            np.array([n_traces * 2], dtype=np.int16).tofile(F)
+            records.tofile(F)
+
+        coords = rng.uniform(0, 256, size=(n_traces * 2, 2))
+        with open(filename.with_suffix(".pks"), "w") as F:
+            for j, (x, y) in enumerate(coords):
+                F.write(f"{j + 1:8d} {x:9.3f} {y:9.3f}  5.01e+000\n")
+
+        with open(filename.with_suffix(".log"), "w") as F:
+            F.write(
+                "Filming Date and Time\n"
+                f"{timestamp.strftime('%a %b %d %H:%M:%S %Y')}\n\n"
+                "Background\n408\n"
+                "Data Scaler\n800\n"
+                "Gain\n300\n"
+                "Exposure Time [ms]\n100.000\n"
+            )
+
+        imsave(
+            base / f"{stem}_ave.tif",
+            rng.integers(0, 255, size=(16, 16), dtype=np.uint8),
+            check_contrast=False,
+        )
+        return filename
+
+    return wrapped
+
+
+@pytest.fixture
+def two_state_file(tmp_path, mock_data):
+    savename = tmp_path / "two_states.smtrc"
+    rng = np.random.default_rng(0)
+    n_traces, n_frames = 8, 200
+    traces = []
+    for k in range(n_traces):
+        states = (np.arange(n_frames) // (20 + k) + k) % 2
+        fret = np.array([0.2, 0.7])[states] + rng.normal(0, 0.05, n_frames)
+        traces.append(RawTrace(1000 * (1 - fret), 1000 * fret))
+    peaks = [Coordinates(Point(k, k), Point(k + 10, k)) for k in range(n_traces)]
+    metadata = replace(mock_data.movie_metadata, n_traces=n_traces, n_frames=n_frames)
+    write_movie_to_hdf(savename, "fret", 0.0, 1, traces, peaks, metadata)
+    return savename
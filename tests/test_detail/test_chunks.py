@@ -0,0 +1,60 @@
+import h5py
+import numpy as np
+import pytest
+
+from smtirf.detail.chunks import can_decode_rows, read_row_chunks
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        dict(compression="gzip", compression_opts=5, shuffle=True, fletcher32=True),
+        dict(compression="gzip", shuffle=True),
+        dict(fletcher32=True),
+        dict(),
+    ],
+)
+@pytest.mark.parametrize("dtype", [np.int8, np.int16, np.float32])
+@pytest.mark.parametrize("width", [1000, 333])
+def test_read_row_chunks(tmp_path, options, dtype, width):
+    data = np.random.default_rng(0).integers(-100, 100, (20, 1000)).astype(dtype)
+    with h5py.File(tmp_path / "rows.h5", "w") as hf:
+        dataset = hf.create_dataset("data", data=data, chunks=(1, width), **options)
+        assert can_decode_rows(dataset)
+        index = [3, 0, 19, 3]
+        rows = read_row_chunks(dataset, index)
+        assert rows.dtype == dtype
+        np.testing.assert_array_equal(rows, data[index])
+
+
+def test_read_row_chunks_unallocated(tmp_path):
+    with h5py.File(tmp_path / "rows.h5", "w") as hf:
+        dataset = hf.create_dataset(
+            "data", shape=(3, 10), chunks=(1, 10), dtype="i2", fillvalue=7
+        )
+        dataset[1] = 1
+        np.testing.assert_array_equal(
+            read_row_chunks(dataset, [0, 1]), [[7] * 10, [1] * 10]
+        )
+
+
+def test_read_row_chunks_checksum(tmp_path):
+    with h5py.File(tmp_path / "rows.h5", "w") as hf:
+        dataset = hf.create_dataset(
+            "data", data=np.ones((3, 10), dtype="i2"), chunks=(1, 10), fletcher32=True
+        )
+        filter_mask, chunk = dataset.id.read_direct_chunk((1, 0))
+        dataset.id.write_direct_chunk((1, 0), b"\2" + chunk[1:], filter_mask)
+        np.testing.assert_array_equal(read_row_chunks(dataset, [0]), [[1] * 10])
+        with pytest.raises(OSError, match="fletcher32"):
+            read_row_chunks(dataset, [0, 1])
+
+
+def test_can_decode_rows(tmp_path):
+    with h5py.File(tmp_path / "rows.h5", "w") as hf:
+        data = np.zeros((4, 10), dtype="i2")
+        assert not can_decode_rows(hf.create_dataset("contiguous", data=data))
+        assert not can_decode_rows(hf.create_dataset("tile", data=data, chunks=(2, 5)))
+        assert not can_decode_rows(
+            hf.create_dataset("lzf", data=data, chunks=(1, 10), compression="lzf")
+        )
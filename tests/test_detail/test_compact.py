@@ -0,0 +1,44 @@
+import h5py
+import numpy as np
+import pytest
+
+from smtirf.detail.compact import copy_movie_rows
+from smtirf.io.import_dispatch import load_from_pma
+
+
+@pytest.mark.parametrize("chunk_policy", ["row", "block"])
+def test_copy_movie_rows(tmp_path, write_pma_movie, chunk_policy):
+    path = write_pma_movie(tmp_path, n_traces=10, n_frames=40)
+    src = tmp_path / "source.smtrc"
+    load_from_pma(path, savename=src, chunk_policy=chunk_policy)
+    index = np.array([1, 2, 7])
+
+    with h5py.File(src, "r+") as hs, h5py.File(tmp_path / "copy.h5", "w") as hd:
+        group = next(iter(hs["movies"].values()))
+        group["statepaths/conformation"][2] = 1
+        copy = copy_movie_rows(group, hd, "movie", index)
+
+        assert copy.attrs["n_traces"] == 3
+        assert {k: v for k, v in copy.attrs.items() if k != "n_traces"} == {
+            k: v for k, v in group.attrs.items() if k != "n_traces"
+        }
+        np.testing.assert_equal(copy["snapshot"][()], group["snapshot"][()])
+        for name in (
+            "trace_ids",
+            "traces/metadata",
+            "traces/channel_1",
+            "traces/channel_2",
+            "statepaths/photophysics",
+            "statepaths/conformation",
+        ):
+            source, target = group[name], copy[name]
+            np.testing.assert_equal(target[()], source[()][index])
+            assert target.compression == source.compression
+            assert target.fillvalue == source.fillvalue
+
+        assert copy["traces/channel_1"].chunks[0] == min(
+            group["traces/channel_1"].chunks[0], 3
+        )
+        # only the assigned statepath is allocated
+        assert copy["statepaths/photophysics"].id.get_num_chunks() == 0
+        assert copy["statepaths/conformation"].id.get_num_chunks() == 1
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from smtirf.detail.data_dispatch import SignalCache
+
+
+def test_signal_cache():
+    cache = SignalCache(max_bytes=32)
+    a, b, c = (np.full(2, k, dtype=np.float64) for k in range(3))
+
+    assert cache.put("a", a) is a
+    assert not a.flags.writeable
+    with pytest.raises(ValueError, match="read-only"):
+        a[0] = 1
+    cache.put("b", b)
+    assert cache.n_bytes == 32
+    assert cache.get("a") is a  # now most recently used
+
+    cache.put("c", c)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert cache.n_bytes == 32
+
+    cache.put("a", np.zeros(2))
+    assert cache.n_bytes == 32
+
+    # arrays larger than the budget are returned but not cached
+    big = np.zeros(8)
+    assert cache.put("big", big) is big
+    assert "big" not in cache
+
+    cache.resize(16)
+    assert len(cache) == 1
+    assert "a" in cache
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.n_bytes == 0
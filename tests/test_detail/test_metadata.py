@@ -0,0 +1,106 @@
+from dataclasses import replace
+from datetime import timedelta
+
+import h5py
+import numpy as np
+import pytest
+
+from smtirf.detail.metadata import (
+    TRACE_DTYPE,
+    TraceMetadata,
+    TraceMetadataStore,
+    make_trace_records,
+    make_trace_uids,
+)
+from smtirf.detail.writer import write_movie_to_hdf
+
+
+def test_make_trace_uids():
+    uids = make_trace_uids("20250824T163642", 3)
+    np.testing.assert_array_equal(
+        uids, ["20250824T163642_0000", "20250824T163642_0001", "20250824T163642_0002"]
+    )
+
+
+def test_make_trace_records(mock_data):
+    movie_metadata = mock_data.movie_metadata
+    factory = TraceMetadata.from_movie_metadata(movie_metadata)
+    expected = np.array(
+        [
+            factory.make_record(index=k, peak=peak)
+            for k, peak in enumerate(mock_data.peaks)
+        ],
+        dtype=TRACE_DTYPE,
+    )
+
+    peaks = np.array([peak.as_list() for peak in mock_data.peaks])
+    for records in (
+        make_trace_records(movie_metadata, peaks),
+        make_trace_records(movie_metadata, mock_data.peaks),
+    ):
+        assert records.dtype == TRACE_DTYPE
+        np.testing.assert_array_equal(records, expected)
+
+
+@pytest.fixture
+def two_movie_file(tmp_path, mock_data):
+    savename = tmp_path / "two_movies.smtrc"
+    first = mock_data.movie_metadata
+    second = replace(first, timestamp=first.timestamp + timedelta(hours=1))
+    for metadata in (first, second):
+        write_movie_to_hdf(
+            savename,
+            "fret",
+            0.05,
+            1,
+            mock_data.traces,
+            mock_data.peaks,
+            metadata,
+            append=True,
+        )
+    return savename, first, second
+
+
+def test_trace_metadata_store(two_movie_file, mock_data):
+    savename, first, second = two_movie_file
+    n_traces = first.n_traces
+    with h5py.File(savename, "r") as hf:
+        store = TraceMetadataStore(hf)
+
+    assert len(store) == 2 * n_traces
+    assert store.movie_uids == [first.uid, second.uid]
+    assert store.movie_slices == {
+        first.uid: slice(0, n_traces),
+        second.uid: slice(n_traces, 2 * n_traces),
+    }
+    np.testing.assert_array_equal(store.index, np.tile(np.arange(n_traces), 2))
+    np.testing.assert_array_equal(store.n_frames, first.n_frames)
+    np.testing.assert_array_equal(store.stop, first.n_frames)
+    assert store.peaks.shape == (2 * n_traces, 4)
+    assert store.n_selected == 0
+
+    trace_uid = f"{second.uid}_0002"
+    assert store.row(trace_uid) == n_traces + 2
+    with pytest.raises(KeyError, match="no trace with uid bozo"):
+        store.row("bozo")
+
+    view = store[trace_uid]
+    assert view.trace_uid == trace_uid
+    assert view.movie_uid == second.uid
+    assert view.index == 2
+    assert view.peak == mock_data.peaks[2]
+    assert view.selected_slice == slice(0, first.n_frames)
+
+    view.is_selected = True
+    view.start, view.stop = 1, 3
+    view.ch1_offset = 2.5
+    assert store.n_selected == 1
+    assert view.is_selected is True
+    assert view.selected_slice == slice(1, 3)
+    assert store.ch1_offset[n_traces + 2] == 2.5
+
+    view.start, view.stop = None, None
+    assert view.selected_slice == slice(0, first.n_frames)
+
+    with pytest.raises(AttributeError):
+        view.bozo = 1
@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import scipy.stats
+
+from smtirf import Experiment
+from smtirf.detail import metrics
+from smtirf.detail.metrics import compute_metrics
+
+
+def test_compute_metrics():
+    rng = np.random.default_rng(0)
+    channel_1 = rng.normal(100, 10, size=(4, 50))
+    channel_2 = rng.normal(50, 10, size=(4, 50)) + 0.5 * channel_1
+    limits = [(0, 50), (10, 20), (5, 6), (0, 0)]
+    mask = np.zeros((4, 50), dtype=bool)
+    for row, (start, stop) in zip(mask, limits, strict=True):
+        row[start:stop] = True
+    channel_1[~mask] = np.nan
+
+    result = compute_metrics(channel_1, channel_2, mask)
+    np.testing.assert_array_equal(result["length"], [50, 10, 1, 0])
+    for k, (start, stop) in enumerate(limits[:2]):
+        x, y = channel_1[k, start:stop], channel_2[k, start:stop]
+        np.testing.assert_allclose(result["corrcoef"][k], scipy.stats.pearsonr(x, y)[0])
+        np.testing.assert_allclose(result["mean_total"][k], np.mean(x + y))
+        np.testing.assert_allclose(result["snr"][k], np.mean(x + y) / np.std(x + y))
+    assert np.isnan(result["corrcoef"][2:]).all()
+    assert np.isnan(result["mean_total"][3])
+
+
+def test_trace_metrics_cache(smtrc_file, mock_data):
+    expt = Experiment(smtrc_file)
+    with patch.object(
+        metrics, "read_channels", wraps=metrics.read_channels
+    ) as read_channels:
+        length = expt.metric("length")
+        np.testing.assert_array_equal(length, mock_data.movie_metadata.n_frames)
+        expt.metric("snr")
+        assert read_channels.call_count == 1
+
+        expt[3].set_limits(1, 3)
+        np.testing.assert_array_equal(expt.metric("length")[3], 2)
+        assert read_channels.call_count == 2
+        np.testing.assert_array_equal(read_channels.call_args.args[2], [3])
+
+    with pytest.raises(KeyError, match="metric must be in"):
+        expt.metric("bozo")
+
+
+def test_trace_metrics_batches(smtrc_file, mock_data):
+    expt = Experiment(smtrc_file)
+    n_frames = int(expt._trace_metadata.n_frames.max())
+    with (
+        patch.object(metrics, "METRIC_BATCH_BYTES", 2 * 8 * n_frames),
+        patch.object(
+            metrics, "read_channels", wraps=metrics.read_channels
+        ) as read_channels,
+    ):
+        length = expt.metric("length")
+    np.testing.assert_array_equal(length, mock_data.movie_metadata.n_frames)
+    assert read_channels.call_count == -(-len(expt) // 2)
+    assert all(len(call.args[2]) <= 2 for call in read_channels.call_args_list)
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from smtirf import Experiment
+from smtirf.detail.query import evaluate_query
+
+
+class Columns(dict):
+    @property
+    def n_traces(self):
+        return len(next(iter(self.values())))
+
+
+@pytest.fixture
+def columns():
+    return Columns(
+        corrcoef=np.array([-0.9, -0.6, 0.2, -0.7]),
+        length=np.array([300, 100, 500, 250]),
+        movie=np.array(["a", "a", "b", "b"]),
+        is_selected=np.array([True, False, False, True]),
+    )
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ("corrcoef < -0.5 & length > 200", [1, 0, 0, 1]),
+        ("corrcoef < -0.5 & length > 200 & movie == 'b'", [0, 0, 0, 1]),
+        ("(corrcoef > 0) | (length < 200)", [0, 1, 1, 0]),
+        ("~is_selected", [0, 1, 1, 0]),
+        ("not is_selected and length >= 250", [0, 0, 1, 0]),
+        ("100 < length <= 300", [1, 0, 0, 1]),
+        ("movie in ['b', 'c']", [0, 0, 1, 1]),
+        ("movie not in ('b',)", [1, 1, 0, 0]),
+        ("abs(corrcoef) * 2 > 1.3", [1, 0, 0, 1]),
+        ("length - threshold > 0", [1, 0, 1, 0]),
+        ("True", [1, 1, 1, 1]),
+    ],
+)
+def test_evaluate_query(columns, expression, expected):
+    mask = evaluate_query(expression, columns, {"threshold": 250})
+    assert mask.dtype == bool
+    np.testing.assert_array_equal(mask, np.array(expected, dtype=bool))
+
+
+@pytest.mark.parametrize(
+    "expression, message",
+    [
+        ("bozo > 1", "unknown name 'bozo'"),
+        ("length.__class__", "unsupported expression"),
+        ("__import__('os')", "unsupported expression"),
+        ("length is None", "unsupported expression"),
+        ("[x for x in length]", "unsupported expression"),
+        ("length +", "invalid query"),
+        ("length * 2", "does not evaluate to a boolean mask"),
+    ],
+)
+def test_evaluate_query_invalid(columns, expression, message):
+    with pytest.raises(ValueError, match=message):
+        evaluate_query(expression, columns)
+
+
+def test_experiment_query(smtrc_file, mock_data):
+    expt = Experiment(smtrc_file)
+    expt[4].set_limits(0, 2)
+    movie_uid = mock_data.movie_metadata.uid
+
+    selection = expt.query(f"length < 5 & movie == '{movie_uid}'")
+    assert len(selection) == 1
+    assert selection[0] is expt[4]
+    assert str(selection) == "TraceSelection\t1/6 traces"
+
+    selection = expt.query("index >= cutoff", cutoff=3)
+    np.testing.assert_array_equal(selection.rows, [3, 4, 5])
+    assert len(expt._traces) == 1
+
+    selection.set_selected(True)
+    assert expt.n_selected == 3
+    assert len(expt._traces) == 1
+    assert [trace.is_selected for trace in selection] == [True] * 3
+
+    selection = expt.filter(lambda columns: columns["ch1_x"] < 2)
+    np.testing.assert_array_equal(selection.indices, [0, 1])
+    selection = expt.filter(expt.columns["is_selected"])
+    assert len(selection) == 3
+    selection.set_selected(False)
+    assert expt.n_selected == 0
+
+    with pytest.raises(ValueError, match="mask must be a boolean array of length 6"):
+        expt.filter(np.ones(3, dtype=bool))
+    with pytest.raises(ValueError, match="value must be of type bool"):
+        selection.set_selected(1)
@@ -1,13 +1,23 @@
-from datetime import datetime
+import json
+import subprocess
+import sys
+from dataclasses import replace
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import h5py
 import numpy as np
 import pytest
 
-from smtirf.detail.definitions import Coordinates, Point, RawTrace
-from smtirf.detail.metadata import MovieMetadata
-from smtirf.detail.writer import write_movie_to_hdf
+from smtirf import Experiment
+from smtirf.detail.definitions import Coordinates, Point, RawTrace, RawTraceBlock
+from smtirf.detail.metadata import STOP_AT_END, MovieMetadata
+from smtirf.detail.writer import (
+    LiveMovieWriter,
+    _chunk_shape,
+    write_movie_to_hdf,
+    write_selected_rows,
+)
 
 
 @pytest.fixture
@@ -93,10 +103,53 @@ def test_write_movie_to_hdf(
         assert phot_sp_data.shape == (2, 5)
         np.testing.assert_equal(phot_sp_data, np.zeros((2, 5)))
 
+        # default statepaths are stored as fill values, not written
+        for name in ("photophysics", "conformation"):
+            assert group[f"statepaths/{name}"].id.get_num_chunks() == 0
+
         snapshot = group["snapshot"][:]
         assert snapshot.shape == (10, 10)
 
 
+def test_write_movie_to_hdf_blocks(tmp_path, traces, peaks, make_movie_metadata):
+    savename = Path(tmp_path) / "imported_movie_blocks.smtrc"
+    metadata = make_movie_metadata(log={})
+    blocks = (
+        RawTraceBlock(k, row(trace.channel_1), row(trace.channel_2))
+        for k, trace in enumerate(traces)
+    )
+    write_movie_to_hdf(savename, "fret", 0.05, 1, blocks, peaks, metadata)
+
+    with h5py.File(savename, "r") as hf:
+        group = hf[f"movies/movie_{metadata.uid}"]
+        for name in ("channel_1", "channel_2"):
+            np.testing.assert_equal(
+                group[f"traces/{name}"][:],
+                np.vstack([getattr(trace, name) for trace in traces]),
+            )
+
+
+def row(x):
+    return x[np.newaxis, :]
+
+
+@pytest.mark.parametrize("dtype", [np.int16, np.int64])
+def test_write_movie_to_hdf_single_block(
+    tmp_path, traces, peaks, make_movie_metadata, dtype
+):
+    savename = Path(tmp_path) / "imported_movie_single_block.smtrc"
+    metadata = make_movie_metadata(log={})
+    channel_1 = np.vstack([trace.channel_1 for trace in traces]).astype(dtype)
+    channel_2 = np.vstack([trace.channel_2 for trace in traces]).astype(dtype)
+    block = RawTraceBlock(0, channel_1, channel_2)
+    write_movie_to_hdf(savename, "fret", 0.05, 1, block, peaks, metadata)
+
+    with h5py.File(savename, "r") as hf:
+        group = hf[f"movies/movie_{metadata.uid}"]
+        np.testing.assert_equal(group["traces/channel_1"][:], channel_1)
+        np.testing.assert_equal(group["traces/channel_2"][:], channel_2)
+
+
 def test_write_movie_to_hdf_no_snapshot(
     tmp_path, traces, peaks, snapshot, timestamp, make_movie_metadata
 ):
@@ -123,6 +176,7 @@ def test_movie_metadata_written(
         assert group.attrs["data_scaler"] == 1500
         assert group.attrs["frame_length"] == 0.1
         assert group.attrs["n_frames"] == 5
+        np.testing.assert_equal(group["traces/metadata"]["stop"], 5)
         assert group.attrs["n_traces"] == 2
         assert group.attrs["src_filename"] == "bozo.traces"
         assert group.attrs["timestamp"] == "2025-08-19T14:30:00"
@@ -148,3 +202,327 @@ def test_movie_metadata_written(
     with h5py.File(savename, "r") as hf:
         group = hf[f"movies/movie_{metadata.uid}"]
         assert group.attrs["log"] == r"{}"
+
+
+def test_write_movie_to_hdf_append(
+    tmp_path, traces, peaks, timestamp, make_movie_metadata
+):
+    savename = Path(tmp_path) / "appended.smtrc"
+    first = make_movie_metadata(log={})
+    second = replace(first, timestamp=timestamp + timedelta(hours=1))
+
+    # appending to a file that doesn't exist yet creates it
+    write_movie_to_hdf(savename, "fret", 0.05, 1, traces, peaks, first, append=True)
+    write_movie_to_hdf(savename, "fret", 0.05, 1, traces, peaks, second, append=True)
+
+    with h5py.File(savename, "r") as hf:
+        assert set(hf["movies"].keys()) == {
+            f"movie_{first.uid}",
+            f"movie_{second.uid}",
+        }
+        for metadata in (first, second):
+            group = hf[f"movies/movie_{metadata.uid}"]
+            np.testing.assert_equal(
+                group["traces/channel_1"][:],
+                np.vstack([trace.channel_1 for trace in traces]),
+            )
+
+    with pytest.raises(ValueError, match=f"movie {second.uid} already exists"):
+        write_movie_to_hdf(
+            savename, "fret", 0.05, 1, traces, peaks, second, append=True
+        )
+
+    # without append the file is overwritten
+    write_movie_to_hdf(savename, "fret", 0.05, 1, traces, peaks, second)
+    with h5py.File(savename, "r") as hf:
+        assert list(hf["movies"].keys()) == [f"movie_{second.uid}"]
+
+
+@pytest.mark.parametrize(
+    "settings, message",
+    [
+        (("twocolor", 0.05, 1), r"experiment_type \(fret != twocolor\)"),
+        (("fret", 0.1, 1), r"bleedthrough \(0.05 != 0.1\)"),
+        (("fret", 0.05, 1.2), r"gamma \(1 != 1.2\)"),
+    ],
+)
+def test_write_movie_to_hdf_append_mismatch(
+    tmp_path, traces, peaks, timestamp, make_movie_metadata, settings, message
+):
+    savename = Path(tmp_path) / "appended.smtrc"
+    first = make_movie_metadata(log={})
+    second = replace(first, timestamp=timestamp + timedelta(hours=1))
+    write_movie_to_hdf(savename, "fret", 0.05, 1, traces, peaks, first)
+
+    with pytest.raises(ValueError, match=message):
+        write_movie_to_hdf(savename, *settings, traces, peaks, second, append=True)
+
+    with h5py.File(savename, "r") as hf:
+        assert list(hf["movies"].keys()) == [f"movie_{first.uid}"]
+
+
+def test_live_movie_writer(tmp_path, traces, peaks, snapshot, make_movie_metadata):
+    savename = Path(tmp_path) / "live.smtrc"
+    metadata = make_movie_metadata(log={})
+    channel_1 = np.vstack([trace.channel_1 for trace in traces])
+    channel_2 = np.vstack([trace.channel_2 for trace in traces])
+
+    with LiveMovieWriter(
+        savename, "fret", 0.05, 1, peaks, metadata, snapshot, frame_chunk=2
+    ) as writer:
+        assert writer.n_frames == 0
+        writer.append_frames(channel_1[:, :3], channel_2[:, :3])
+        assert writer.n_frames == 3
+        # the metadata table is not rewritten as frames are appended
+        table = writer._group["traces/metadata"]
+        np.testing.assert_equal(table["stop"], STOP_AT_END)
+
+        expt = Experiment(savename, swmr=True)
+        trace = expt[1]
+        assert len(trace) == 3
+        np.testing.assert_equal(trace.limits, [0, 3])
+        np.testing.assert_equal(trace.donor, channel_1[1, :3])
+
+        records = np.empty((2, 4), dtype=np.int16)
+        records[:, 0::2] = channel_1[:, 3:].T
+        records[:, 1::2] = channel_2[:, 3:].T
+        writer.append_records(records)
+        assert writer.n_frames == 5
+
+        expt.refresh()
+        assert len(trace) == 5
+        np.testing.assert_equal(trace.limits, [0, 5])
+        np.testing.assert_equal(trace.donor, channel_1[1])
+        np.testing.assert_equal(trace.acceptor, channel_2[1] - 0.05 * channel_1[1])
+        expt._file_handle.close()
+
+        with pytest.raises(ValueError, match="expected blocks with 2 traces; got 1"):
+            writer.append_frames(channel_1[:1], channel_2[:1])
+
+    with h5py.File(savename, "r") as hf:
+        group = hf[f"movies/movie_{metadata.uid}"]
+        assert group.attrs["n_frames"] == 5
+        np.testing.assert_equal(group["traces/channel_2"][:], channel_2)
+        np.testing.assert_equal(
+            group["statepaths/conformation"][:], np.full((2, 5), -1)
+        )
+        np.testing.assert_equal(group["statepaths/photophysics"][:], np.zeros((2, 5)))
+
+
+# follows a live movie from another process; refreshes on each line of stdin
+SWMR_READER = """
+import json, sys
+from smtirf import Experiment
+
+expt = Experiment(sys.argv[1], swmr=True)
+trace = expt[1]
+for _ in sys.stdin:
+    expt.refresh()
+    state = dict(n_frames=len(trace), limits=list(trace.limits))
+    print(json.dumps(dict(state, donor=trace.donor.tolist())), flush=True)
+"""
+
+
+def test_live_movie_writer_subprocess_reader(
+    tmp_path, traces, peaks, snapshot, make_movie_metadata
+):
+    savename = Path(tmp_path) / "live.smtrc"
+    metadata = make_movie_metadata(log={})
+    channel_1 = np.vstack([trace.channel_1 for trace in traces])
+    channel_2 = np.vstack([trace.channel_2 for trace in traces])
+
+    with LiveMovieWriter(
+        savename, "fret", 0.05, 1, peaks, metadata, snapshot, frame_chunk=2
+    ) as writer:
+        writer.append_frames(channel_1[:, :2], channel_2[:, :2])
+        reader = subprocess.Popen(
+            [sys.executable, "-c", SWMR_READER, str(savename)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            for n_frames in (2, 3, 5):
+                if n_frames > writer.n_frames:
+                    frames = slice(writer.n_frames, n_frames)
+                    writer.append_frames(channel_1[:, frames], channel_2[:, frames])
+                reader.stdin.write("refresh\n")
+                reader.stdin.flush()
+                state = json.loads(reader.stdout.readline())
+                assert state["n_frames"] == n_frames
+                assert state["limits"] == [0, n_frames]
+                np.testing.assert_equal(state["donor"], channel_1[1, :n_frames])
+        finally:
+            reader.stdin.close()
+            assert reader.wait(timeout=60) == 0
+
+
+@pytest.mark.parametrize(
+    "profile, compression, fletcher32",
+    [
+        (None, "gzip", True),
+        ("fast", "lzf", False),
+        ("balanced", "gzip", True),
+        ("archive", "gzip", True),
+    ],
+)
+def test_write_movie_to_hdf_compression(
+    tmp_path,
+    traces,
+    peaks,
+    snapshot,
+    make_movie_metadata,
+    profile,
+    compression,
+    fletcher32,
+):
+    savename = Path(tmp_path) / "compressed.smtrc"
+    metadata = make_movie_metadata(log={})
+    write_movie_to_hdf(
+        savename,
+        "fret",
+        0.05,
+        1,
+        traces,
+        peaks,
+        metadata,
+        snapshot,
+        compression=profile,
+    )
+
+    with h5py.File(savename, "r") as hf:
+        assert hf.attrs["compression_profile"] == (profile or "balanced")
+        group = hf[f"movies/movie_{metadata.uid}"]
+        for name in ("traces/channel_1", "statepaths/conformation", "traces/metadata"):
+            assert group[name].compression == compression
+            assert group[name].fletcher32 == fletcher32
+        np.testing.assert_equal(
+            group["traces/channel_1"][:],
+            np.vstack([trace.channel_1 for trace in traces]),
+        )
+
+
+def test_write_movie_to_hdf_compression_validation(
+    tmp_path, traces, peaks, timestamp, make_movie_metadata
+):
+    savename = Path(tmp_path) / "compressed.smtrc"
+    metadata = make_movie_metadata(log={})
+    with pytest.raises(ValueError, match="compression must be in"):
+        write_movie_to_hdf(
+            savename, "fret", 0.05, 1, traces, peaks, metadata, compression="bozo"
+        )
+
+    write_movie_to_hdf(
+        savename, "fret", 0.05, 1, traces, peaks, metadata, compression="fast"
+    )
+    second = replace(metadata, timestamp=timestamp + timedelta(hours=1))
+    with pytest.raises(ValueError, match=r"compression \(fast != archive\)"):
+        write_movie_to_hdf(
+            savename,
+            "fret",
+            0.05,
+            1,
+            traces,
+            peaks,
+            second,
+            append=True,
+            compression="archive",
+        )
+
+    # appending without a profile uses the profile of the file
+    write_movie_to_hdf(savename, "fret", 0.05, 1, traces, peaks, second, append=True)
+    with h5py.File(savename, "r") as hf:
+        assert hf[f"movies/movie_{second.uid}/traces/channel_1"].compression == "lzf"
+
+
+@pytest.mark.parametrize(
+    "policy, shape, itemsize, chunks",
+    [
+        ("row", (300, 2000), 2, (1, 2000)),
+        ("block", (300, 2000), 2, (65, 2000)),
+        ("block", (30, 2000), 2, (30, 2000)),
+        ("tile", (300, 2000), 2, (64, 1024)),
+        ("tile", (30, 500), 1, (30, 500)),
+        ("row", (0, 0), 2, (1, 1)),
+    ],
+)
+def test_chunk_shape(policy, shape, itemsize, chunks):
+    assert _chunk_shape(policy, *shape, itemsize) == chunks
+
+
+@pytest.mark.parametrize("policy", [None, "row", "tile", "block"])
+def test_write_movie_to_hdf_chunk_policy(
+    tmp_path, traces, peaks, make_movie_metadata, policy
+):
+    savename = Path(tmp_path) / "chunked.smtrc"
+    metadata = make_movie_metadata(log={})
+    write_movie_to_hdf(
+        savename, "fret", 0.05, 1, traces, peaks, metadata, chunk_policy=policy
+    )
+
+    with h5py.File(savename, "r") as hf:
+        assert hf.attrs["chunk_policy"] == (policy or "row")
+        group = hf[f"movies/movie_{metadata.uid}"]
+        expected = (1, 5) if policy in (None, "row") else (2, 5)
+        for name in ("traces/channel_1", "traces/channel_2", "statepaths/photophysics"):
+            assert group[name].chunks == expected
+        np.testing.assert_equal(
+            group["traces/channel_2"][:],
+            np.vstack([trace.channel_2 for trace in traces]),
+        )
+
+
+def test_write_movie_to_hdf_chunk_policy_validation(
+    tmp_path, traces, peaks, timestamp, make_movie_metadata
+):
+    savename = Path(tmp_path) / "chunked.smtrc"
+    metadata = make_movie_metadata(log={})
+    with pytest.raises(ValueError, match="chunk policy must be in"):
+        write_movie_to_hdf(
+            savename, "fret", 0.05, 1, traces, peaks, metadata, chunk_policy="bozo"
+        )
+
+    write_movie_to_hdf(
+        savename, "fret", 0.05, 1, traces, peaks, metadata, chunk_policy="tile"
+    )
+    second = replace(metadata, timestamp=timestamp + timedelta(hours=1))
+    with pytest.raises(ValueError, match=r"chunk_policy \(tile != row\)"):
+        write_movie_to_hdf(
+            savename,
+            "fret",
+            0.05,
+            1,
+            traces,
+            peaks,
+            second,
+            append=True,
+            chunk_policy="row",
+        )
+
+
+@pytest.mark.parametrize("index", [[1, 2, 4], [0, 17, 63]], ids=["dense", "sparse"])
+def test_write_selected_rows(tmp_path, index):
+    expected = np.arange(64 * 5, dtype=np.int16).reshape((64, 5))
+    with h5py.File(tmp_path / "rows.h5", "w") as hf:
+        dataset = hf.create_dataset("data", data=expected, chunks=(1, 5))
+        data = -np.arange(len(index) * 5, dtype=np.int16).reshape((-1, 5))
+        write_selected_rows(dataset, np.array(index), data)
+        expected[index] = data
+        np.testing.assert_array_equal(dataset[()], expected)
+
+
+@pytest.mark.parametrize(
+    "index", [[1, 2, 4], [0, 1, 2, 3, 5, 6, 7], [0, 17, 63]], ids=str
+)
+def test_write_selected_rows_fill_value(tmp_path, index):
+    # statepath datasets; chunks of untouched rows must stay unallocated
+    with h5py.File(tmp_path / "rows.h5", "w") as hf:
+        dataset = hf.create_dataset(
+            "data", shape=(64, 5), dtype=np.int8, fillvalue=-1, chunks=(1, 5)
+        )
+        data = np.arange(len(index) * 5, dtype=np.int8).reshape((-1, 5))
+        write_selected_rows(dataset, np.array(index), data)
+        assert dataset.id.get_num_chunks() == len(index)
+        expected = np.full((64, 5), -1, dtype=np.int8)
+        expected[index] = data
+        np.testing.assert_array_equal(dataset[()], expected)
@@ -1,4 +1,17 @@
+import shutil
+from dataclasses import replace
+from datetime import timedelta
+from unittest.mock import patch
+
+import h5py
+import numpy as np
+import pytest
+
 from smtirf import Experiment
+from smtirf.detail import signals as signals_module
+from smtirf.detail.data_dispatch import SIGNAL_CACHE, MovieLoader
+from smtirf.detail.definitions import RawTrace
+from smtirf.detail.writer import write_movie_to_hdf
 from smtirf.traces import Trace
 
 
@@ -17,3 +30,283 @@ def test_experiment(smtrc_file, mock_data):
 
     expt.select_none()
     assert expt.n_selected == 0
+
+
+def test_experiment_lazy_traces(smtrc_file, mock_data):
+    n_traces = mock_data.movie_metadata.n_traces
+    expt = Experiment(smtrc_file)
+    assert len(expt._traces) == 0
+
+    trace = expt[2]
+    assert expt[2] is trace
+    assert len(expt._traces) == 1
+    assert not hasattr(trace, "__dict__")
+    assert str(trace).startswith(f"FretTrace\tID={mock_data.movie_metadata.uid}_0002")
+    np.testing.assert_equal(trace.raw.donor, mock_data.traces[2].channel_1)
+
+    assert [t._metadata.index for t in expt[1:3]] == [1, 2]
+    assert [t._metadata.index for t in expt] == list(range(n_traces))
+    assert len(expt._traces) == n_traces
+
+    eager = Experiment(smtrc_file, lazy=False)
+    assert len(eager._traces) == n_traces
+
+
+@pytest.fixture
+def two_length_file(tmp_path, mock_data):
+    savename = tmp_path / "two_lengths.smtrc"
+    first = mock_data.movie_metadata
+    second = replace(first, timestamp=first.timestamp + timedelta(hours=1), n_frames=3)
+    for metadata in (first, second):
+        traces = [
+            RawTrace(t.channel_1[: metadata.n_frames], t.channel_2[: metadata.n_frames])
+            for t in mock_data.traces
+        ]
+        write_movie_to_hdf(
+            savename,
+            "fret",
+            0.05,
+            1,
+            traces,
+            mock_data.peaks,
+            metadata,
+            append=True,
+        )
+    return savename
+
+
+@pytest.mark.parametrize("kind", ["donor", "acceptor", "total", "fret"])
+def test_experiment_get_signals(two_length_file, kind):
+    expt = Experiment(two_length_file)
+    expt[0].set_offsets([5, 10])
+    expt[1].set_limits(1, 4)
+    expt[7].gamma = 2
+    expt[8].set_selected(True)
+    expt[1].set_selected(True)
+
+    signals = expt.get_signals(kind)
+    assert signals.data.shape == (12, 5)
+    np.testing.assert_array_equal(signals.rows, np.arange(12))
+    for k, trace in enumerate(expt):
+        np.testing.assert_allclose(
+            signals.data[k][signals.mask[k]], getattr(trace, kind)
+        )
+    assert np.all(np.isnan(signals.data[~signals.mask]))
+    assert not signals.mask[6:, 3:].any()
+
+    ragged = expt.get_signals(kind, selected=True, layout="ragged")
+    assert len(ragged) == 2
+    np.testing.assert_array_equal(ragged.rows, [1, 8])
+    np.testing.assert_array_equal(ragged.lengths, [3, 3])
+    np.testing.assert_allclose(ragged[0], getattr(expt[1], kind))
+    np.testing.assert_allclose(ragged[1], getattr(expt[8], kind))
+
+    corrected = expt.get_signals(kind, selected=False, stage="corrected")
+    assert len(corrected) == 10
+    np.testing.assert_allclose(corrected.data[0], getattr(expt[0].corrected, kind))
+
+    # ragged signals are read in batches of rows of one movie, in experiment order
+    expt.sort("selected")
+    expected = expt.get_signals(kind).to_ragged()
+    with patch.object(signals_module, "RAGGED_BATCH_BYTES", 2 * 8 * 5):
+        ragged = expt.get_signals(kind, layout="ragged")
+    np.testing.assert_array_equal(ragged.rows, expected.rows)
+    np.testing.assert_array_equal(ragged.offsets, expected.offsets)
+    np.testing.assert_allclose(ragged.data, expected.data)
+
+
+def test_experiment_get_signals_validation(smtrc_file):
+    expt = Experiment(smtrc_file)
+    with pytest.raises(ValueError, match="kind must be in"):
+        expt.get_signals("channel_1")
+    with pytest.raises(ValueError, match="stage must be in"):
+        expt.get_signals("donor", stage="bozo")
+    with pytest.raises(ValueError, match="layout must be"):
+        expt.get_signals("donor", layout="bozo")
+
+
+def test_experiment_sort(two_length_file):
+    expt = Experiment(two_length_file)
+    expt[2].set_limits(1, 3)
+    expt[9].set_selected(True)
+    expt[4].set_selected(True)
+
+    expt.sort("length")
+    lengths = [len(trace.time) for trace in expt]
+    assert lengths == sorted(lengths)
+    assert [trace._metadata.index for trace in expt[:2]] == [2, 0]
+
+    # stable, so selected traces keep their order by length
+    expt.sort("selected")
+    np.testing.assert_array_equal(expt._order[:2], [9, 4])
+    assert all(trace.is_selected for trace in expt[:2])
+
+    expt.sort("selected")
+    corrcoef = [trace.corrcoef for trace in expt]
+    np.testing.assert_allclose(corrcoef, np.sort(corrcoef))
+    np.testing.assert_allclose(expt.metric("corrcoef"), corrcoef)
+
+    expt.sort("index")
+    np.testing.assert_array_equal(expt._order, np.arange(12))
+
+    with pytest.raises(KeyError, match="cannot sort by key 'bozo'"):
+        expt.sort("bozo")
+
+
+def test_experiment_save(two_length_file):
+    expt = Experiment(two_length_file)
+    with h5py.File(two_length_file, "r") as hf:
+        date_modified = hf.attrs["date_modified"]
+    assert not expt.is_modified
+    expt.save()  # no-op
+
+    donor = expt[7].donor
+    expt[1].set_offsets([10, 20])
+    expt[7].set_limits(1, 2)
+    expt[8].set_selected(True)
+    statepath = np.array([1, 1, 2])
+    expt[9].set_statepath(statepath)
+    expt[0].set_statepath(np.full(len(expt[0]), 3), kind="photophysics")
+    assert expt.is_modified
+    with pytest.raises(ValueError, match="statepath must have shape"):
+        expt[9].set_statepath([1, 2])
+
+    expt.save()
+    assert not expt.is_modified
+    np.testing.assert_array_equal(expt[7].donor, donor[1:2])
+    np.testing.assert_array_equal(expt[9]._statepath, statepath)
+
+    saved = Experiment(two_length_file)
+    assert saved[1].offsets == [10, 20]
+    assert saved[7].limits == [1, 2]
+    assert saved.n_selected == 1 and saved[8].is_selected
+    np.testing.assert_array_equal(saved[9]._statepath, statepath)
+    np.testing.assert_array_equal(
+        saved[0]._photophysics_statepath, np.full(len(expt[0]), 3)
+    )
+    np.testing.assert_array_equal(saved[0]._statepath, np.full(len(saved[0]), -1))
+    for row in (0, 2, 3, 4, 5, 6, 10, 11):
+        assert saved[row].offsets == [0, 0]
+        assert saved[row].limits == [0, len(saved[row])]
+    with h5py.File(two_length_file, "r") as hf:
+        assert hf.attrs["date_modified"] >= date_modified
+        # only the statepath chunks of edited traces are allocated
+        movie = next(iter(hf["movies"].values()))
+        assert movie["statepaths/conformation"].id.get_num_chunks() == 0
+
+
+def test_experiment_save_swmr(smtrc_file, tmp_path):
+    savename = tmp_path / "swmr.smtrc"
+    shutil.copy(smtrc_file, savename)
+    expt = Experiment(savename, swmr=True)
+    expt[0].set_selected(True)
+    with pytest.raises(ValueError, match="cannot save an experiment opened in SWMR"):
+        expt.save()
+
+
+@pytest.mark.parametrize("selected_only", [False, True])
+def test_experiment_save_as(two_length_file, tmp_path, selected_only):
+    expt = Experiment(two_length_file)
+    for k in (1, 4, 8):
+        expt[k].set_selected(True)
+    expt[4].set_offsets([10, 20])
+    expt[8].set_statepath([1, 1, 2])
+    expt[9].set_statepath([2, 2, 2])
+
+    savename = tmp_path / "copy.smtrc"
+    expt.save_as(savename, selected_only=selected_only)
+    assert expt.is_modified
+    with pytest.raises(ValueError, match="cannot save_as to the open file"):
+        expt.save_as(two_length_file)
+
+    saved = Experiment(savename)
+    original = Experiment(two_length_file)
+    kept = [1, 4, 8] if selected_only else range(12)
+    assert len(saved) == len(kept)
+    assert saved.n_selected == 3
+    for trace, k in zip(saved, kept, strict=True):
+        assert trace._metadata.trace_uid == original[k]._metadata.trace_uid
+        np.testing.assert_array_equal(trace.raw.donor, original[k].raw.donor)
+        np.testing.assert_array_equal(trace._statepath, expt[k]._statepath)
+        assert trace.offsets == expt[k].offsets
+    with h5py.File(savename, "r") as hf:
+        assert ("manifest" in hf) == ("manifest" in original._file_handle)
+        for group in hf["movies"].values():
+            assert group.attrs["n_traces"] == len(group["traces/metadata"])
+
+
+@pytest.mark.parametrize("prefetch, workers", [(1, 1), (4, 2), (100, 1)])
+def test_experiment_iter_traces(two_length_file, prefetch, workers):
+    SIGNAL_CACHE.clear()
+    expt = Experiment(two_length_file)
+    expt[3].set_selected(True)
+    expt.sort("selected")
+    expected = [trace._metadata.trace_uid for trace in expt]
+
+    traces = []
+    for trace in expt.iter_traces(prefetch=prefetch, workers=workers):
+        with patch.object(MovieLoader, "get_data", side_effect=AssertionError):
+            trace.raw.donor, trace.raw.acceptor  # noqa: B018
+            trace.fret  # noqa: B018
+        traces.append(trace._metadata.trace_uid)
+    assert traces == expected
+
+    # stopping early shuts down the reader threads
+    for _ in expt.iter_traces(prefetch=2, workers=2):
+        break
+
+    with pytest.raises(ValueError, match="must be positive"):
+        next(expt.iter_traces(prefetch=0))
+
+
+def test_experiment_train_all(two_state_file):
+    expt = Experiment(two_state_file)
+    expt[2].set_limits(5, 6)  # too short to train
+    expt[4].set_limits(10, 150)
+    accessed = expt[4]
+    calls = []
+    np.random.seed(2)
+    expected_draw = np.random.random()
+    np.random.seed(2)
+    report = expt.train_all(
+        "em",
+        2,
+        n_jobs=1,
+        chunksize=3,
+        seed=1,
+        progress=lambda *args: calls.append(args),
+        printWarnings=False,
+    )
+    assert calls == [(3, 8), (6, 8), (8, 8)]
+    assert np.random.random() == expected_draw  # global random state is restored
+    assert list(report.errors) == [expt[2]._metadata.trace_uid]
+    assert report.errors[expt[2]._metadata.trace_uid].startswith("ValueError")
+    assert expt[2]._model is None
+    np.testing.assert_array_equal(expt[2]._statepath, -1)
+    assert len(report.models) == 7
+    assert accessed._model is report.models[accessed._metadata.trace_uid]
+    for k in (0, 1, 3, 4, 5, 6, 7):
+        trace = expt[k]
+        theta = report.models[trace._metadata.trace_uid]
+        assert trace._model is theta
+        np.testing.assert_array_equal(trace.state_path, theta.label(trace.fret))
+        statepath = trace._statepath
+        assert (statepath[: trace.limits[0]] == -1).all()
+        assert (statepath[trace.limits[1] :] == -1).all()
+
+    with pytest.raises(ValueError, match="n_jobs and chunksize must be positive."):
+        expt.train_all("em", 2, n_jobs=0)
+
+    # statepaths are written by save; seeds depend on Trace UIDs only
+    expt.save()
+    parallel = Experiment(two_state_file)
+    parallel.sort("corrcoef")
+    parallel_report = parallel.train_all(
+        "em", 2, n_jobs=2, chunksize=2, seed=1, printWarnings=False
+    )
+    assert parallel_report.errors == report.errors
+    for uid, theta in report.models.items():
+        np.testing.assert_array_equal(parallel_report.models[uid].mu, theta.mu)
+    parallel.sort("index")
+    for trace, expected in zip(Experiment(two_state_file), parallel, strict=True):
+        np.testing.assert_array_equal(trace._statepath, expected._statepath)
@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+
+from smtirf.hmm.algorithms import (
+    Segments,
+    SegmentsWorkspace,
+    fwdback,
+    fwdback_segments,
+    viterbi,
+    viterbi_segments,
+)
+from smtirf.hmm.detail import normalize_rows
+from smtirf.hmm.distributions import quadratic_coefficients, quadratic_emissions
+
+
+def fwdback_reference(pi, A, B):
+    T, K = B.shape
+    alpha = np.zeros((T, K))
+    beta = np.zeros((T, K))
+    c = np.zeros(T)
+    alpha[0] = pi * B[0]
+    c[0] = alpha[0].sum()
+    alpha[0] /= c[0]
+    for t in range(1, T):
+        alpha[t] = (alpha[t - 1] @ A) * B[t]
+        c[t] = alpha[t].sum()
+        alpha[t] /= c[t]
+    beta[-1] = 1
+    for t in range(T - 2, -1, -1):
+        beta[t] = A @ (B[t + 1] * beta[t + 1]) / c[t + 1]
+    xi = (
+        alpha[:-1, :, None] * A[None] * (B[1:] * beta[1:] / c[1:, None])[:, None, :]
+    ).sum(axis=0)
+    return alpha * beta, xi, np.log(c).sum()
+
+
+def viterbi_reference(lnPi, lnA, lnB):
+    T, K = lnB.shape
+    psi = np.zeros((T, K), dtype=int)
+    delta = lnPi + lnB[0]
+    for t in range(1, T):
+        R = delta[:, None] + lnA
+        psi[t] = R.argmax(axis=0)
+        delta = R.max(axis=0) + lnB[t]
+    Q = np.zeros(T, dtype=int)
+    Q[-1] = delta.argmax()
+    for t in range(T - 1, 0, -1):
+        Q[t - 1] = psi[t, Q[t]]
+    return Q
+
+
+def random_model(rng, T, K):
+    pi = normalize_rows(rng.random((1, K)))[0]
+    A = normalize_rows(rng.random((K, K)) + np.eye(K) * 5)
+    B = rng.random((T, K))
+    return pi, A, B
+
+
+@pytest.mark.parametrize("T, K", [(1, 3), (2, 2), (50, 1), (300, 4)])
+def test_fwdback(T, K):
+    pi, A, B = random_model(np.random.default_rng(T * K), T, K)
+    expected = fwdback_reference(pi, A, B)
+    for result in (fwdback(pi, A, B), fwdback(pi, A, np.asfortranarray(B))):
+        for value, reference in zip(result, expected, strict=True):
+            np.testing.assert_allclose(value, reference, rtol=1e-10)
+
+
+@pytest.mark.parametrize("T, K", [(1, 3), (300, 4)])
+def test_fwdback_log(T, K):
+    pi, A, B = random_model(np.random.default_rng(T * K), T, K)
+    lnB = np.log(B) - 1000  # exp(lnB) underflows to zero
+    gamma, xi, L = fwdback(pi, A, lnB, log=True)
+    expected = fwdback_reference(pi, A, B)
+    np.testing.assert_allclose(gamma, expected[0], rtol=1e-10)
+    np.testing.assert_allclose(xi, expected[1], rtol=1e-10)
+    np.testing.assert_allclose(L, expected[2] - 1000 * T, rtol=1e-10)
+
+
+@pytest.mark.parametrize("T, K", [(1, 3), (2, 2), (50, 1), (500, 4)])
+def test_viterbi(T, K):
+    pi, A, B = random_model(np.random.default_rng(T * K), T, K)
+    A[0, -1] = 0
+    with np.errstate(divide="ignore"):
+        lnPi, lnA, lnB = np.log(pi), np.log(A), np.log(B)
+    Q = viterbi(lnPi, lnA, lnB)
+    assert Q.dtype == np.int32
+    np.testing.assert_array_equal(Q, viterbi_reference(lnPi, lnA, lnB))
+
+
+@pytest.fixture
+def segments():
+    rng = np.random.default_rng(7)
+    lengths = [50, 0, 1, 300, 2, 120]
+    return Segments([rng.normal(0.5, 0.3, T) for T in lengths])
+
+
+@pytest.mark.parametrize("n_jobs", [None, 1])
+def test_fwdback_segments(segments, n_jobs):
+    rng = np.random.default_rng(8)
+    pi, A, _ = random_model(rng, 1, 3)
+    coefficients = quadratic_coefficients([0.2, 0.5, 0.8], [1.0, 0.5, 0.0], 20.0)
+    lnZ, stats = fwdback_segments(segments, pi, A, coefficients, n_jobs)
+
+    expected = dict(gamma0=0, xi=0, Nk=0, x=0, x2=0)
+    for n, x in enumerate(segments.split(segments.x)):
+        if x.size == 0:
+            assert lnZ[n] == 0
+            continue
+        lnB = quadratic_emissions(x, *coefficients)
+        gamma, xi, L = fwdback_reference(pi, A, np.exp(lnB))
+        np.testing.assert_allclose(lnZ[n], L, rtol=1e-10)
+        expected["gamma0"] += gamma[0]
+        expected["xi"] += xi
+        expected["Nk"] += gamma.sum(axis=0)
+        expected["x"] += x @ gamma
+        expected["x2"] += x**2 @ gamma
+    for name, value in expected.items():
+        np.testing.assert_allclose(getattr(stats, name), value, rtol=1e-10)
+    assert stats.lnZ == pytest.approx(lnZ.sum())
+    assert stats.n_traces == 5
+
+
+def test_fwdback_segments_workspace(segments):
+    rng = np.random.default_rng(10)
+    workspace = SegmentsWorkspace(segments, 3)
+    for _ in range(2):
+        pi, A, _ = random_model(rng, 1, 3)
+        coefficients = quadratic_coefficients(rng.random(3), 0.0, 20.0)
+        lnZ, stats = fwdback_segments(segments, pi, A, coefficients, 1, workspace)
+        expected_lnZ, expected = fwdback_segments(segments, pi, A, coefficients, 1)
+        np.testing.assert_allclose(lnZ, expected_lnZ, rtol=1e-12)
+        for name in ("gamma0", "xi", "Nk", "x", "x2"):
+            np.testing.assert_allclose(
+                getattr(stats, name), getattr(expected, name), rtol=1e-12
+            )
+
+    coefficients_2 = quadratic_coefficients([0.2, 0.8], 0.0, 20.0)
+    with pytest.raises(ValueError, match="cannot hold these segments with 2 states"):
+        fwdback_segments(
+            segments, pi[:2], A[:2, :2], coefficients_2, workspace=workspace
+        )
+    with pytest.raises(ValueError, match="cannot hold these segments"):
+        fwdback_segments(Segments([[0.5]]), pi, A, coefficients, workspace=workspace)
+
+
+def test_viterbi_segments(segments):
+    rng = np.random.default_rng(9)
+    pi, A, _ = random_model(rng, 1, 3)
+    lnPi, lnA = np.log(pi), np.log(A)
+    coefficients = quadratic_coefficients([0.2, 0.5, 0.8], 0.0, 20.0)
+    Q = viterbi_segments(segments, lnPi, lnA, coefficients, n_jobs=1)
+    assert Q.dtype == np.int32 and Q.shape == segments.x.shape
+    for x, q in zip(segments.split(segments.x), segments.split(Q), strict=True):
+        if x.size:
+            lnB = quadratic_emissions(x, *coefficients)
+            np.testing.assert_array_equal(q, viterbi(lnPi, lnA, lnB))
+
+
+def test_segments():
+    segments = Segments([[1, 2], [], [3.5]])
+    assert len(segments) == 3
+    np.testing.assert_array_equal(segments.x, [1, 2, 3.5])
+    np.testing.assert_array_equal(segments.offsets, [0, 2, 2, 3])
+    assert [len(x) for x in segments.split(segments.x)] == [2, 0, 1]
+    with pytest.raises(ValueError, match="no observations to train on."):
+        Segments([[], []])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import scipy.stats
+
+from smtirf.hmm import hyperparameters as hyper
+from smtirf.hmm.distributions import Normal, NormalSharedVariance
+
+
+@pytest.mark.parametrize(
+    "phi",
+    [
+        Normal(np.array([0.2, 0.5, 0.9]), np.array([100.0, 400.0, 25.0])),
+        NormalSharedVariance(np.array([0.2, 0.5, 0.9]), 100.0),
+    ],
+)
+def test_lnp_X(phi):
+    x = np.random.default_rng(0).normal(0.5, 0.3, 200)
+    expected = scipy.stats.norm.logpdf(x[:, None], phi.mu, phi.sigma)
+    np.testing.assert_allclose(phi.lnp_X(x), expected, rtol=1e-12)
+    np.testing.assert_allclose(phi.p_X(x), np.exp(expected).T, rtol=1e-12)
+
+
+@pytest.mark.parametrize(
+    "u",
+    [
+        hyper.HMMHyperParameters.uninformative(3),
+        hyper.HMMHyperParametersSharedVariance.uninformative(3),
+        hyper.HmmHyperParametersMultimer.uninformative(3),
+    ],
+)
+def test_mahalanobis(u):
+    np.random.seed(0)
+    phi = u.sample_posterior()._phi
+    x = np.random.normal(phi.m.mean(), 0.3, 200)
+    if hasattr(phi, "epsilon"):
+        scale = np.hstack((phi.epsilon, np.ones(phi.K - 1) * phi.beta))
+    else:
+        scale = phi.beta
+    Delta2 = 1 / scale + phi.tau * (x[:, None] - phi.m) ** 2
+    expected = 0.5 * phi.lnTauStar - 0.5 * np.log(2 * np.pi) - 0.5 * Delta2
+    np.testing.assert_allclose(phi.mahalanobis(x), expected, rtol=1e-12)
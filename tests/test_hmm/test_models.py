@@ -0,0 +1,194 @@
+import copy
+
+import numpy as np
+import pytest
+from test_algorithms import fwdback_reference
+
+from smtirf.hmm import HiddenMarkovModel, hyperparameters as hyper
+from smtirf.hmm.algorithms import fwdback, kldiv
+from smtirf.hmm.models import (
+    ClassicHiddenMarkovModel,
+    MultimerHiddenMarkovModel,
+    VariationalHiddenMarkovModel,
+)
+
+
+@pytest.fixture(scope="module")
+def two_state_trace():
+    np.random.seed(0)
+    theta = ClassicHiddenMarkovModel(
+        2,
+        np.array([0.5, 0.5]),
+        np.array([[0.95, 0.05], [0.1, 0.9]]),
+        np.array([0.2, 0.7]),
+        np.array([0.05, 0.05]) ** -2,
+        False,
+    )
+    ((statepath, x),) = theta.simulate(M=1, T=2000)
+    return statepath, x
+
+
+@pytest.mark.parametrize("model_type", ["em", "vb"])
+def test_train_new(two_state_trace, model_type):
+    statepath, x = two_state_trace
+    np.random.seed(1)
+    theta = HiddenMarkovModel.train_new(model_type, x, 2, False, printWarnings=False)
+    assert theta.exitFlag.isConverged
+    assert np.all(np.diff(theta.exitFlag.L[1:]) > -1e-6)
+    np.testing.assert_allclose(np.sort(theta.mu), [0.2, 0.7], atol=0.01)
+    np.testing.assert_allclose(theta.pi.sum(), 1)
+    np.testing.assert_allclose(theta.A.sum(axis=1), 1)
+    labels = theta.label(x)
+    if theta.mu[0] > theta.mu[1]:
+        labels = 1 - labels
+    assert np.mean(labels == statepath) > 0.99
+
+
+@pytest.mark.parametrize("model_type", ["em", "vb"])
+def test_train_new_high_snr(two_state_trace, model_type):
+    # emission probabilities of the spike underflow to zero in every state
+    statepath, x = two_state_trace
+    x = np.array([0.2, 0.7])[statepath] + np.random.default_rng(2).normal(
+        0, 0.002, x.size
+    )
+    x[500] = 5.0
+    np.random.seed(1)
+    theta = HiddenMarkovModel.train_new(model_type, x, 2, False, printWarnings=False)
+    assert np.isfinite(theta.exitFlag.L).all()
+    np.testing.assert_allclose(np.sort(theta.mu), [0.2, 0.7], atol=0.01)
+    labels = theta.label(x)
+    if theta.mu[0] > theta.mu[1]:
+        labels = 1 - labels
+    assert np.mean(labels == statepath) > 0.99
+
+
+@pytest.fixture(scope="module")
+def two_state_traces():
+    np.random.seed(3)
+    theta = ClassicHiddenMarkovModel(
+        2,
+        np.array([0.5, 0.5]),
+        np.array([[0.95, 0.05], [0.1, 0.9]]),
+        np.array([0.2, 0.7]),
+        np.array([0.08, 0.08]) ** -2,
+        False,
+    )
+    return [x for _, x in theta.simulate(M=40, T=150)]
+
+
+def initial_model(model_type, x):
+    np.random.seed(4)
+    if model_type == "multimer":
+        u = hyper.HmmHyperParametersMultimer.uninformative(3)
+        return MultimerHiddenMarkovModel(3, u, u.sample_posterior())
+    if model_type == "vb":
+        u = hyper.HMMHyperParameters.uninformative(2)
+        theta = VariationalHiddenMarkovModel(2, u, u.sample_posterior(), False)
+    else:
+        theta = ClassicHiddenMarkovModel(
+            2,
+            np.array([0.5, 0.5]),
+            np.array([[0.9, 0.1], [0.1, 0.9]]),
+            np.array([0.3, 0.6]),
+            np.array([10.0, 10.0]) ** 2,
+            False,
+        )
+    theta.refine_by_kmeans(x)
+    return theta
+
+
+def reference_step(theta, x):
+    """One iteration of training on a single trace, as per-trace training was done
+    before the E-step was shared with global training. Returns the objective."""
+    if isinstance(theta, ClassicHiddenMarkovModel):
+        gamma, xi, lnZ = fwdback_reference(theta.pi, theta.A, np.exp(theta.lnp_X(x)))
+        L = lnZ
+    else:
+        u, w = theta._u, theta._w
+        gamma, xi, lnZ = fwdback_reference(
+            np.exp(w.lnPiStar), np.exp(w.lnAStar), np.exp(w.mahalanobis(x))
+        )
+        L = lnZ - kldiv(u, w)
+
+    Nk = gamma.sum(axis=0)
+    if isinstance(theta, MultimerHiddenMarkovModel):
+        K = theta.K
+        dbar = np.sum(gamma[:, 0] * x) / Nk[0]
+        xk = (x[:, None] - dbar) / np.arange(1, K)
+        xbar = np.sum(gamma[:, 1:] * xk) / Nk[1:].sum()
+        mu = np.arange(K) * xbar + dbar
+        S = np.sum(gamma * (x[:, None] - mu) ** 2) / Nk.sum()
+        theta._w.update(theta._u, gamma, xi, Nk, dbar, xbar, S)
+        return L
+
+    xbar = gamma.T @ x / Nk
+    S = np.sum(gamma * (x[:, None] - xbar) ** 2, axis=0) / Nk
+    if isinstance(theta, VariationalHiddenMarkovModel):
+        theta._w.update(theta._u, gamma, xi, Nk, xbar, S)
+    else:
+        theta._pi.update(gamma[0])
+        theta._A.update(xi / gamma[:-1].sum(axis=0)[:, None])
+        theta._phi.update_statistics(Nk, xbar, S)
+    return L
+
+
+@pytest.mark.parametrize("model_type", ["em", "vb", "multimer"])
+def test_train_single_trace(two_state_trace, model_type):
+    statepath, x = two_state_trace
+    if model_type == "multimer":
+        x = 20 + 250 * statepath + np.random.default_rng(5).normal(0, 30, x.size)
+    theta = initial_model(model_type, x)
+    theta_global = copy.deepcopy(theta)
+    reference = copy.deepcopy(theta)
+
+    n_iter = 5
+    theta.train(x, maxIter=n_iter, tol=0, printWarnings=False)
+    theta_global.train_global([x], maxIter=n_iter, tol=0, printWarnings=False)
+    L = [reference_step(reference, x) for _ in range(n_iter)]
+    if model_type != "em":
+        reference._sort()
+    for trained in (theta, theta_global):
+        np.testing.assert_allclose(trained.exitFlag.L, L, rtol=1e-10)
+        for name in ("pi", "A", "mu", "sigma"):
+            np.testing.assert_allclose(
+                getattr(trained, name), getattr(reference, name), rtol=1e-8
+            )
+
+
+@pytest.mark.parametrize("model_type", ["em", "vb"])
+def test_train_global(two_state_traces, model_type):
+    X = two_state_traces + [np.array([])]
+    np.random.seed(6)
+    theta = HiddenMarkovModel.train_global(
+        model_type, X, 2, False, printWarnings=False, n_jobs=3
+    )
+    assert theta.exitFlag.isConverged
+    np.testing.assert_allclose(np.sort(theta.mu), [0.2, 0.7], atol=0.01)
+    np.testing.assert_allclose(theta.sigma, [0.08, 0.08], atol=0.01)
+
+    serial = initial_model(model_type, np.concatenate(X))
+    parallel = copy.deepcopy(serial)
+    serial.train_global(X, printWarnings=False, n_jobs=1)
+    parallel.train_global(X, printWarnings=False, n_jobs=3)
+    np.testing.assert_allclose(parallel.exitFlag.L, serial.exitFlag.L, rtol=1e-10)
+
+
+def test_label_and_score_traces(two_state_traces):
+    np.random.seed(6)
+    theta = HiddenMarkovModel.train_global(
+        "em", two_state_traces, 2, False, printWarnings=False
+    )
+    X = two_state_traces[:5]
+    for x, labels in zip(X, theta.label_traces(X), strict=True):
+        np.testing.assert_array_equal(labels, theta.label(x))
+    lnZ = theta.score_traces(X, n_jobs=1)
+    for x, L in zip(X, lnZ, strict=True):
+        expected = fwdback(theta.pi, theta.A, theta.lnp_X(x), log=True)[2]
+        assert L == pytest.approx(expected, rel=1e-10)
+
+
+def test_train_global_invalid(two_state_traces):
+    with pytest.raises(ValueError, match="no observations to train on."):
+        HiddenMarkovModel.train_global("em", [np.array([])], 2, False)
+    with pytest.raises(ValueError, match="n_jobs must be positive."):
+        HiddenMarkovModel.train_global("em", two_state_traces, 2, False, n_jobs=0)
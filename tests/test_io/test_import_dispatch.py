@@ -1,12 +1,20 @@
 import itertools
+import os
+from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import patch
 
+import h5py
+import numpy as np
 import pytest
 
-from smtirf.io.import_dispatch import load_from_pma
-
-# todo: test happy path!
+from smtirf.detail.manifest import read_manifest
+from smtirf.io import pma
+from smtirf.io.import_dispatch import (
+    load_from_pma,
+    load_from_pma_batch,
+    load_from_pma_live,
+)
 
 
 def generate_missing_file_permutations():
@@ -59,3 +67,179 @@ def test_unknown_experiment_type(tmp_path):
     with pytest.raises(ValueError) as e:
         load_from_pma(filename, experiment_type="bozo")
     assert str(e.value) == "experiment type must be in ('fret', 'twocolor'); got bozo"
+
+
+def test_load_from_pma(tmp_path, write_pma_movie):
+    filename = write_pma_movie(tmp_path, n_traces=5, n_frames=12)
+    load_from_pma(filename, bleedthrough=0.05, gamma=1.1)
+
+    expected = pma._read_traces(filename)
+    with h5py.File(filename.with_suffix(".smtrc"), "r") as hf:
+        assert hf.attrs["experiment_type"] == "fret"
+        assert hf.attrs["bleedthrough"] == 0.05
+        assert hf.attrs["gamma"] == 1.1
+
+        group = hf["movies/movie_20250824T163642"]
+        assert group.attrs["n_traces"] == 5
+        assert group.attrs["n_frames"] == 12
+        assert group.attrs["src_filename"] == "movie.traces"
+        np.testing.assert_array_equal(
+            group["traces/channel_1"][:], [trace.channel_1 for trace in expected]
+        )
+        np.testing.assert_array_equal(
+            group["traces/channel_2"][:], [trace.channel_2 for trace in expected]
+        )
+        assert len(group["traces/metadata"]) == 5
+
+
+@pytest.fixture
+def pma_movies(tmp_path, write_pma_movie):
+    start = datetime(year=2025, month=8, day=24, hour=16, minute=36, second=42)
+    return [
+        write_pma_movie(
+            tmp_path,
+            stem=f"movie_{j}",
+            n_traces=3 + j,
+            n_frames=10,
+            timestamp=start + timedelta(minutes=j),
+            seed=j,
+        )
+        for j in range(3)
+    ]
+
+
+def test_load_from_pma_batch(tmp_path, pma_movies):
+    savename = tmp_path / "batch.smtrc"
+    report = load_from_pma_batch(pma_movies, savename, n_workers=2, gamma=1.1)
+
+    assert report.n_workers == 2
+    assert report.stages["parse"].n_movies == 3
+    assert report.stages["write"].n_movies == 3
+    assert "Import Summary" in str(report)
+
+    with h5py.File(savename, "r") as hf:
+        assert hf.attrs["gamma"] == 1.1
+        assert len(hf["movies"]) == 3
+        for j, filename in enumerate(pma_movies):
+            group = hf[f"movies/movie_20250824T16{36 + j}42"]
+            assert group.attrs["src_filename"] == filename.name
+            expected = pma._read_traces(filename)
+            np.testing.assert_array_equal(
+                group["traces/channel_2"][:], [trace.channel_2 for trace in expected]
+            )
+
+
+def test_load_from_pma_batch_directory(tmp_path, pma_movies):
+    savename = tmp_path / "batch.smtrc"
+    report = load_from_pma_batch(tmp_path, savename, n_workers=1)
+    assert report.stages["write"].n_movies == 3
+
+
+def test_load_from_pma_batch_duplicate_movie(tmp_path, write_pma_movie):
+    movies = [write_pma_movie(tmp_path, stem=f"movie_{j}") for j in range(2)]
+    with pytest.raises(ValueError, match="movie 20250824T163642 already exists"):
+        load_from_pma_batch(movies, tmp_path / "batch.smtrc", n_workers=1)
+
+
+def bump_mtime(filename, seconds=10):
+    stat = filename.stat()
+    os.utime(filename, (stat.st_atime, stat.st_mtime + seconds))
+
+
+def test_load_from_pma_manifest(tmp_path, write_pma_movie):
+    filename = write_pma_movie(tmp_path, n_traces=5, n_frames=12)
+    savename = tmp_path / "experiment.smtrc"
+    assert load_from_pma(filename, savename=savename)
+
+    with h5py.File(savename, "r") as hf:
+        manifest = read_manifest(hf)
+    assert len(manifest) == 1
+    entry = manifest[str(filename.resolve())]
+    assert entry.movie_uid == "20250824T163642"
+    assert entry.size == sum(
+        path.stat().st_size for path in tmp_path.glob("movie*") if path.is_file()
+    )
+    assert len(entry.content_hash) == 32
+
+    # unchanged files are skipped without re-import
+    assert not load_from_pma(filename, savename=savename, append=True)
+
+    # touched but identical files are skipped; manifest mtime is refreshed
+    bump_mtime(filename)
+    assert not load_from_pma(filename, savename=savename, append=True)
+    with h5py.File(savename, "r") as hf:
+        touched = read_manifest(hf)[entry.src_path]
+    assert touched.mtime == filename.stat().st_mtime
+    assert touched.content_hash == entry.content_hash
+
+    # changed files replace the previous import
+    write_pma_movie(tmp_path, n_traces=4, n_frames=12, seed=42)
+    bump_mtime(filename, seconds=20)
+    assert load_from_pma(filename, savename=savename, append=True)
+    with h5py.File(savename, "r") as hf:
+        assert len(hf["movies"]) == 1
+        group = hf["movies/movie_20250824T163642"]
+        assert group.attrs["n_traces"] == 4
+        expected = pma._read_traces(filename)
+        np.testing.assert_array_equal(
+            group["traces/channel_1"][:], [trace.channel_1 for trace in expected]
+        )
+        changed = read_manifest(hf)[entry.src_path]
+    assert changed.content_hash != entry.content_hash
+
+
+def test_load_from_pma_batch_manifest(tmp_path, pma_movies, write_pma_movie):
+    savename = tmp_path / "batch.smtrc"
+    load_from_pma_batch(pma_movies, savename, n_workers=2, append=True)
+
+    report = load_from_pma_batch(pma_movies, savename, n_workers=2, append=True)
+    assert report.n_skipped == 3
+    assert report.stages["write"].n_movies == 0
+
+    write_pma_movie(
+        tmp_path,
+        stem="movie_1",
+        n_traces=2,
+        n_frames=10,
+        timestamp=datetime(year=2025, month=8, day=24, hour=16, minute=37, second=42),
+        seed=42,
+    )
+    bump_mtime(pma_movies[1])
+    bump_mtime(pma_movies[2])  # touched only
+
+    report = load_from_pma_batch(pma_movies, savename, n_workers=2, append=True)
+    assert report.n_skipped == 2
+    assert report.n_replaced == 1
+    with h5py.File(savename, "r") as hf:
+        assert len(hf["movies"]) == 3
+        assert len(read_manifest(hf)) == 3
+        assert hf["movies/movie_20250824T163742"].attrs["n_traces"] == 2
+
+
+def test_load_from_pma_live(tmp_path, write_pma_movie):
+    filename = write_pma_movie(tmp_path, n_traces=3, n_frames=2500)
+    (tmp_path / "movie_ave.tif").unlink()  # snapshot is optional
+    savename = tmp_path / "live.smtrc"
+
+    assert load_from_pma_live(filename, savename=savename) == 2500
+    expected = pma._read_traces(filename)
+    with h5py.File(savename, "r") as hf:
+        group = hf["movies/movie_20250824T163642"]
+        assert group.attrs["n_frames"] == 2500
+        assert "snapshot" not in group
+        np.testing.assert_array_equal(
+            group["traces/channel_1"][:], [trace.channel_1 for trace in expected]
+        )
+        np.testing.assert_array_equal(group["traces/metadata"]["stop"], [2500] * 3)
+
+
+def test_load_from_pma_live_idle_timeout(tmp_path, write_pma_movie):
+    filename = write_pma_movie(tmp_path, n_traces=2, n_frames=5)
+    with open(filename, "r+b") as F:  # frame count not yet known
+        np.array([0], dtype=np.int32).tofile(F)
+    savename = tmp_path / "live.smtrc"
+
+    n_frames = load_from_pma_live(
+        filename, savename=savename, poll_interval=0.01, idle_timeout=0.05
+    )
+    assert n_frames == 5
@@ -0,0 +1,80 @@
+import shutil
+from datetime import datetime, timedelta
+
+import h5py
+import numpy as np
+import pytest
+
+from smtirf import Experiment
+from smtirf.io import merge
+from smtirf.io.import_dispatch import load_from_pma
+
+
+@pytest.fixture
+def sources(tmp_path, write_pma_movie):
+    timestamp = datetime(year=2025, month=8, day=24, hour=16)
+    paths = []
+    for k, n_frames in enumerate((40, 25)):
+        directory = tmp_path / f"day_{k}"
+        directory.mkdir()
+        movie = write_pma_movie(
+            directory,
+            n_traces=10,
+            n_frames=n_frames,
+            timestamp=timestamp + timedelta(days=k),
+            seed=k,
+        )
+        savename = directory / "experiment.smtrc"
+        load_from_pma(movie, savename=savename)
+        paths.append(savename)
+    return paths
+
+
+def test_merge(tmp_path, sources, monkeypatch):
+    master = tmp_path / "master.smtrc"
+    merge(sources, master, virtual=True)
+
+    with h5py.File(master, "r") as hf:
+        assert all(
+            isinstance(hf["movies"].get(name, getlink=True), h5py.ExternalLink)
+            for name in hf["movies"]
+        )
+        channel_1 = hf["virtual/channel_1"][()]
+        trace_ids = hf["virtual/trace_ids"][()]
+    assert channel_1.shape == (20, 40)
+
+    # links are relative to the master file
+    moved = tmp_path / "moved"
+    shutil.copytree(tmp_path, moved, ignore=shutil.ignore_patterns("moved", "*.traces"))
+    monkeypatch.chdir(moved / "day_0")
+
+    expt = Experiment(moved / "master.smtrc")
+    parts = [Experiment(source) for source in sources]
+    assert len(expt) == 20
+    for trace, other in zip(expt, [t for part in parts for t in part], strict=True):
+        assert trace._metadata.trace_uid == other._metadata.trace_uid
+        np.testing.assert_array_equal(trace.raw.donor, other.raw.donor)
+    for row, trace in enumerate(expt):
+        np.testing.assert_array_equal(channel_1[row, : len(trace)], trace.raw.donor)
+        assert trace_ids[row].decode() == trace._metadata.trace_uid
+    np.testing.assert_array_equal(channel_1[10:, 25:], 0)
+
+    # saving writes through the links into the source files
+    expt[12].set_offsets([5, 6])
+    expt.save()
+    assert Experiment(moved / "day_1/experiment.smtrc")[2].offsets == [5, 6]
+
+
+def test_merge_validation(tmp_path, sources):
+    master = tmp_path / "master.smtrc"
+    with pytest.raises(ValueError, match="no files to merge"):
+        merge([], master)
+    with pytest.raises(ValueError, match="into itself"):
+        merge(sources, sources[0])
+    with pytest.raises(ValueError, match="is in both"):
+        merge([sources[0], sources[0]], master)
+
+    with h5py.File(sources[1], "r+") as hf:
+        hf.attrs["gamma"] = 2.0
+    with pytest.raises(ValueError, match=r"cannot merge file with different settings"):
+        merge(sources, master)
@@ -41,6 +41,69 @@ def test_read_traces():
             np.testing.assert_array_equal(results[k].channel_2, fake_data[:, k * 2 + 1])
 
 
+def write_traces_file(filename, records):
+    n_frames, n_records = records.shape
+    with open(filename, "wb") as F:
+        np.array([n_frames], dtype=np.int32).tofile(F)
+        np.array([n_records], dtype=np.int16).tofile(F)
+        records.astype(np.int16).tofile(F)
+
+
+def test_read_traces_header(tmp_path):
+    filename = tmp_path / "movie.traces"
+    write_traces_file(filename, np.zeros((4, 6)))
+
+    from smtirf.io.pma import _read_traces_header
+
+    assert _read_traces_header(filename) == (4, 6)
+
+    write_traces_file(filename, np.zeros((4, 5)))
+    with pytest.raises(ValueError, match=r"odd number of records in dataset \[5\]"):
+        _read_traces_header(filename)
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 10])
+def test_iter_trace_blocks(tmp_path, block_size):
+    n_frames = 7
+    n_records = 10
+    records = np.arange(n_frames * n_records).reshape((n_frames, n_records))
+    filename = tmp_path / "movie.traces"
+    write_traces_file(filename, records)
+
+    from smtirf.io.pma import _iter_trace_blocks
+
+    blocks = list(_iter_trace_blocks(filename, block_size=block_size))
+    assert [block.start for block in blocks] == list(range(0, 5, block_size))
+    assert blocks[-1].stop == n_records // 2
+    for block in blocks:
+        assert block.n_traces <= block_size
+        assert block.channel_1.flags["C_CONTIGUOUS"]
+        for k in range(block.n_traces):
+            index = block.start + k
+            np.testing.assert_array_equal(block.channel_1[k], records[:, index * 2])
+            np.testing.assert_array_equal(block.channel_2[k], records[:, index * 2 + 1])
+
+
+def test_iter_trace_blocks_frame_windows(tmp_path, monkeypatch):
+    from smtirf.io import pma
+
+    n_frames, n_records = 5000, 6
+    records = np.arange(n_frames * n_records).reshape((n_frames, n_records)) % 30000
+    filename = tmp_path / "movie.traces"
+    write_traces_file(filename, records)
+    monkeypatch.setattr(pma, "FRAME_WINDOW_SIZE", 333)
+
+    blocks = list(pma._iter_trace_blocks(filename, block_size=2))
+    channel_1 = np.concatenate([block.channel_1 for block in blocks])
+    np.testing.assert_array_equal(channel_1, records[:, 0::2].T)
+
+    # stopping early releases the views of the map before it is closed
+    blocks = pma._iter_trace_blocks(filename, block_size=2)
+    first = next(blocks)
+    blocks.close()
+    np.testing.assert_array_equal(first.channel_2, records[:, 1:4:2].T)
+
+
 def test_read_pks():
     fake_pks_str = """
        1     1.000     2.000  6.34e+000
@@ -63,6 +126,23 @@ def test_read_pks():
             assert coord.channel_2.y == expected[3]
 
 
+def test_read_pks_array():
+    fake_pks_str = """
+       1     1.000     2.000  6.34e+000
+       2     3.500     4.000  5.01e+000
+       3     5.000     6.000  6.34e+000
+       4     7.500     8.000  5.01e+000
+    """
+
+    with patch("builtins.open", return_value=StringIO(fake_pks_str)):
+        from smtirf.io.pma import _read_pks_array
+
+        results = _read_pks_array(Path("dummy.pks"))
+        np.testing.assert_array_equal(
+            results, [[1.0, 2.0, 3.5, 4.0], [5.0, 6, 7.5, 8.0]]
+        )
+
+
 def test_read_log():
     fake_log = """
     Filming Date and Time
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import h5py
+import numpy as np
+import pytest
+
+from smtirf.io import rechunk
+from smtirf.io.import_dispatch import load_from_pma_batch
+
+
+def assert_same_tree(src, dst):
+    def check(name, node):
+        other = dst[name]
+        assert dict(node.attrs) == dict(other.attrs)
+        if isinstance(node, h5py.Dataset):
+            assert node.dtype == other.dtype
+            assert node.compression == other.compression
+            np.testing.assert_equal(node[()], other[()])
+
+    src.visititems(check)
+
+
+@pytest.mark.parametrize(
+    "policy, chunks",
+    [("row", (1, 40)), ("tile", (10, 40)), ("block", (10, 40))],
+)
+def test_rechunk(tmp_path, write_pma_movie, policy, chunks):
+    timestamp = datetime(year=2025, month=8, day=24, hour=16)
+    paths = [
+        write_pma_movie(
+            tmp_path,
+            stem=f"movie_{k}",
+            n_traces=10,
+            n_frames=40,
+            timestamp=timestamp + timedelta(minutes=k),
+            seed=k,
+        )
+        for k in range(2)
+    ]
+    src = tmp_path / "source.smtrc"
+    load_from_pma_batch(paths, src, n_workers=1, compression="fast")
+
+    dst = tmp_path / "rechunked.smtrc"
+    rechunk(src, dst, policy)
+
+    with h5py.File(src, "r") as hs, h5py.File(dst, "r") as hd:
+        assert hd.attrs["chunk_policy"] == policy
+        assert hd.attrs["compression_profile"] == "fast"
+        assert {k: v for k, v in hd.attrs.items() if k != "chunk_policy"} == {
+            k: v for k, v in hs.attrs.items() if k != "chunk_policy"
+        }
+        assert_same_tree(hs, hd)
+        for group in hd["movies"].values():
+            assert group["traces/channel_1"].chunks == chunks
+            assert group["statepaths/conformation"].chunks == chunks
+            # default statepaths remain unallocated in the new file
+            assert group["statepaths/conformation"].id.get_num_chunks() == 0
+
+
+def test_rechunk_validation(tmp_path):
+    src = tmp_path / "source.smtrc"
+    with pytest.raises(ValueError, match="chunk policy must be in"):
+        rechunk(src, tmp_path / "rechunked.smtrc", "bozo")
+    with pytest.raises(ValueError, match="in place"):
+        rechunk(src, src, "row")
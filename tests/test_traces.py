@@ -1,4 +1,5 @@
 from collections import namedtuple
+from unittest.mock import patch
 
 import numpy as np
 import pytest
@@ -68,6 +69,14 @@ def test_trace_selection(mock_trace):
         trace.set_selected(42)
 
 
+def test_trace_default_statepaths(mock_trace, mock_data):
+    n_frames = mock_data.movie_metadata.n_frames
+    assert mock_trace._photophysics_statepath.dtype == np.uint8
+    np.testing.assert_equal(mock_trace._photophysics_statepath, np.zeros(n_frames))
+    assert mock_trace._statepath.dtype == np.int8
+    np.testing.assert_equal(mock_trace._statepath, np.full(n_frames, -1))
+
+
 def test_trace_data(mock_trace, expected_signals):
     trace = mock_trace
     donor, acceptor, time = expected_signals
@@ -116,3 +125,55 @@ def test_trace_limits(mock_trace, expected_signals):
 
 
 # todo: test with_statepath_update ? or inherently tested with decorated methods ?
+
+
+def test_trace_signal_memoization(mock_trace, expected_signals):
+    trace = mock_trace
+    donor, acceptor, time = expected_signals
+
+    with patch.object(
+        trace._loader, "get_data", wraps=trace._loader.get_data
+    ) as get_data:
+        fret = trace.fret
+        assert trace.fret is fret
+        assert trace.raw.donor is trace.raw.donor
+        assert trace.total is trace.total
+        assert get_data.call_count == 2
+
+        trace.set_offsets([donor.offset, acceptor.offset])
+        np.testing.assert_equal(trace.donor, donor.corrected)
+        np.testing.assert_equal(trace.acceptor, acceptor.corrected)
+        assert trace.fret is not fret
+
+        trace.gamma = 2
+        np.testing.assert_equal(trace.donor, donor.corrected * 2)
+        trace.bleed = 0
+        np.testing.assert_equal(trace.acceptor, acceptor.baselined)
+
+        trace.set_limits(1, 3)
+        np.testing.assert_equal(trace.time, time[1:3])
+        np.testing.assert_equal(trace.donor, donor.corrected[1:3] * 2)
+
+        # raw data is only read once
+        assert get_data.call_count == 2
+
+
+def test_trace_train(two_state_file):
+    trace = Experiment(two_state_file)[3]
+    trace.set_limits(10, 180)
+    with pytest.raises(ValueError, match="No model exists"):
+        trace.SP  # noqa: B018
+    np.random.seed(0)
+    trace.train("em", 2, printWarnings=False)
+    assert trace.model is trace._model and trace.model.K == 2
+    labels = trace.model.label(trace.X)
+    np.testing.assert_array_equal(trace.state_path, labels)
+    assert (trace._statepath[:10] == -1).all() and (trace._statepath[180:] == -1).all()
+
+    table = trace.dwells.table
+    np.testing.assert_array_equal(table[:, 3].sum(), len(trace.X))
+    np.testing.assert_array_equal(table[:, 2], labels[table[:, 0].astype(int)])
+
+    trace.model = None
+    trace.label_statepath()  # no model, no-op
+    assert trace.model is None